@@ -1,60 +1,146 @@
-from autogen import AssistantAgent
-import requests
-import os
-from dotenv import load_dotenv
+import logging
 
-# Load environment variables
-load_dotenv(override=True)
+import config
+from backend import BackendError, get_backend
+from telemetry import tool
 
+logger = logging.getLogger(__name__)
+
+def _cart_text(data):
+    if not data["cart"]:
+        return "Your cart is empty"
+    items = []
+    for item in data["cart"]:
+        items.append(f"{item['name']}: {item['quantity']} {item.get('unit', 'units')}")
+    return "Your cart contains:\n" + "\n".join(items)
+
+def _operations(items):
+    return [
+        {"op": item.get("action", "add"), "item_id": item["item_id"], "quantity": item.get("quantity")}
+        for item in items
+    ]
+
+@tool
 def add_to_cart(user_id: str, item_id: int, quantity: float):
-    payload = {"user_id": user_id, "item_id": item_id, "quantity": quantity}
-    print("[DEBUG] Calling backend: /cart/add")
+    logger.debug("Calling backend: /cart/add")
     try:
-        response = requests.post("http://localhost:8000/cart/add", json=payload)
-        data = response.json()
+        get_backend().add_to_cart(user_id, item_id, quantity)
         return f"Added {quantity} units of item {item_id} to cart"
-    except:
-        print("[DEBUG] Error connecting to backend")
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
         return "Failed to add item to cart. Please try again."
 
+@tool
 def remove_from_cart(user_id: str, item_id: int):
-    payload = {"user_id": user_id, "item_id": item_id}
-    print("[DEBUG] Calling backend: /cart/remove")
+    logger.debug("Calling backend: /cart/remove")
     try:
-        response = requests.post("http://localhost:8000/cart/remove", json=payload)
-        data = response.json()
+        get_backend().remove_from_cart(user_id, item_id)
         return f"Removed item {item_id} from cart"
-    except:
-        print("[DEBUG] Error connecting to backend")
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
         return "Failed to remove item from cart. Please try again."
 
+@tool
+def update_cart_items(user_id: str, items: list):
+    logger.debug("Calling backend: /cart/bulk (%d items)", len(items))
+    try:
+        return "Cart updated. " + _cart_text(get_backend().update_cart(user_id, _operations(items)))
+    except BackendError as e:
+        return f"Cart not changed: {e.detail}"
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return "Failed to update the cart. Please try again."
+
+@tool
 def view_cart(user_id: str):
     try:
-        response = requests.get(f"http://localhost:8000/cart", params={"user_id": user_id})
-        data = response.json()
-        if not data["cart"]:
-            return "Your cart is empty"
-        items = []
-        for item in data["cart"]:
-            items.append(f"{item['name']}: {item['quantity']} {item.get('unit', 'units')}")
-        return "Your cart contains:\n" + "\n".join(items)
-    except:
-        print("[DEBUG] Error connecting to backend")
+        return _cart_text(get_backend().view_cart(user_id))
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return "Failed to view cart. Please try again."
+
+# -------- Async variants (same results, non-blocking) --------
+
+@tool
+async def a_add_to_cart(user_id: str, item_id: int, quantity: float):
+    try:
+        await get_backend().a_add_to_cart(user_id, item_id, quantity)
+        return f"Added {quantity} units of item {item_id} to cart"
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return "Failed to add item to cart. Please try again."
+
+@tool
+async def a_remove_from_cart(user_id: str, item_id: int):
+    try:
+        await get_backend().a_remove_from_cart(user_id, item_id)
+        return f"Removed item {item_id} from cart"
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return "Failed to remove item from cart. Please try again."
+
+@tool
+async def a_update_cart_items(user_id: str, items: list):
+    try:
+        return "Cart updated. " + _cart_text(await get_backend().a_update_cart(user_id, _operations(items)))
+    except BackendError as e:
+        return f"Cart not changed: {e.detail}"
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return "Failed to update the cart. Please try again."
+
+@tool
+async def a_view_cart(user_id: str):
+    try:
+        return _cart_text(await get_backend().a_view_cart(user_id))
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
         return "Failed to view cart. Please try again."
 
-def create_cart_agent():
+function_map = {
+    "add_to_cart": add_to_cart,
+    "remove_from_cart": remove_from_cart,
+    "update_cart_items": update_cart_items,
+    "view_cart": view_cart
+}
+
+async_function_map = {
+    "add_to_cart": a_add_to_cart,
+    "remove_from_cart": a_remove_from_cart,
+    "update_cart_items": a_update_cart_items,
+    "view_cart": a_view_cart
+}
+
+# Functions sent to the LLM per intent of the user's message (prompt_budget.py);
+# other intents ("search", "browse", "checkout") and messages with none get
+# all of them: "2 kg of onions" or "yes please" may well be an add
+intent_functions = {
+    "add": ["add_to_cart", "update_cart_items"],
+    "remove": ["remove_from_cart", "update_cart_items"],
+    "view_cart": ["view_cart"],
+}
+
+def create_cart_agent(use_async: bool = False):
+    from autogen import AssistantAgent
+
     agent = AssistantAgent(
         name="CartAgent",
+        description="Adds, removes and updates items in the user's cart and shows the cart.",
         system_message=(
             "You are the CartAgent. Your role is to help users manage their shopping cart. "
             "Use these functions:\n"
             "1. add_to_cart(user_id, item_id, quantity) - When a user wants to buy items\n"
             "2. remove_from_cart(user_id, item_id) - When a user wants to remove items\n"
-            "3. view_cart(user_id) - When a user wants to see what's in their cart\n"
+            "3. update_cart_items(user_id, items) - Several items at once, e.g. a shopping list: "
+            "one call with every item instead of one add_to_cart call per item\n"
+            "4. view_cart(user_id) - When a user wants to see what's in their cart\n"
             "\nNEVER make up responses. ALWAYS use the functions provided."
         ),
         llm_config={
-            "config_list": [{"model": "gpt-4-0613", "api_key": os.getenv("OPENAI_API_KEY")}],
+            "config_list": [{
+                "model": config.AGENT_MODELS.get("CartAgent", config.LLM_MODEL),
+                "api_key": config.OPENAI_API_KEY,
+            }],
             "functions": [
                 {
                     "name": "add_to_cart",
@@ -96,6 +182,43 @@ def create_cart_agent():
                         "required": ["user_id", "item_id"]
                     }
                 },
+                {
+                    "name": "update_cart_items",
+                    "description": "Add, remove or set the quantity of several items in one step (all or nothing)",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "user_id": {
+                                "type": "string",
+                                "description": "The ID of the user"
+                            },
+                            "items": {
+                                "type": "array",
+                                "description": "One entry per item",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "item_id": {
+                                            "type": "integer",
+                                            "description": "The ID of the item"
+                                        },
+                                        "action": {
+                                            "type": "string",
+                                            "enum": ["add", "remove", "set"],
+                                            "description": "add (default) the quantity, remove the item, or set its quantity"
+                                        },
+                                        "quantity": {
+                                            "type": "number",
+                                            "description": "Quantity to add or set; not needed for remove"
+                                        }
+                                    },
+                                    "required": ["item_id"]
+                                }
+                            }
+                        },
+                        "required": ["user_id", "items"]
+                    }
+                },
                 {
                     "name": "view_cart",
                     "description": "View the contents of the user's cart",
@@ -116,11 +239,7 @@ def create_cart_agent():
     
     # Register the functions
     agent.register_function(
-        function_map={
-            "add_to_cart": add_to_cart,
-            "remove_from_cart": remove_from_cart,
-            "view_cart": view_cart
-        }
+        function_map=async_function_map if use_async else function_map
     )
     
     return agent
@@ -1,65 +1,164 @@
-from autogen import AssistantAgent
-import requests
-import os
-from dotenv import load_dotenv
+import logging
 
-# Load environment variables
-load_dotenv()
+import config
+from backend import get_backend
+from telemetry import tool
+from tool_cache import catalog_memo
 
+logger = logging.getLogger(__name__)
+
+# Keep listings short: every item line ends up in the LLM prompt
+PAGE_SIZE = 10
+
+def _categories_text(data):
+    return "Available categories: " + ", ".join(data["categories"])
+
+def _category_items_text(category, data):
+    items = []
+    for item in data["items"]:
+        items.append(f"[{item['id']}] {item['name']}: ${item['price']} per {item['unit']}")
+    result = f"Items in {category}:\n" + "\n".join(items)
+    if data.get("next_cursor"):
+        result += (
+            f"\n(More items available. Call get_category_items with cursor=\"{data['next_cursor']}\" "
+            "only if the user asks to see more.)"
+        )
+    return result
+
+def _item_info_text(item_id, data):
+    data = data["item"]
+    return f"Item {item_id}: {data['name']}, Price: ${data['price']}, Unit: {data['unit']}"
+
+def _search_text(query, data):
+    if not data["items"]:
+        return f"No items found matching '{query}'"
+    items = []
+    for item in data["items"]:
+        items.append(f"[{item['id']}] {item['name']}: ${item['price']} per {item['unit']} ({item['category']})")
+    return f"Items matching '{query}':\n" + "\n".join(items)
+
+@tool
 def get_categories():
-    print("[DEBUG] Calling backend: /getAllCategories")
+    logger.debug("Calling backend: /getAllCategories")
     # For testing, you can mock the response
     try:
-        response = requests.get("http://localhost:8000/getAllCategories")
-        data = response.json()
-        return "Available categories: " + ", ".join(data["categories"])
-    except:
-        print("[DEBUG] Error connecting to backend, returning mock data")
+        return _categories_text(catalog_memo.get("categories", get_backend().get_categories))
+    except Exception:
+        logger.warning("Error connecting to backend, returning mock data", exc_info=True)
         return "Available categories: Electronics, Clothing, Home, Books"
 
-def get_category_items(category: str):
-    print(f"[DEBUG] Calling backend: /getAllItems/{category}")
+@tool
+def get_category_items(category: str, cursor: str = None):
+    logger.debug("Calling backend: /getAllItems/%s", category)
     try:
-        response = requests.get(f"http://localhost:8000/getAllItems/{category}")
-        data = response.json()
-        items = []
-        for item in data["items"]:
-            items.append(f"{item['name']}: ${item['price']} per {item['unit']}")
-        return f"Items in {category}:\n" + "\n".join(items)
-    except:
-        print("[DEBUG] Error connecting to backend")
+        return _category_items_text(category, get_backend().get_category_items(category, cursor, PAGE_SIZE))
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
         return f"Failed to get items in {category}. Please try again."
 
+@tool
 def get_item_info(item_id: int):
-    print(f"[DEBUG] Calling backend: /getItemInfo/{item_id}")
+    logger.debug("Calling backend: /getItemInfo/%s", item_id)
+    try:
+        data = catalog_memo.get(("item", item_id), lambda: get_backend().get_item_info(item_id))
+        return _item_info_text(item_id, data)
+    except Exception:
+        logger.warning("Error connecting to backend, returning mock data", exc_info=True)
+        return f"Item {item_id}: Sample Item, Price: $99.99"
+
+@tool
+def search_items(query: str):
+    logger.debug("Calling backend: /search?q=%s", query)
+    try:
+        return _search_text(query, get_backend().search_items(query, 5))
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return f"Failed to search for '{query}'. Please try again."
+
+# -------- Async variants (same results, non-blocking) --------
+
+@tool
+async def a_get_categories():
+    try:
+        return _categories_text(await catalog_memo.aget("categories", get_backend().a_get_categories))
+    except Exception:
+        logger.warning("Error connecting to backend, returning mock data", exc_info=True)
+        return "Available categories: Electronics, Clothing, Home, Books"
+
+@tool
+async def a_get_category_items(category: str, cursor: str = None):
+    try:
+        data = await get_backend().a_get_category_items(category, cursor, PAGE_SIZE)
+        return _category_items_text(category, data)
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return f"Failed to get items in {category}. Please try again."
+
+@tool
+async def a_get_item_info(item_id: int):
     try:
-        response = requests.get(f"http://localhost:8000/getItemInfo/{item_id}")
-        data = response.json()["item"]
-        return f"Item {item_id}: {data['name']}, Price: ${data['price']}, Unit: {data['unit']}"
-    except:
-        print("[DEBUG] Error connecting to backend, returning mock data")
+        data = await catalog_memo.aget(("item", item_id), lambda: get_backend().a_get_item_info(item_id))
+        return _item_info_text(item_id, data)
+    except Exception:
+        logger.warning("Error connecting to backend, returning mock data", exc_info=True)
         return f"Item {item_id}: Sample Item, Price: $99.99"
 
+@tool
+async def a_search_items(query: str):
+    try:
+        return _search_text(query, await get_backend().a_search_items(query, 5))
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return f"Failed to search for '{query}'. Please try again."
+
 # Define function schema for the LLM to understand how to call the functions
 function_map = {
     "get_categories": get_categories,
     "get_category_items": get_category_items,
-    "get_item_info": get_item_info
+    "get_item_info": get_item_info,
+    "search_items": search_items
 }
 
-def create_item_agent():
+async_function_map = {
+    "get_categories": a_get_categories,
+    "get_category_items": a_get_category_items,
+    "get_item_info": a_get_item_info,
+    "search_items": a_search_items
+}
+
+# Functions sent to the LLM per intent of the user's message (prompt_budget.py);
+# other intents get all of them
+intent_functions = {
+    "browse": ["get_categories", "get_category_items"],
+    "search": ["search_items", "get_item_info"],
+    "add": ["search_items"],
+    "remove": ["search_items"],
+    # Not about products: at most a look at one
+    "view_cart": ["get_item_info"],
+    "checkout": ["get_item_info"],
+}
+
+def create_item_agent(use_async: bool = False):
+    from autogen import AssistantAgent
+
     agent = AssistantAgent(
         name="ItemAgent",
+        description="Finds products: categories, items in a category, item details, search by name.",
         system_message=(
             "You are the ItemAgent. Your role is to help users find products. "
             "Use these functions:\n"
             "1. get_categories() - List all available product categories\n"
-            "2. get_category_items(category) - List all items in a category\n"
+            "2. get_category_items(category, cursor) - List items in a category, one page at a time\n"
             "3. get_item_info(item_id) - Get details about a specific item\n"
+            "4. search_items(query) - Find items by name, e.g. 'bananas'; returns item IDs\n"
+            "\nWhen the user names a product, call search_items first instead of listing categories.\n"
             "\nNEVER make up responses. ALWAYS use the functions provided."
         ),
         llm_config={
-            "config_list": [{"model": "gpt-4-0613", "api_key": os.getenv("OPENAI_API_KEY")}],
+            "config_list": [{
+                "model": config.AGENT_MODELS.get("ItemAgent", config.LLM_MODEL),
+                "api_key": config.OPENAI_API_KEY,
+            }],
             "functions": [
                 {
                     "name": "get_categories",
@@ -72,13 +171,17 @@ def create_item_agent():
                 },
                 {
                     "name": "get_category_items",
-                    "description": "Get all items in a category",
+                    "description": "Get one page of items in a category",
                     "parameters": {
                         "type": "object",
                         "properties": {
                             "category": {
                                 "type": "string",
                                 "description": "The category to get items from"
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "Cursor from a previous page, to get the next page"
                             }
                         },
                         "required": ["category"]
@@ -97,6 +200,20 @@ def create_item_agent():
                         },
                         "required": ["item_id"]
                     }
+                },
+                {
+                    "name": "search_items",
+                    "description": "Search items by name, tolerating typos and partial words",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "Product name or part of it, e.g. 'bananas'"
+                            }
+                        },
+                        "required": ["query"]
+                    }
                 }
             ]
         }
@@ -104,11 +221,7 @@ def create_item_agent():
     
     # Register the functions
     agent.register_function(
-        function_map={
-            "get_categories": get_categories,
-            "get_category_items": get_category_items,
-            "get_item_info": get_item_info
-        }
+        function_map=async_function_map if use_async else function_map
     )
     
     return agent
\ No newline at end of file
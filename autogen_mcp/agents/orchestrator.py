@@ -1,20 +1,23 @@
-from autogen import AssistantAgent
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv(override=True)
+import config
 
 
 def create_orchestrator_agent():
+    from autogen import AssistantAgent
+
     return AssistantAgent(
         name="Orchestrator",
-        llm_config={"config_list": [{"model": "gpt-4-0613", "api_key": os.getenv("OPENAI_API_KEY")}]},
+        description="Works out what the user wants and which agent should handle it.",
+        # Only routes, so it runs on the routing tier (config.LLM_ROUTING_MODEL)
+        llm_config={"config_list": [{
+            "model": config.AGENT_MODELS.get("Orchestrator", config.LLM_MODEL),
+            "api_key": config.OPENAI_API_KEY,
+        }]},
         system_message=(
             "You are the Orchestrator agent. Your role is to coordinate between different agents to help users shop:\n\n"
             "1. When users want to know about products or categories:\n"
             "   - Direct these queries to the ItemAgent\n"
-            "   - The ItemAgent will list categories and provide item details\n\n"
+            "   - The ItemAgent will list categories and provide item details\n"
+            "   - The ItemAgent can search products by name to find their item IDs\n\n"
             "2. When users want to buy items or manage their cart:\n"
             "   - Direct these queries to the CartAgent\n"
             "   - Help identify item IDs and quantities from user messages\n"
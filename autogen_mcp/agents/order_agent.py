@@ -1,29 +1,52 @@
-from autogen import AssistantAgent
-import requests
-import os
-from dotenv import load_dotenv
+import logging
+import uuid
 
-# Load environment variables
-load_dotenv(override=True)
+import config
+from backend import get_backend
+from telemetry import tool
 
+logger = logging.getLogger(__name__)
+
+def _order_text(data):
+    items = [f"{item['name']}: {item['quantity']} units" for item in data["items"]]
+    return (
+        f"Order confirmed!\n"
+        f"Total amount: ${data['total_amount']:.2f}\n"
+        f"Items ordered:\n" + "\n".join(f"- {item}" for item in items)
+    )
+
+@tool
 def confirm_order(user_id: str):
-    print(f"[DEBUG] Calling backend: /order/confirm for user {user_id}")
+    logger.debug("Calling backend: /order/confirm for user %s", user_id)
+    try:
+        # One key per call: the backend's retries of this call can't order twice
+        return _order_text(get_backend().confirm_order(user_id, uuid.uuid4().hex))
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
+        return "Failed to confirm order. Please try again."
+
+@tool
+async def a_confirm_order(user_id: str):
     try:
-        response = requests.post("http://localhost:8000/order/confirm", json={"user_id": user_id})
-        data = response.json()
-        items = [f"{item['name']}: {item['quantity']} units" for item in data["items"]]
-        return (
-            f"Order confirmed!\n"
-            f"Total amount: ${data['total_amount']:.2f}\n"
-            f"Items ordered:\n" + "\n".join(f"- {item}" for item in items)
-        )
-    except:
-        print("[DEBUG] Error connecting to backend")
+        return _order_text(await get_backend().a_confirm_order(user_id, uuid.uuid4().hex))
+    except Exception:
+        logger.warning("Error connecting to backend", exc_info=True)
         return "Failed to confirm order. Please try again."
 
-def create_order_agent():
+function_map = {
+    "confirm_order": confirm_order
+}
+
+async_function_map = {
+    "confirm_order": a_confirm_order
+}
+
+def create_order_agent(use_async: bool = False):
+    from autogen import AssistantAgent
+
     agent = AssistantAgent(
         name="OrderAgent",
+        description="Places the order for the items in the user's cart (checkout).",
         system_message=(
             "You are the OrderAgent. Your role is to help users confirm their orders.\n\n"
             "Use the confirm_order(user_id) function when:\n"
@@ -34,7 +57,10 @@ def create_order_agent():
             "NEVER make up responses. ALWAYS use the function provided."
         ),
         llm_config={
-            "config_list": [{"model": "gpt-4-0613", "api_key": os.getenv("OPENAI_API_KEY")}],
+            "config_list": [{
+                "model": config.AGENT_MODELS.get("OrderAgent", config.LLM_MODEL),
+                "api_key": config.OPENAI_API_KEY,
+            }],
             "functions": [
                 {
                     "name": "confirm_order",
@@ -56,9 +82,7 @@ def create_order_agent():
     
     # Register the functions
     agent.register_function(
-        function_map={
-            "confirm_order": confirm_order
-        }
+        function_map=async_function_map if use_async else function_map
     )
     
     return agent
@@ -0,0 +1,290 @@
+"""Backend adapters for the agent tools.
+
+Tools talk to a ``Backend`` and get back the same dicts the REST API returns.
+``HttpBackend`` goes through the pooled transport; ``InProcessBackend``
+imports the service layer (root ``services.py``) and calls it directly,
+skipping JSON encoding, the TCP round trip and request validation. Pick one
+with ``BACKEND_MODE``.
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+import threading
+
+import config
+import transport
+
+
+class BackendError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class HttpBackend:
+    def _json(self, response):
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get("detail", response.text)
+            except ValueError:
+                detail = response.text
+            raise BackendError(response.status_code, detail)
+        return response.json()
+
+    def _page_params(self, cursor, limit):
+        params = {}
+        if limit:
+            params["limit"] = limit
+        if cursor:
+            params["cursor"] = cursor
+        return params
+
+    def catalog_version(self):
+        return self._json(transport.get("/catalog/version"))["version"]
+
+    def get_categories(self):
+        return self._json(transport.get("/getAllCategories"))
+
+    def get_category_items(self, category, cursor=None, limit=None):
+        return self._json(transport.get(f"/getAllItems/{category}", params=self._page_params(cursor, limit)))
+
+    def get_item_info(self, item_id):
+        return self._json(transport.get(f"/getItemInfo/{item_id}"))
+
+    def search_items(self, query, limit=10):
+        return self._json(transport.get("/search", params={"q": query, "limit": limit}))
+
+    def add_to_cart(self, user_id, item_id, quantity):
+        payload = {"user_id": user_id, "item_id": item_id, "quantity": quantity}
+        return self._json(transport.post("/cart/add", json=payload))
+
+    def remove_from_cart(self, user_id, item_id):
+        return self._json(transport.post("/cart/remove", json={"user_id": user_id, "item_id": item_id}))
+
+    def update_cart(self, user_id, operations):
+        return self._json(transport.post("/cart/bulk", json={"user_id": user_id, "operations": operations}))
+
+    def view_cart(self, user_id):
+        return self._json(transport.get("/cart", params={"user_id": user_id}))
+
+    def confirm_order(self, user_id, idempotency_key=None):
+        # With a key the backend returns the same order for a repeat, so retrying is safe
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        return self._json(transport.post("/order/confirm", json={"user_id": user_id}, headers=headers,
+                                         idempotent=bool(idempotency_key)))
+
+    async def a_catalog_version(self):
+        return self._json(await transport.aget("/catalog/version"))["version"]
+
+    async def a_get_categories(self):
+        return self._json(await transport.aget("/getAllCategories"))
+
+    async def a_get_category_items(self, category, cursor=None, limit=None):
+        return self._json(await transport.aget(f"/getAllItems/{category}", params=self._page_params(cursor, limit)))
+
+    async def a_get_item_info(self, item_id):
+        return self._json(await transport.aget(f"/getItemInfo/{item_id}"))
+
+    async def a_search_items(self, query, limit=10):
+        return self._json(await transport.aget("/search", params={"q": query, "limit": limit}))
+
+    async def a_add_to_cart(self, user_id, item_id, quantity):
+        payload = {"user_id": user_id, "item_id": item_id, "quantity": quantity}
+        return self._json(await transport.apost("/cart/add", json=payload))
+
+    async def a_remove_from_cart(self, user_id, item_id):
+        return self._json(await transport.apost("/cart/remove", json={"user_id": user_id, "item_id": item_id}))
+
+    async def a_update_cart(self, user_id, operations):
+        payload = {"user_id": user_id, "operations": operations}
+        return self._json(await transport.apost("/cart/bulk", json=payload))
+
+    async def a_view_cart(self, user_id):
+        return self._json(await transport.aget("/cart", params={"user_id": user_id}))
+
+    async def a_confirm_order(self, user_id, idempotency_key=None):
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        return self._json(await transport.apost("/order/confirm", json={"user_id": user_id}, headers=headers,
+                                                idempotent=bool(idempotency_key)))
+
+
+# The service layer's modules under BACKEND_PATH, dependencies first. Loaded
+# by file rather than by putting BACKEND_PATH on sys.path, where its main.py
+# would sit next to this app's
+SERVICE_MODULES = (
+    "session_codec", "metrics", "near_cache", "redis_connection", "cart_store",
+    "search", "catalog", "orders", "services",
+)
+
+
+def load_service_module(name: str, path: str = None):
+    """Import the service layer's module ``name`` (e.g. "metrics") from ``path``
+    (BACKEND_PATH) by file, once per process."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(path or config.BACKEND_PATH, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    # Registered first, so the later modules' plain imports find it
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def _import_services(path: str):
+    for name in SERVICE_MODULES:
+        load_service_module(name, path)
+    return sys.modules["services"]
+
+
+class InProcessBackend:
+    """Calls the service layer directly.
+
+    The services use an asyncio Redis pool, which is bound to the loop that
+    opened its connections, so all cart/order calls run on one private loop
+    thread whether they come from sync tools or from another event loop.
+    Catalog reads are plain function calls on the current snapshot. Calls
+    that don't finish within ``timeout`` (BACKEND_TIMEOUT, as for HTTP) are
+    cancelled and raise TimeoutError.
+    """
+
+    def __init__(self, path: str = None, timeout: float = None):
+        services = _import_services(path or config.BACKEND_PATH)
+        orders = sys.modules["orders"]
+        redis_connection = sys.modules["redis_connection"]
+
+        self.services = services
+        self.timeout = config.BACKEND_TIMEOUT if timeout is None else timeout
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="inprocess-backend", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(
+            services.catalog.watch(services.CATALOG_POLL_SECONDS), self._loop
+        )
+        asyncio.run_coroutine_threadsafe(redis_connection.watch_near_cache(), self._loop)
+        if orders.ORDER_LOG_CONSUMER:
+            asyncio.run_coroutine_threadsafe(orders.consume(), self._loop)
+
+    def close(self, timeout: float = 5):
+        """Cancel the background tasks and stop the private loop."""
+        async def cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel_all(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _call(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except self.services.ServiceError as e:
+            raise BackendError(e.status_code, e.detail)
+
+    def _run(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+        except self.services.ServiceError as e:
+            raise BackendError(e.status_code, e.detail)
+
+    async def _arun(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            # Cancelling the wrapper on timeout cancels the call on the backend loop
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except self.services.ServiceError as e:
+            raise BackendError(e.status_code, e.detail)
+
+    def catalog_version(self):
+        return self.services.catalog_version()
+
+    def get_categories(self):
+        return self._call(self.services.list_categories)
+
+    def get_category_items(self, category, cursor=None, limit=None):
+        return self._call(self.services.list_items, category, limit, cursor)
+
+    def get_item_info(self, item_id):
+        return self._call(self.services.item_info, item_id)
+
+    def search_items(self, query, limit=10):
+        return self._call(self.services.search_items, query, limit)
+
+    def add_to_cart(self, user_id, item_id, quantity):
+        return self._run(self.services.add_to_cart(user_id, item_id, quantity))
+
+    def remove_from_cart(self, user_id, item_id):
+        return self._run(self.services.remove_from_cart(user_id, item_id))
+
+    def update_cart(self, user_id, operations):
+        return self._run(self.services.update_cart(user_id, operations))
+
+    def view_cart(self, user_id):
+        return self._run(self.services.view_cart(user_id))
+
+    def confirm_order(self, user_id, idempotency_key=None):
+        return self._run(self.services.confirm_order(user_id, idempotency_key))
+
+    async def a_catalog_version(self):
+        return self.catalog_version()
+
+    async def a_get_categories(self):
+        return self.get_categories()
+
+    async def a_get_category_items(self, category, cursor=None, limit=None):
+        return self.get_category_items(category, cursor, limit)
+
+    async def a_get_item_info(self, item_id):
+        return self.get_item_info(item_id)
+
+    async def a_search_items(self, query, limit=10):
+        return self.search_items(query, limit)
+
+    async def a_add_to_cart(self, user_id, item_id, quantity):
+        return await self._arun(self.services.add_to_cart(user_id, item_id, quantity))
+
+    async def a_remove_from_cart(self, user_id, item_id):
+        return await self._arun(self.services.remove_from_cart(user_id, item_id))
+
+    async def a_update_cart(self, user_id, operations):
+        return await self._arun(self.services.update_cart(user_id, operations))
+
+    async def a_view_cart(self, user_id):
+        return await self._arun(self.services.view_cart(user_id))
+
+    async def a_confirm_order(self, user_id, idempotency_key=None):
+        return await self._arun(self.services.confirm_order(user_id, idempotency_key))
+
+
+BACKENDS = {
+    "http": HttpBackend,
+    "inprocess": InProcessBackend,
+}
+
+_backend = None
+_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                if config.BACKEND_MODE not in BACKENDS:
+                    raise ValueError(f"Unknown BACKEND_MODE: {config.BACKEND_MODE}")
+                _backend = BACKENDS[config.BACKEND_MODE]()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
@@ -1 +1,109 @@
-# Add your config like API keys or model settings here
\ No newline at end of file
+# Add your config like API keys or model settings here
+import os
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# Credentials. .env is read once, here; other modules take settings from config
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+
+# Backend (main.py) used by the agent tools
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "5"))
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "1"))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "2"))
+BACKEND_RETRY_BACKOFF = float(os.getenv("BACKEND_RETRY_BACKOFF", "0.1"))
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "50"))
+BACKEND_MAX_KEEPALIVE = int(os.getenv("BACKEND_MAX_KEEPALIVE", "20"))
+
+# How tools reach the backend: "http" (BACKEND_URL) or "inprocess" (import the
+# service layer from BACKEND_PATH and call it directly, no HTTP round trip)
+BACKEND_MODE = os.getenv("BACKEND_MODE", "http")
+BACKEND_PATH = os.getenv("BACKEND_PATH", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Per-user conversations kept in memory (LRU + idle TTL)
+MAX_CONVERSATIONS = int(os.getenv("MAX_CONVERSATIONS", "1000"))
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "1800"))
+
+# Webhook queue: messages are acknowledged at once and processed by workers.
+# Each worker runs one turn at a time, so this caps concurrent conversations
+QUEUE_WORKERS = int(os.getenv("QUEUE_WORKERS", "64"))
+QUEUE_MAX_PENDING = int(os.getenv("QUEUE_MAX_PENDING", "1000"))
+DEDUPE_TTL_SECONDS = float(os.getenv("DEDUPE_TTL_SECONDS", "3600"))
+
+# Model per agent. The Orchestrator and group chat speaker selection only
+# route, so they get the cheaper, faster LLM_ROUTING_MODEL; AGENT_MODELS
+# overrides any agent ("CartAgent=gpt-4o,speaker_selection=gpt-4o-mini")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4-0613")
+LLM_ROUTING_MODEL = os.getenv("LLM_ROUTING_MODEL", "gpt-4o-mini")
+AGENT_MODELS = {
+    "Orchestrator": LLM_ROUTING_MODEL,
+    "speaker_selection": LLM_ROUTING_MODEL,
+    **dict(pair.strip().split("=", 1) for pair in os.getenv("AGENT_MODELS", "").split(",") if "=" in pair),
+}
+
+# Prompt budget (see prompt_budget.py): minified function schemas, and only
+# the functions relevant to the user's message. Token accounting is always on
+PROMPT_BUDGET = os.getenv("PROMPT_BUDGET", "true").lower() in ("1", "true", "yes")
+
+# LLM reply cache: "memory", "disk", "redis" or "off"
+LLM_CACHE = os.getenv("LLM_CACHE", "memory")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".cache/llm")
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+# Memoized catalog tool results, dropped when the catalog version changes
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048"))
+CATALOG_VERSION_CHECK_SECONDS = float(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "2"))
+
+# Conversation history: last N turns verbatim, older ones summarized
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "6"))
+HISTORY_SUMMARY_CHARS = int(os.getenv("HISTORY_SUMMARY_CHARS", "1500"))
+
+# Outbound WhatsApp messages (see outbound.py). TWILIO_API_URL points the
+# Twilio client elsewhere, e.g. at fake_twilio.py
+TWILIO_API_URL = os.getenv("TWILIO_API_URL")
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "4"))
+OUTBOUND_MAX_PENDING = int(os.getenv("OUTBOUND_MAX_PENDING", "1000"))
+OUTBOUND_ACCOUNT_RATE = float(os.getenv("OUTBOUND_ACCOUNT_RATE", "20"))
+OUTBOUND_ACCOUNT_BURST = float(os.getenv("OUTBOUND_ACCOUNT_BURST", "20"))
+OUTBOUND_NUMBER_RATE = float(os.getenv("OUTBOUND_NUMBER_RATE", "1"))
+OUTBOUND_NUMBER_BURST = float(os.getenv("OUTBOUND_NUMBER_BURST", "3"))
+OUTBOUND_RETRIES = int(os.getenv("OUTBOUND_RETRIES", "3"))
+OUTBOUND_RETRY_BACKOFF = float(os.getenv("OUTBOUND_RETRY_BACKOFF", "0.5"))
+OUTBOUND_COALESCE_SECONDS = float(os.getenv("OUTBOUND_COALESCE_SECONDS", "0.3"))
+
+# Send the first useful step of a turn (e.g. a tool result) before the turn ends
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "true").lower() in ("1", "true", "yes")
+
+# Build the agents in the background at startup; false: on the first message
+AGENTS_PRELOAD = os.getenv("AGENTS_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Agent turns run in a bounded thread pool, each with a timeout (see engine.py)
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "32"))
+TURN_TIMEOUT_SECONDS = float(os.getenv("TURN_TIMEOUT_SECONDS", "60"))
+# How long a timed out turn gets to reach its next step and stop
+TURN_STOP_TIMEOUT_SECONDS = float(os.getenv("TURN_STOP_TIMEOUT_SECONDS", "30"))
+
+# Where conversations and the inbound queue live: "memory" (one worker) or
+# "redis" (any number of workers and replicas, see state.py). A user whose
+# worker died is picked up by another one after QUEUE_CLAIM_IDLE_SECONDS
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+CONVERSATION_STATE_TTL_SECONDS = float(os.getenv("CONVERSATION_STATE_TTL_SECONDS", str(24 * 3600)))
+QUEUE_CLAIM_IDLE_SECONDS = float(os.getenv("QUEUE_CLAIM_IDLE_SECONDS", str(2 * TURN_TIMEOUT_SECONDS + 30)))
+
+# Worker processes serving this app (serve.py sets it); account-wide limits
+# such as OUTBOUND_ACCOUNT_RATE are split between them
+WORKERS = max(1, int(os.getenv("WORKERS", "1")))
+
+# Logging and tracing (see telemetry.py). Per-message logs and span records
+# are sampled; warnings, errors and slow or failed turns are always logged
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "10"))
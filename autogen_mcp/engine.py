@@ -0,0 +1,139 @@
+"""Execution engine for blocking agent turns.
+
+Turns run in a bounded thread pool, so a burst of conversations can't
+spawn unbounded threads and the event loop stays free. Each turn has a
+timeout. AutoGen turns can't be killed mid-call, so cancellation is
+cooperative: a reply function registered first on every agent returns "no
+reply" once the turn's manager is cancelled, which ends the group chat at
+its next step. The caller waits up to ``stop_timeout`` for that step to
+finish before it gets ``TurnTimeout``. A turn that outlives even that (a
+hung LLM or tool call) keeps its manager marked as stuck, and further turns
+of that manager fail fast with ``TurnTimeout`` until it returns, so the
+conversation is never touched by two turns at once.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class TurnTimeout(Exception):
+    pass
+
+
+class ExecutionEngine:
+    def __init__(self, max_workers: int = 32, turn_timeout: float = 60, stop_timeout: float = 30):
+        self.max_workers = max_workers
+        self.turn_timeout = turn_timeout
+        self.stop_timeout = stop_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-turn")
+        self._active = set()
+        self._cancelled = set()
+        self._stuck = set()
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self._busy_seconds = 0.0
+
+    def install(self, *agents):
+        """Let these agents stop a cancelled turn at their next reply."""
+        from autogen import Agent
+
+        for agent in agents:
+            agent.register_reply([Agent, None], self._cancel_reply, position=0)
+
+    def _cancel_reply(self, recipient, messages=None, sender=None, config=None):
+        # ``sender`` is the group chat manager asking this agent to speak
+        if sender in self._cancelled:
+            return True, None
+        return False, None
+
+    def cancel(self, manager):
+        """Stop ``manager``'s turn at its next step (or before it starts)."""
+        with self._lock:
+            if manager in self._active:
+                self._cancelled.add(manager)
+
+    def _call(self, manager, fn, args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        start = time.perf_counter()
+        try:
+            if manager not in self._cancelled:
+                return fn(*args)
+        finally:
+            with self._lock:
+                self._busy_seconds += time.perf_counter() - start
+                self.running -= 1
+                self._active.discard(manager)
+                self._cancelled.discard(manager)
+                self._stuck.discard(manager)
+
+    async def run(self, manager, fn, *args, timeout: float = None):
+        """Run ``fn(*args)`` (a turn of ``manager``'s group chat) in the pool.
+
+        Raises TurnTimeout after ``timeout`` seconds, or at once while a
+        previous turn of ``manager`` is stuck; cancelling the caller also
+        stops the turn at its next step.
+        """
+        with self._lock:
+            if manager in self._stuck:
+                self.timeouts += 1
+                raise TurnTimeout()
+            self._active.add(manager)
+            self.queued += 1
+        # The turn runs with the caller's context (e.g. its telemetry span)
+        context = contextvars.copy_context()
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, context.run, self._call, manager, fn, args
+        )
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout or self.turn_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.cancel(manager)
+            logger.warning("Turn timed out after %.1fs, stopping it", timeout or self.turn_timeout)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.stop_timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if manager in self._active:
+                        self._stuck.add(manager)
+                logger.error("Timed out turn still running after %.1fs more", self.stop_timeout)
+            except Exception:
+                pass
+            raise TurnTimeout()
+        except asyncio.CancelledError:
+            self.cancel(manager)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return result
+
+    def shutdown(self):
+        # Running turns stop after their current step
+        with self._lock:
+            self._cancelled.update(self._active)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "stuck": len(self._stuck),
+            "busy_s": round(self._busy_seconds, 2),
+        }
@@ -0,0 +1,237 @@
+"""Local stand-in for the OpenAI chat completions API, for tests and benchmarks.
+
+Replies are scripted, not generated, so runs are repeatable and free. The
+script plays each agent the way the prompts ask it to:
+
+- group chat speaker selection: Orchestrator first, then the specialist the
+  user's message is about, then back to User once that specialist has answered
+- specialists: call the matching function (search_items, add_to_cart,
+  update_cart_items for a list, view_cart, confirm_order, ...) once per user
+  message, then summarize the function result in text
+- Orchestrator: one routing sentence
+
+Point the apps at it with ``OPENAI_BASE_URL=http://127.0.0.1:8091/v1`` (read by
+the OpenAI client) and run:
+
+    uvicorn fake_llm:app --port 8091
+
+``FAKE_LLM_LATENCY_MS`` adds a delay per call, ``FAKE_LLM_TOKEN_MS`` a delay
+per completion token and ``FAKE_LLM_PROMPT_TOKEN_MS`` a delay per prompt
+token. ``FAKE_LLM_MODEL_LATENCY_MS`` ("gpt-4o-mini=100,gpt-4-0613=300")
+overrides the per-call delay for some models, as smaller models answer
+sooner. Token counts are estimated at 4 characters a token. ``GET /stats``
+reports calls and tokens (total, per agent, per model, per kind of reply);
+``DELETE /stats`` resets them.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "0"))
+PROMPT_TOKEN_MS = float(os.getenv("FAKE_LLM_PROMPT_TOKEN_MS", "0"))
+MODEL_LATENCY_MS = {
+    model.strip(): float(ms)
+    for model, _, ms in (pair.partition("=") for pair in os.getenv("FAKE_LLM_MODEL_LATENCY_MS", "").split(","))
+    if ms
+}
+CHARS_PER_TOKEN = 4
+
+app = FastAPI()
+counters = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+by_agent = {}
+by_model = {}
+by_kind = {}
+
+_USER_MESSAGE = re.compile(r"\(user_id: ([^)]+)\)\s*(.*)", re.S)
+_SELECT = re.compile(r"select the next role from `?\[([^\]]*)\]")
+_AGENT_NAME = re.compile(r"You are the (\w+)")
+_ITEM_LINE = re.compile(r"^\[(\d+)\] ([^:]+):", re.M)
+_QUANTITY = re.compile(r"\b(\d+(?:\.\d+)?)\b")
+_FILLER = {"do", "you", "have", "any", "some", "the", "a", "an", "i", "want", "to", "please", "show", "me",
+           "what", "is", "are", "price", "of", "for", "how", "much", "find", "search", "add", "buy", "kg",
+           "g", "l", "ml", "my", "cart", "remove", "and"}
+
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _content(message) -> str:
+    content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def _intent(text: str) -> str:
+    text = text.lower()
+    if any(word in text for word in ("order", "checkout", "check out", "confirm")):
+        return "OrderAgent"
+    if any(word in text for word in ("cart", "add", "buy", "remove", "basket")):
+        return "CartAgent"
+    return "ItemAgent"
+
+
+def _last_user_turn(messages):
+    """(user_id, text, messages after it) for the newest user message."""
+    for i in range(len(messages) - 1, -1, -1):
+        match = _USER_MESSAGE.search(_content(messages[i]))
+        if match and messages[i].get("role") != "system":
+            return match.group(1), match.group(2).strip(), messages[i + 1:]
+    return "", "", []
+
+
+def _query(text: str) -> str:
+    words = [w for w in re.findall(r"[a-z]+", text.lower()) if w not in _FILLER]
+    return " ".join(words[-2:]) or "apple"
+
+
+def _item_id(messages, query: str) -> int:
+    # Newest listing that mentions the product, as a model would read it
+    for message in reversed(messages):
+        for item_id, name in _ITEM_LINE.findall(_content(message)):
+            if any(word.rstrip("s") in name.lower() for word in query.split()):
+                return int(item_id)
+    return 1
+
+
+def _call_for(name: str, functions, user_id: str, text: str, messages):
+    """Which function ``name`` would call for ``text``, with arguments."""
+    lowered = text.lower()
+    query = _query(text)
+    wanted = {
+        "ItemAgent": ("get_categories", {}) if "categor" in lowered else ("search_items", {"query": query}),
+        "OrderAgent": ("confirm_order", {"user_id": user_id}),
+    }.get(name)
+    if name == "CartAgent":
+        if "remove" in lowered:
+            wanted = ("remove_from_cart", {"user_id": user_id, "item_id": _item_id(messages, query)})
+        elif ("add" in lowered or "buy" in lowered) and len(parts := re.split(r",|\band\b", lowered)) > 1 \
+                and "update_cart_items" in functions:
+            # A shopping list goes in one bulk call
+            items = []
+            for part in parts:
+                quantity = _QUANTITY.search(part)
+                items.append({"item_id": _item_id(messages, _query(part)),
+                              "quantity": float(quantity.group(1)) if quantity else 1})
+            wanted = ("update_cart_items", {"user_id": user_id, "items": items})
+        elif "add" in lowered or "buy" in lowered:
+            quantity = _QUANTITY.search(lowered)
+            wanted = ("add_to_cart", {"user_id": user_id, "item_id": _item_id(messages, query),
+                                      "quantity": float(quantity.group(1)) if quantity else 1})
+        else:
+            wanted = ("view_cart", {"user_id": user_id})
+    if wanted and wanted[0] in functions:
+        return wanted
+    return None
+
+
+def script(body: dict):
+    """Return (kind, agent, message) for a chat completion request."""
+    messages = body.get("messages", [])
+    system = next((_content(m) for m in messages if m.get("role") == "system"), "")
+    agent = (_AGENT_NAME.search(system) or [None, "unknown"])[1]
+    user_id, text, tail = _last_user_turn(messages)
+    intent = _intent(text)
+
+    for message in reversed(messages):
+        select = _SELECT.search(_content(message))
+        if select:
+            roles = [r.strip(" '\"") for r in select.group(1).split(",")]
+            spoken = [m for m in tail if m.get("role") != "system"]
+            answered = {m.get("name") for m in spoken if _content(m) not in ("", "None")
+                        and m.get("role") not in ("function", "tool")}
+            caller = None
+            if spoken and spoken[-1].get("role") in ("function", "tool"):
+                # The agent that asked for a function explains its result
+                caller = next((m.get("name") for m in reversed(spoken)
+                               if m.get("function_call") or m.get("tool_calls")), None)
+            if "Orchestrator" not in answered and "Orchestrator" in roles:
+                choice = "Orchestrator"
+            elif caller in roles:
+                choice = caller
+            elif intent not in answered and intent in roles:
+                choice = intent
+            else:
+                choice = "User" if "User" in roles else roles[0]
+            return "select", "speaker_selection", {"role": "assistant", "content": choice}
+
+    functions = [f["name"] for f in body.get("functions") or []]
+    functions += [t["function"]["name"] for t in body.get("tools") or []]
+    if not functions:
+        if agent == "Orchestrator":
+            return "route", agent, {"role": "assistant", "content": f"Let me ask the {intent} to help with that."}
+        return "text", agent, {"role": "assistant", "content": "OK."}
+
+    last = messages[-1] if messages else {}
+    if last.get("role") in ("function", "tool"):
+        result = _content(last)
+        return "answer", agent, {"role": "assistant", "content": f"Here is what I found:\n{result}"}
+    called = any(m.get("function_call") or m.get("tool_calls") for m in tail)
+    call = None if called else _call_for(agent, functions, user_id, text, messages)
+    if call is None:
+        return "text", agent, {"role": "assistant", "content": "Anything else I can help you with?"}
+    name, arguments = call
+    if body.get("functions"):
+        return "function_call", agent, {"role": "assistant", "content": None,
+                                        "function_call": {"name": name, "arguments": json.dumps(arguments)}}
+    return "function_call", agent, {"role": "assistant", "content": None, "tool_calls": [{
+        "id": "call_" + uuid.uuid4().hex[:24], "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    kind, agent, message = script(body)
+
+    prompt_tokens = sum(_tokens(json.dumps(m)) for m in body.get("messages", []))
+    prompt_tokens += _tokens(json.dumps(body.get("functions") or body.get("tools") or []))
+    completion_tokens = max(1, _tokens(json.dumps(message)))
+    model = body.get("model", "fake")
+    delay = MODEL_LATENCY_MS.get(model, LATENCY_MS) + TOKEN_MS * completion_tokens + PROMPT_TOKEN_MS * prompt_tokens
+    if delay:
+        await asyncio.sleep(delay / 1000)
+
+    counters["calls"] += 1
+    counters["prompt_tokens"] += prompt_tokens
+    counters["completion_tokens"] += completion_tokens
+    for stats in (by_agent.setdefault(agent, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}),
+                  by_model.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})):
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+    by_kind[kind] = by_kind.get(kind, 0) + 1
+
+    finish = "function_call" if message.get("function_call") else "tool_calls" if message.get("tool_calls") else "stop"
+    return {
+        "id": "chatcmpl-" + uuid.uuid4().hex,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**counters, "by_agent": by_agent, "by_model": by_model, "by_kind": by_kind}
+
+
+@app.delete("/stats")
+async def clear_stats():
+    counters.update(calls=0, prompt_tokens=0, completion_tokens=0)
+    by_agent.clear()
+    by_model.clear()
+    by_kind.clear()
+    return {"cleared": True}
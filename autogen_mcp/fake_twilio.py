@@ -0,0 +1,88 @@
+"""Local stand-in for Twilio's Messages API, for tests and benchmarks.
+
+Point the apps at it with ``TWILIO_API_URL=http://127.0.0.1:8090`` and run:
+
+    uvicorn fake_twilio:app --port 8090
+
+``FAKE_TWILIO_LATENCY_MS`` adds a delay per message and ``FAKE_TWILIO_RATE``
+(messages/second, account-wide) answers 429 above that rate, like Twilio's
+own throttling. ``GET /messages`` lists what was "sent"; ``DELETE`` clears it.
+``GET /messages/wait`` blocks until a number has received more than ``after``
+messages, so load tests don't have to poll.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+
+from fastapi import FastAPI, Form
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("FAKE_TWILIO_LATENCY_MS", "50"))
+RATE = float(os.getenv("FAKE_TWILIO_RATE", "0"))  # 0 = unlimited
+KEEP = int(os.getenv("FAKE_TWILIO_KEEP", "10000"))
+
+app = FastAPI()
+messages = deque(maxlen=KEEP)
+counters = {"accepted": 0, "throttled": 0}
+received = {}  # To -> messages accepted
+_arrived = asyncio.Condition()
+_window = deque()
+
+
+def _throttled() -> bool:
+    if not RATE:
+        return False
+    now = time.monotonic()
+    while _window and now - _window[0] > 1:
+        _window.popleft()
+    if len(_window) >= RATE:
+        return True
+    _window.append(now)
+    return False
+
+
+@app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+async def create_message(account_sid: str, To: str = Form(...), Body: str = Form(""), From: str = Form("")):
+    if _throttled():
+        counters["throttled"] += 1
+        return JSONResponse(status_code=429, content={
+            "code": 20429, "message": "Too Many Requests", "status": 429,
+        })
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    sid = "SM" + uuid.uuid4().hex
+    messages.append({"sid": sid, "to": To, "from": From, "body": Body, "ts": time.time()})
+    counters["accepted"] += 1
+    received[To] = received.get(To, 0) + 1
+    async with _arrived:
+        _arrived.notify_all()
+    return JSONResponse(status_code=201, content={
+        "sid": sid, "account_sid": account_sid, "to": To, "from": From, "body": Body,
+        "status": "queued", "num_segments": "1", "direction": "outbound-api",
+    })
+
+
+@app.get("/messages")
+async def list_messages(to: str = None, limit: int = 100):
+    items = [m for m in messages if to is None or m["to"] == to]
+    return {"count": len(items), **counters, "messages": items[-limit:] if limit else []}
+
+
+@app.get("/messages/wait")
+async def wait_messages(to: str, after: int = 0, timeout: float = 30):
+    try:
+        async with _arrived:
+            await asyncio.wait_for(_arrived.wait_for(lambda: received.get(to, 0) > after), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return {"to": to, "count": received.get(to, 0)}
+
+
+@app.delete("/messages")
+async def clear_messages():
+    messages.clear()
+    received.clear()
+    counters.update(accepted=0, throttled=0)
+    return {"cleared": True}
@@ -0,0 +1,207 @@
+"""Exact-match cache for the agents' LLM replies.
+
+The key is a hash of the model, the function/tool schemas and the prompt
+with whitespace and case normalized. User ids from the "(user_id: ...)"
+prefix are swapped for a placeholder in both the key and the stored reply,
+so "what categories do you have" is shared by all users while a cached
+``view_cart`` call is still made with the current user's id.
+
+Stores: in-memory LRU, a local diskcache directory, or Redis (entries expire
+after the TTL; set ``maxmemory-policy allkeys-lru`` for LRU on the server).
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+logger = logging.getLogger(__name__)
+
+USER_PLACEHOLDER = "<user_id>"
+# Shorter ids are not templated: replacing them in a reply could hit unrelated text
+MIN_USER_ID_LENGTH = 6
+_USER_ID = re.compile(r"\(user_id: ([^)\s]+)\)")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def schema_hash(schemas) -> str:
+    if not schemas:
+        return ""
+    return hashlib.sha256(json.dumps(schemas, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class MemoryStore:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskStore:
+    # diskcache bounds the directory by bytes; budget a few KB per reply
+    ENTRY_BYTES = 4096
+
+    def __init__(self, directory: str, max_entries: int, ttl_seconds: float):
+        import diskcache  # installed with autogen
+
+        self.ttl_seconds = ttl_seconds
+        self._cache = diskcache.Cache(
+            directory, eviction_policy="least-recently-used", size_limit=max_entries * self.ENTRY_BYTES
+        )
+
+    def get(self, key: str):
+        return self._cache.get(key)
+
+    def set(self, key: str, value: str):
+        self._cache.set(key, value, expire=self.ttl_seconds)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class RedisStore:
+    prefix = "llmcache:"
+
+    def __init__(self, url: str, ttl_seconds: float):
+        import redis
+
+        self.ttl_seconds = int(ttl_seconds)
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str):
+        return self._redis.get(self.prefix + key)
+
+    def set(self, key: str, value: str):
+        self._redis.set(self.prefix + key, value, ex=self.ttl_seconds)
+
+    def __len__(self):
+        return sum(1 for _ in self._redis.scan_iter(self.prefix + "*", count=1000))
+
+
+class LLMCache:
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def key(self, agent, messages):
+        """Return ``(key, user_id)`` for a prompt; user_id is the first one found, or None."""
+        user_id = None
+        normalized = []
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                if user_id is None:
+                    match = _USER_ID.search(content)
+                    if match and len(match.group(1)) >= MIN_USER_ID_LENGTH:
+                        user_id = match.group(1)
+                content = normalize_text(content)
+                if user_id:
+                    content = content.replace(user_id.lower(), USER_PLACEHOLDER)
+            entry = {k: message[k] for k in ("role", "name", "function_call", "tool_calls", "tool_call_id")
+                     if message.get(k) is not None}
+            entry["content"] = content
+            normalized.append(entry)
+
+        llm_config = agent.llm_config or {}
+        models = [c.get("model") for c in llm_config.get("config_list", [])]
+        payload = json.dumps({
+            "models": models,
+            "functions": schema_hash(llm_config.get("functions")),
+            "tools": schema_hash(llm_config.get("tools")),
+            "temperature": llm_config.get("temperature"),
+            "messages": normalized,
+        }, sort_keys=True, default=str)
+        if user_id:
+            payload = payload.replace(user_id, USER_PLACEHOLDER)
+        return hashlib.sha256(payload.encode()).hexdigest(), user_id
+
+    def get(self, key: str, user_id=None):
+        try:
+            value = self.store.get(key)
+        except Exception:
+            self.errors += 1
+            logger.exception("LLM cache read failed")
+            return None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if user_id:
+            value = value.replace(USER_PLACEHOLDER, user_id)
+        return json.loads(value)
+
+    def set(self, key: str, reply, user_id=None):
+        value = json.dumps(reply)
+        if user_id:
+            value = value.replace(user_id, USER_PLACEHOLDER)
+        try:
+            self.store.set(key, value)
+        except Exception:
+            self.errors += 1
+            logger.exception("LLM cache write failed")
+
+    def install(self, *agents):
+        """Prepare these agents for replies served from the cache (see llm_reply.py)."""
+        for agent in agents:
+            if not agent.llm_config:
+                continue
+            # AutoGen's own disk cache (cache_seed, on by default) never expires; this one replaces it
+            agent.llm_config["cache_seed"] = None
+            for client_config in agent.client._config_list:
+                client_config["cache_seed"] = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def create_llm_cache():
+    """The LLMCache configured by ``LLM_CACHE``, or None when it is off."""
+    if config.LLM_CACHE == "memory":
+        store = MemoryStore(config.LLM_CACHE_MAX_ENTRIES, config.LLM_CACHE_TTL_SECONDS)
+    elif config.LLM_CACHE == "disk":
+        store = DiskStore(config.LLM_CACHE_DIR, config.LLM_CACHE_MAX_ENTRIES, config.LLM_CACHE_TTL_SECONDS)
+    elif config.LLM_CACHE == "redis":
+        store = RedisStore(config.LLM_CACHE_REDIS_URL, config.LLM_CACHE_TTL_SECONDS)
+    elif config.LLM_CACHE == "off":
+        return None
+    else:
+        raise ValueError(f"Unknown LLM_CACHE: {config.LLM_CACHE}")
+    return LLMCache(store)
@@ -0,0 +1,62 @@
+"""How the specialist agents turn a prompt into an LLM reply.
+
+``LLMReply.install(*agents)`` swaps ConversableAgent's ``generate_oai_reply``
+(sync and async) for one reply function, through AutoGen's public
+``replace_reply_func``. Per reply, in this order:
+
+1. llm_cache.py: a cached reply is returned as is; nothing else runs;
+2. prompt_budget.py: the prompt is accounted and the client sending only
+   the functions it needs is picked;
+3. the LLM call, through the agent's own ``generate_oai_reply`` with that
+   client, timed and counted by telemetry.py's AutoGen runtime logger;
+4. the reply is stored in the cache.
+
+Either the cache or the budget can be left out.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LLMReply:
+    def __init__(self, cache=None, budget=None):
+        self.cache = cache
+        self.budget = budget
+
+    def install(self, *agents):
+        from autogen import ConversableAgent
+
+        agents = [agent for agent in agents if agent.llm_config]
+        if self.budget:
+            self.budget.install(*agents)
+        if self.cache:
+            self.cache.install(*agents)
+        for agent in agents:
+            agent.replace_reply_func(ConversableAgent.generate_oai_reply, self.generate)
+            agent.replace_reply_func(ConversableAgent.a_generate_oai_reply, self.a_generate)
+
+    def generate(self, agent, messages=None, sender=None, config=None):
+        """Reply function (``config`` is its registered config, unused)."""
+        if messages is None:
+            messages = agent.chat_messages[sender]
+        # The prompt as it would be sent, which both the cache key and the budget read
+        prompt = [{"content": agent.system_message, "role": "system"}] + messages
+
+        key = user_id = None
+        if self.cache:
+            key, user_id = self.cache.key(agent, prompt)
+            reply = self.cache.get(key, user_id)
+            if reply is not None:
+                logger.info("LLM cache hit for %s", agent.name)
+                return True, reply
+
+        client = self.budget.client_for(agent, prompt) if self.budget else None
+        final, reply = agent.generate_oai_reply(messages, sender, config=client)
+
+        if final and self.cache:
+            self.cache.set(key, reply, user_id)
+        return final, reply
+
+    async def a_generate(self, agent, messages=None, sender=None, config=None):
+        return await asyncio.to_thread(self.generate, agent, messages, sender, config)
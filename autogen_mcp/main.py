@@ -1,102 +1,251 @@
-from fastapi import FastAPI, Form
-from twilio.rest import Client
-from twilio.twiml.messaging_response import MessagingResponse
-from autogen import UserProxyAgent, GroupChat, GroupChatManager
-from agents.orchestrator import create_orchestrator_agent
-from agents.item_agent import create_item_agent
-from agents.cart_agent import create_cart_agent
-from agents.order_agent import create_order_agent
-from dotenv import load_dotenv
-import os
-
-# Load environment variables
-load_dotenv(override=True)
-
-# Twilio setup
-TWILIO_PHONE = os.getenv("TWILIO_PHONE_NUMBER")
-TWILIO_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-twilio_client = Client(TWILIO_SID, TWILIO_TOKEN)
-
-# OpenAI API Key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-app = FastAPI()
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, Response
+from session.conversations import Conversation, ConversationManager
+from session.history import HistoryPolicy
+from agents.cart_agent import view_cart
+from message_queue import InboundMessage
+from state import create_conversation_store, create_inbound_queue
+from router import IntentRouter, turn_messages
+from llm_cache import create_llm_cache
+from prompt_budget import PromptBudget
+from llm_reply import LLMReply
+from tool_cache import catalog_memo
+from outbound import create_dispatcher, twilio_client
+from streaming import ReplyMetrics, StreamRegistry, TurnStream
+from engine import ExecutionEngine, TurnTimeout
+from registry import AgentRegistry
+import config
+import telemetry
+import transport
+import asyncio
+import logging
+import time
+
+telemetry.configure_logging()
+logger = logging.getLogger(__name__)
+request_log = telemetry.sampled_logger(__name__ + ".requests")
 
 def send_reply_to_user(reply: str, sender: str = None):
-    print("✅ CALLBACK TRIGGERED!")
-    print(f"[{sender}] says: {reply}")
+    logger.debug("[%s] says: %s", sender, reply)
     if sender:
-        twilio_client.messages.create(
-            from_=f"whatsapp:{TWILIO_PHONE}",
+        twilio_client().messages.create(
+            from_=f"whatsapp:{config.TWILIO_PHONE_NUMBER}",
             to=sender,
             body=reply
         )
 
-# Create AutoGen agents
-user_proxy = UserProxyAgent(
-    name="User",
-    code_execution_config=False,
-    human_input_mode="ALWAYS"
+# One coalesced, rate-limited message per turn, sent from a thread pool
+outbound = create_dispatcher(lambda to, body: send_reply_to_user(body, sender=to))
+
+llm_cache = create_llm_cache()
+# Per-agent prompt token accounting; trims the function schemas sent when PROMPT_BUDGET is on
+prompt_budget = PromptBudget(enabled=config.PROMPT_BUDGET)
+# Cache, then budget, then the LLM call (see llm_reply.py)
+llm_reply = LLMReply(cache=llm_cache, budget=prompt_budget)
+
+def create_conversation(user_id: str) -> Conversation:
+    from autogen import UserProxyAgent, GroupChat, GroupChatManager
+
+    user_proxy = UserProxyAgent(
+        name="User",
+        code_execution_config=False,
+        human_input_mode="NEVER"
+    )
+
+    # Group chat setup
+    group_chat = GroupChat(
+        agents=[user_proxy, *agents.get()],
+        messages=[],
+        max_round=20  # avoid infinite loop
+    )
+
+    manager = GroupChatManager(
+        groupchat=group_chat,
+        llm_config={
+            "config_list": [
+                {
+                    "model": config.AGENT_MODELS.get("speaker_selection", config.LLM_MODEL),
+                    "api_key": config.OPENAI_API_KEY
+                }
+            ]
+        }
+    )
+    return Conversation(user_id, user_proxy, manager)
+
+# Last few turns verbatim, older ones summarized, cart pinned
+history = HistoryPolicy(
+    max_turns=config.HISTORY_MAX_TURNS,
+    summary_chars=config.HISTORY_SUMMARY_CHARS,
+    pin_state=view_cart,
 )
 
-orchestrator = create_orchestrator_agent()
-item_agent = create_item_agent()
-cart_agent = create_cart_agent()
-order_agent = create_order_agent()
-
-# Group chat setup
-group_chat = GroupChat(
-    agents=[user_proxy, orchestrator, item_agent, cart_agent, order_agent],
-    messages=[],
-    max_round=50
+conversations = ConversationManager(
+    create_conversation,
+    max_sessions=config.MAX_CONVERSATIONS,
+    ttl_seconds=config.CONVERSATION_TTL_SECONDS,
+    store=create_conversation_store(),
+    on_restore=history.restore,
 )
 
-manager = GroupChatManager(
-    groupchat=group_chat,
-    llm_config={
-        "config_list": [
-            {
-                "model": "gpt-3.5-turbo",
-                "api_key": OPENAI_API_KEY
-            }
-        ]
-    }
+# Simple commands are answered without the LLM
+router = IntentRouter()
+
+# Agent steps are watched so the first useful one reaches the user early
+streams = StreamRegistry()
+reply_metrics = ReplyMetrics()
+
+# Bounded pool for the blocking AutoGen turns, with per-turn timeouts
+engine = ExecutionEngine(
+    max_workers=config.AGENT_WORKERS,
+    turn_timeout=config.TURN_TIMEOUT_SECONDS,
+    stop_timeout=config.TURN_STOP_TIMEOUT_SECONDS,
 )
 
+def setup_agents(*specialists):
+    telemetry.install_llm()
+    llm_reply.install(*specialists)
+    if config.STREAM_REPLIES:
+        streams.install(*specialists)
+    engine.install(*specialists)
+
+# Shared specialist agents, built in the background at startup (or on the
+# first message); each user gets their own proxy, group chat and manager
+agents = AgentRegistry(setup_agents)
+
+def run_turn(conversation: Conversation, message: str, stream: TurnStream = None):
+    # Blocking AutoGen round trip; called from a worker thread
+    start = conversation.begin_turn()
+    if stream:
+        streams.open(conversation.manager, stream)
+    try:
+        conversation.user_proxy.initiate_chat(conversation.manager, message=message, clear_history=False)
+    finally:
+        streams.close(conversation.manager)
+    messages = conversation.groupchat.messages[start:]
+    history.compact(conversation)
+    return messages
+
+async def process_message(message: InboundMessage):
+    # Run the group chat in this user's own conversation; other users'
+    # messages are processed concurrently
+    sender = message.user_id
+    user_id = sender.replace("whatsapp:", "")
+
+    loop = asyncio.get_running_loop()
+    stream = TurnStream(
+        lambda text: loop.call_soon_threadsafe(outbound.submit, sender, text),
+        message.received_at,
+        reply_metrics,
+    )
+
+    # One span per turn; LLM and tool calls made for it are counted on it
+    with telemetry.span("turn", user=user_id) as turn:
+        routed = await asyncio.to_thread(router.route, user_id, message.body)
+        if routed is not None:
+            turn.attributes["path"] = "router"
+            request_log.info("Router answered %s", user_id)
+            agent, reply = routed
+            stream.finish([reply])
+            await record_routed_turn(user_id, message.body, agent, reply)
+            return
+        turn.attributes["path"] = "agents"
+        stream.finish(await answer(user_id, message.body, stream, turn))
+
+def record_turn(conversation: Conversation, messages: list):
+    # Blocking (may refresh the pinned cart); called from a worker thread
+    conversation.record_turn(messages)
+    history.compact(conversation)
+
+async def record_routed_turn(user_id: str, body: str, agent: str, reply: str):
+    # Into the user's transcript too, so the agents know about it next turn
+    messages = turn_messages(user_id, body, agent, reply)
+    try:
+        await agents.aget()
+        await conversations.run(user_id, lambda conversation: asyncio.to_thread(record_turn, conversation, messages))
+    except Exception:
+        logger.exception("Could not record the routed turn of %s", user_id)
+
+async def answer(user_id: str, body: str, stream: TurnStream, turn) -> list:
+
+    start = time.perf_counter()
+    await agents.aget()
+    try:
+        # Keyed by the bare number the tools see, so the pinned cart is the user's
+        messages = await conversations.run(
+            user_id,
+            lambda conversation: engine.run(
+                conversation.manager, run_turn, conversation, f"(user_id: {user_id}) {body}", stream
+            )
+        )
+    except TurnTimeout:
+        turn.attributes["timeout"] = True
+        return ["Sorry, that is taking too long. Please try again."]
+    router.record_agent_turn(time.perf_counter() - start)
+
+    replies = []
+    for step_response in messages:
+        role = step_response.get("name")
+        content = (step_response.get("content") or "").strip()
+
+        if role and content:
+            logger.debug("%s: %s", role, content)
+            # Function-call requests carry no text for the user
+            if role != "User" and not step_response.get("function_call"):
+                replies.append(content)
+    return replies
+
+# In-process, or per-user mailboxes in Redis shared by all workers (state.py)
+inbound_queue = create_inbound_queue(process_message)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(conversations.sweep())
+    preload = asyncio.create_task(agents.preload()) if config.AGENTS_PRELOAD else None
+    outbound.start()
+    inbound_queue.start()
+    yield
+    await inbound_queue.stop()
+    engine.shutdown()
+    await outbound.stop()
+    await transport.aclose()
+    transport.close()
+    sweeper.cancel()
+    if preload:
+        preload.cancel()
+
+app = FastAPI(lifespan=lifespan)
+telemetry.instrument(app)
+
 @app.post("/whatsapp/webhook")
 async def whatsapp_webhook(
     From: str = Form(...),
-    Body: str = Form(...)
+    Body: str = Form(...),
+    MessageSid: str = Form("")
 ):
-    global user_whatsapp_number
-    user_whatsapp_number = From
-    print(f"Incoming from {From}: {Body}")
-
-    # Step 1: Send message to User agent
-    user_proxy.receive(Body, sender=user_proxy)
+    request_log.info("Incoming %s from %s", MessageSid, From)
 
-    # Step 2: Custom chat loop with step-by-step control
-    max_steps = 20  # avoid infinite loop
-    for i in range(max_steps):
-        step_response = manager.step()  # Runs one message passing step
-        if step_response is None:
-            print("💤 Conversation ended.")
-            break
-
-        role = step_response.get("name")
-        content = step_response.get("content", "").strip()
+    # Acknowledge now; a queue worker runs the agents and sends the replies
+    if await inbound_queue.asubmit(MessageSid, From, Body) == "rejected":
+        return Response(status_code=503, headers={"Retry-After": "5"})
 
-        if role and content:
-            print(f"📤 {role}: {content}")
-            if role != "User":
-                send_reply_to_user(content, sender=user_whatsapp_number)
-    print("🗣 Group chat messages so far:")
-    for m in group_chat.messages:
-        print(f"- {m['name']}: {m['content']}")
+    # Imported on first use, so the app starts without loading Twilio
+    from twilio.twiml.messaging_response import MessagingResponse
 
     response = MessagingResponse()
     response.message("Received! Let me think... 💬")
-    return response.to_xml()
-
-
+    return Response(content=response.to_xml(), media_type="text/xml")
+
+@app.get("/queue/stats")
+async def queue_stats():
+    return {
+        "queue": await inbound_queue.astats(),
+        "agents": agents.stats(),
+        "engine": engine.stats(),
+        "outbound": outbound.stats(),
+        "replies": reply_metrics.stats(),
+        "conversations": conversations.stats(),
+        "router": router.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "prompt_budget": prompt_budget.stats(),
+        "tool_cache": catalog_memo.stats(),
+    }
@@ -0,0 +1,391 @@
+"""Inbound message queue: the webhook acknowledges at once, workers do the work.
+
+Messages are sharded by user onto per-worker queues, so one user's messages
+are handled strictly in arrival order while different users proceed in
+parallel. Twilio retries a webhook it considers slow or failed; retries
+carry the same MessageSid and are dropped by the dedupe window.
+
+MessageQueue keeps all of that in the process. RedisMessageQueue does the
+same across any number of workers (STATE_BACKEND=redis, see state.py): a
+message goes into its user's mailbox list in Redis, and a user with mail is
+announced once on a stream that the workers read through a consumer group.
+The worker that gets the announcement serves the user's mailbox until it is
+empty, so one user's messages are still handled in order and one at a time,
+by whichever worker is free. Webhooks can land on any worker; nothing is
+sticky.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import zlib
+from collections import OrderedDict
+
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+
+class InboundMessage:
+    __slots__ = ("sid", "user_id", "body", "received_at")
+
+    def __init__(self, sid: str, user_id: str, body: str):
+        self.sid = sid
+        self.user_id = user_id
+        self.body = body
+        self.received_at = time.monotonic()
+
+
+class SeenMessages:
+    """Bounded, TTL-limited set of recently seen MessageSids."""
+
+    def __init__(self, ttl_seconds: float = 3600, max_size: int = 100_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._seen = OrderedDict()
+
+    def add(self, sid: str) -> bool:
+        """Record ``sid``; False if it was already seen inside the window."""
+        now = time.monotonic()
+        while self._seen:
+            ts = next(iter(self._seen.values()))
+            if now - ts < self.ttl_seconds and len(self._seen) < self.max_size:
+                break
+            self._seen.popitem(last=False)
+        if sid in self._seen:
+            return False
+        self._seen[sid] = now
+        return True
+
+    def forget(self, sid: str):
+        self._seen.pop(sid, None)
+
+
+class MessageQueue:
+    def __init__(self, handler, workers: int = 8, max_pending: int = 1000, seen=None):
+        """``await handler(message)`` is called for every accepted message."""
+        self.handler = handler
+        self.workers = workers
+        self.seen = seen or SeenMessages()
+        per_shard = max(1, max_pending // workers)
+        self._shards = [asyncio.Queue(maxsize=per_shard) for _ in range(workers)]
+        self._tasks = []
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_wait = 0.0
+        self._total_wait = 0.0
+
+    def _shard(self, user_id: str) -> asyncio.Queue:
+        return self._shards[zlib.crc32(user_id.encode()) % len(self._shards)]
+
+    def submit(self, sid: str, user_id: str, body: str) -> str:
+        """Returns "queued", "duplicate" or "rejected" (queue full)."""
+        if sid and not self.seen.add(sid):
+            self.duplicates += 1
+            return "duplicate"
+        try:
+            self._shard(user_id).put_nowait(InboundMessage(sid, user_id, body))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            if sid:
+                self.seen.forget(sid)  # let Twilio's retry in
+            return "rejected"
+        self.enqueued += 1
+        return "queued"
+
+    async def asubmit(self, sid: str, user_id: str, body: str) -> str:
+        return self.submit(sid, user_id, body)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            message = await queue.get()
+            wait = time.monotonic() - message.received_at
+            self._total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.in_flight += 1
+            try:
+                await self.handler(message)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to process message %s from %s", message.sid, message.user_id)
+            finally:
+                self.in_flight -= 1
+                queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(q)) for q in self._shards]
+
+    async def stop(self, drain_timeout: float = 10):
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._shards)), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping with %d messages still queued", self.depth())
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._shards)
+
+    def stats(self) -> dict:
+        started = self.processed + self.failed + self.in_flight
+        return {
+            "depth": self.depth(),
+            "max_shard_depth": max(q.qsize() for q in self._shards),
+            "in_flight": self.in_flight,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+    async def astats(self) -> dict:
+        return self.stats()
+
+
+# -------- Redis --------
+
+# KEYS: mailbox, active flag, ready stream, pending counter[, seen sid].
+# ARGV: message, dedupe ttl, max pending, user id
+_ENQUEUE = """
+if KEYS[5] and not redis.call('SET', KEYS[5], 1, 'NX', 'EX', ARGV[2]) then return 'duplicate' end
+if tonumber(redis.call('GET', KEYS[4]) or '0') >= tonumber(ARGV[3]) then
+  if KEYS[5] then redis.call('DEL', KEYS[5]) end
+  return 'rejected'
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('INCR', KEYS[4])
+if redis.call('SET', KEYS[2], 1, 'NX') then redis.call('XADD', KEYS[3], '*', 'user', ARGV[4]) end
+return 'queued'
+"""
+
+# Let go of a user once the mailbox is empty (or, with ARGV[4] = '1', hand a
+# non-empty one to another worker). KEYS: mailbox, active flag, ready stream.
+# ARGV: group, entry id, user id, handover. Returns 0 if there is more mail.
+_RELEASE = """
+if redis.call('LLEN', KEYS[1]) > 0 then
+  if ARGV[4] ~= '1' then return 0 end
+  redis.call('XADD', KEYS[3], '*', 'user', ARGV[3])
+else
+  redis.call('DEL', KEYS[2])
+end
+redis.call('XACK', KEYS[3], ARGV[1], ARGV[2])
+redis.call('XDEL', KEYS[3], ARGV[2])
+return 1
+"""
+
+# Still the owner of this entry? Then reset its idle time so nobody claims it.
+# KEYS: ready stream. ARGV: group, entry id, consumer
+_TOUCH = """
+local pending = redis.call('XPENDING', KEYS[1], ARGV[1], ARGV[2], ARGV[2], 1)
+if #pending == 0 or pending[1][2] ~= ARGV[3] then return 0 end
+redis.call('XCLAIM', KEYS[1], ARGV[1], ARGV[3], 0, ARGV[2], 'JUSTID')
+return 1
+"""
+
+
+class RedisMessageQueue:
+    group = "inbound-workers"
+
+    def __init__(self, client, handler, workers: int = 8, max_pending: int = 1000,
+                 dedupe_ttl_seconds: float = 3600, claim_idle_seconds: float = 150, prefix: str = "inbound:"):
+        """``client`` is a redis.asyncio client with decode_responses=True."""
+        self.client = client
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.dedupe_ttl_seconds = dedupe_ttl_seconds
+        self.claim_idle_seconds = claim_idle_seconds
+        self.prefix = prefix
+        self.ready = prefix + "ready"
+        self.pending = prefix + "pending"
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._enqueue = client.register_script(_ENQUEUE)
+        self._release = client.register_script(_RELEASE)
+        self._touch = client.register_script(_TOUCH)
+        self._fetcher = None
+        self._serving = set()
+        self._slots = None
+        self._stopping = False
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.claimed = 0
+        self.in_flight = 0
+        self.max_wait = 0.0
+        self._total_wait = 0.0
+
+    def _keys(self, user_id: str) -> list:
+        return [f"{self.prefix}box:{user_id}", f"{self.prefix}active:{user_id}", self.ready]
+
+    async def asubmit(self, sid: str, user_id: str, body: str) -> str:
+        """Returns "queued", "duplicate" or "rejected" (queue full)."""
+        keys = self._keys(user_id) + [self.pending]
+        if sid:
+            keys.append(f"{self.prefix}seen:{sid}")
+        message = json.dumps({"sid": sid, "user_id": user_id, "body": body, "ts": time.time()})
+        status = await self._enqueue(
+            keys=keys, args=[message, int(self.dedupe_ttl_seconds), self.max_pending, user_id]
+        )
+        if status == "duplicate":
+            self.duplicates += 1
+        elif status == "rejected":
+            self.rejected += 1
+        else:
+            self.enqueued += 1
+        return status
+
+    # -------- Workers --------
+
+    async def _ensure_group(self):
+        try:
+            await self.client.xgroup_create(self.ready, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _fetch(self, block_ms: int = 1000):
+        # Reads as many announcements as there are free slots; users left
+        # behind by a dead worker are claimed once they have been idle long enough
+        grouped = False
+        last_claim = 0.0
+        while True:
+            taken = 0
+            try:
+                if not grouped:
+                    await self._ensure_group()
+                    grouped = True
+                await self._slots.acquire()
+                taken = 1
+                while taken < self.workers and not self._slots.locked():
+                    await self._slots.acquire()
+                    taken += 1
+                entries = []
+                if time.monotonic() - last_claim > self.claim_idle_seconds / 2:
+                    last_claim = time.monotonic()
+                    _, entries, *_ = await self.client.xautoclaim(
+                        self.ready, self.group, self.consumer, int(self.claim_idle_seconds * 1000), count=taken
+                    )
+                    entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+                    self.claimed += len(entries)
+                started = time.monotonic()
+                if not entries:
+                    response = await self.client.xreadgroup(
+                        self.group, self.consumer, {self.ready: ">"}, count=taken, block=block_ms
+                    )
+                    entries = response[0][1] if response else []
+                for entry_id, fields in entries:
+                    task = asyncio.create_task(self._serve(entry_id, fields["user"]))
+                    self._serving.add(task)
+                    task.add_done_callback(self._serving.discard)
+                    taken -= 1
+                if not entries:
+                    # Not every server honours BLOCK (fakeredis returns at once); poll, don't spin
+                    await asyncio.sleep(min(0.05, max(0.0, block_ms / 1000 - (time.monotonic() - started))))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Inbound queue read failed; retrying", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                for _ in range(taken):
+                    self._slots.release()
+
+    async def _serve(self, entry_id: str, user_id: str):
+        keys = self._keys(user_id)
+        box = keys[0]
+        try:
+            while True:
+                raw = await self.client.lindex(box, 0)
+                if raw is None or self._stopping:
+                    if await self._release(keys=keys, args=[self.group, entry_id, user_id, int(self._stopping)]):
+                        return
+                    continue
+                await self._handle(raw)
+                async with self.client.pipeline(transaction=True) as pipe:
+                    pipe.lpop(box)
+                    pipe.decr(self.pending)
+                    await pipe.execute()
+                # Another worker took the user over (we looked dead): stop here
+                if not await self._touch(keys=[self.ready], args=[self.group, entry_id, self.consumer]):
+                    logger.warning("Lost mailbox of %s to another worker", user_id)
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Left pending; claimed again after claim_idle_seconds
+            logger.exception("Inbound mailbox of %s failed", user_id)
+        finally:
+            self._slots.release()
+
+    async def _handle(self, raw: str):
+        try:
+            data = json.loads(raw)
+            message = InboundMessage(data["sid"], data["user_id"], data["body"])
+        except (ValueError, KeyError, TypeError):
+            self.failed += 1
+            logger.error("Dropping malformed inbound message %r", raw[:200])
+            return
+        wait = max(0.0, time.time() - data["ts"])
+        message.received_at -= wait
+        self._total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_flight += 1
+        try:
+            await self.handler(message)
+            self.processed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("Failed to process message %s from %s", message.sid, message.user_id)
+        finally:
+            self.in_flight -= 1
+
+    def start(self):
+        if self._fetcher is None:
+            self._stopping = False
+            self._slots = asyncio.Semaphore(self.workers)
+            self._fetcher = asyncio.create_task(self._fetch())
+
+    async def stop(self, drain_timeout: float = 10):
+        # Finish the message at hand, then give each user back to the other workers
+        self._stopping = True
+        if self._fetcher is not None:
+            self._fetcher.cancel()
+            self._fetcher = None
+        if self._serving:
+            done, running = await asyncio.wait(set(self._serving), timeout=drain_timeout)
+            if running:
+                logger.warning("Stopping with %d mailboxes still being served", len(running))
+                for task in running:
+                    task.cancel()
+
+    async def astats(self) -> dict:
+        started = self.processed + self.failed + self.in_flight
+        return {
+            "backend": "redis",
+            "depth": int(await self.client.get(self.pending) or 0),
+            "users_with_mail": await self.client.xlen(self.ready),
+            "in_flight": self.in_flight,
+            "serving": len(self._serving),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "claimed": self.claimed,
+            "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
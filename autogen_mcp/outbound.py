@@ -0,0 +1,258 @@
+"""Outbound WhatsApp messages: coalesced, rate limited, retried, off the loop.
+
+``submit(to, *parts)`` queues one message built from a turn's replies.
+Submissions for the same number that arrive within ``coalesce_seconds`` are
+merged into one message. Sends go out in order per number through sharded
+sender tasks, each waiting on an account-wide and a per-number token bucket.
+The blocking Twilio call runs in a thread pool, and throttling (429), 5xx and
+connection errors are retried with jittered exponential backoff.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from telemetry import TWILIO_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Twilio rejects longer bodies
+MAX_BODY = 1600
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns the time waited."""
+        waited = 0.0
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+def split_body(body: str, limit: int = MAX_BODY) -> list:
+    """Split ``body`` into chunks of at most ``limit`` characters, preferring line breaks."""
+    chunks = []
+    while len(body) > limit:
+        cut = body.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(body[:cut].rstrip())
+        body = body[cut:].lstrip("\n")
+    if body:
+        chunks.append(body)
+    return chunks
+
+
+def join_parts(parts) -> str:
+    seen = set()
+    kept = []
+    for part in parts:
+        part = (part or "").strip()
+        if part and part not in seen:
+            seen.add(part)
+            kept.append(part)
+    return "\n\n".join(kept)
+
+
+class OutboundDispatcher:
+    def __init__(self, send, workers: int = 4, max_pending: int = 1000,
+                 account_rate: float = 20, account_burst: float = 20,
+                 number_rate: float = 1, number_burst: float = 3,
+                 retries: int = 3, backoff: float = 0.5, coalesce_seconds: float = 0.3,
+                 max_buckets: int = 10_000):
+        """``send(to, body)`` is the blocking provider call (e.g. Twilio messages.create)."""
+        self.send = send
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.coalesce_seconds = coalesce_seconds
+        self.number_rate = number_rate
+        self.number_burst = number_burst
+        self.max_buckets = max_buckets
+        self.account_bucket = TokenBucket(account_rate, account_burst)
+        self._number_buckets = {}
+        self._pending = {}
+        self._flushes = {}
+        per_shard = max(1, max_pending // workers)
+        self._shards = [asyncio.Queue(maxsize=per_shard) for _ in range(workers)]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outbound")
+        self._tasks = []
+        self.submitted = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.throttled_seconds = 0.0
+
+    def _shard(self, to: str) -> asyncio.Queue:
+        return self._shards[zlib.crc32(to.encode()) % len(self._shards)]
+
+    def _bucket(self, to: str) -> TokenBucket:
+        bucket = self._number_buckets.get(to)
+        if bucket is None:
+            if len(self._number_buckets) >= self.max_buckets:
+                # Full buckets carry no state worth keeping
+                for number in [n for n, b in self._number_buckets.items() if b.idle()]:
+                    del self._number_buckets[number]
+            bucket = self._number_buckets[to] = TokenBucket(self.number_rate, self.number_burst)
+        return bucket
+
+    def submit(self, to: str, *parts: str):
+        """Queue ``parts`` (one turn's replies) as a single message to ``to``."""
+        body = join_parts(parts)
+        if not body:
+            return
+        self.submitted += 1
+        pending = self._pending.get(to)
+        if pending is not None:
+            pending.append(body)
+            self.coalesced += 1
+            return
+        self._pending[to] = [body]
+        if self.coalesce_seconds > 0:
+            self._flushes[to] = asyncio.get_running_loop().call_later(self.coalesce_seconds, self._flush, to)
+        else:
+            self._flush(to)
+
+    def _flush(self, to: str):
+        self._flushes.pop(to, None)
+        parts = self._pending.pop(to, None)
+        if not parts:
+            return
+        for chunk in split_body(join_parts(parts)):
+            try:
+                self._shard(to).put_nowait((to, chunk))
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.error("Outbound queue full, dropping message to %s", to)
+
+    async def _deliver(self, to: str, body: str):
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            self.throttled_seconds += await self.account_bucket.acquire()
+            self.throttled_seconds += await self._bucket(to).acquire()
+            start = time.perf_counter()
+            try:
+                await loop.run_in_executor(self._executor, self.send, to, body)
+                TWILIO_SECONDS.labels("ok").observe(time.perf_counter() - start)
+                self.sent += 1
+                return
+            except Exception as e:
+                TWILIO_SECONDS.labels("error").observe(time.perf_counter() - start)
+                status = getattr(e, "status", None)
+                if attempt == self.retries or (status is not None and status not in RETRY_STATUSES):
+                    self.failed += 1
+                    logger.error("Giving up on message to %s: %s", to, e)
+                    return
+                self.retried += 1
+                await asyncio.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            to, body = await queue.get()
+            try:
+                await self._deliver(to, body)
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to send message to %s", to)
+            finally:
+                queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(q)) for q in self._shards]
+
+    async def stop(self, drain_timeout: float = 10):
+        for to, handle in list(self._flushes.items()):
+            handle.cancel()
+            self._flush(to)
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._shards)), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping with %d outbound messages unsent", self.depth())
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._executor.shutdown(wait=False)
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._shards) + sum(len(p) for p in self._pending.values())
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "throttled_s": round(self.throttled_seconds, 3),
+        }
+
+
+def create_dispatcher(send) -> OutboundDispatcher:
+    """An OutboundDispatcher with the ``OUTBOUND_*`` settings from config.py.
+
+    The account-wide bucket is Twilio's limit for the whole account, so each
+    of ``WORKERS`` processes gets its share.
+    """
+    import config
+
+    return OutboundDispatcher(
+        send,
+        workers=config.OUTBOUND_WORKERS,
+        max_pending=config.OUTBOUND_MAX_PENDING,
+        account_rate=config.OUTBOUND_ACCOUNT_RATE / config.WORKERS,
+        account_burst=max(1.0, config.OUTBOUND_ACCOUNT_BURST / config.WORKERS),
+        number_rate=config.OUTBOUND_NUMBER_RATE,
+        number_burst=config.OUTBOUND_NUMBER_BURST,
+        retries=config.OUTBOUND_RETRIES,
+        backoff=config.OUTBOUND_RETRY_BACKOFF,
+        coalesce_seconds=config.OUTBOUND_COALESCE_SECONDS,
+    )
+
+
+_twilio_client = None
+_twilio_lock = threading.Lock()
+
+
+def twilio_client():
+    """The Twilio REST client, created on the first send (twilio.rest is slow to import)."""
+    global _twilio_client
+    if _twilio_client is None:
+        with _twilio_lock:
+            if _twilio_client is None:
+                import config
+                from twilio.rest import Client
+
+                client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+                if config.TWILIO_API_URL:
+                    client.api.base_url = config.TWILIO_API_URL
+                _twilio_client = client
+    return _twilio_client
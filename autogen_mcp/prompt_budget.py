@@ -0,0 +1,216 @@
+"""Prompt budget: what each agent's LLM calls cost in tokens, and less of it.
+
+``PromptBudget.install(*agents)`` prepares these agents; llm_reply.py asks
+``client_for`` for the client of each LLM call that missed the cache, which:
+
+- accounts the estimated prompt tokens per agent, split into the system
+  message, the conversation history and the function schemas (``stats()``
+  and the ``llm_prompt_tokens_estimated`` counter);
+- with ``PROMPT_BUDGET`` on, sends minified function schemas: property
+  descriptions that only restate the property's name and empty
+  ``required`` lists are dropped;
+- with ``PROMPT_BUDGET`` on, sends only the functions relevant to the
+  intent of the user's latest message, as listed in each agent module's
+  ``intent_functions``. The agents' replies since the user's previous
+  message (a follow-up question such as "Shall I add it to your cart?")
+  add their intents to it. A message with no recognised intent, or one
+  not in an agent's table, gets all of its functions, so an agent is
+  never left without the function it needs ("yes please", "make it 5").
+
+Which model each agent runs on is set in config.py (``AGENT_MODELS``).
+Estimates use the same 4 characters a token as session/history.py.
+"""
+import json
+import re
+import threading
+
+from session.history import CHARS_PER_TOKEN, MEMORY_NAME
+from telemetry import PROMPT_TOKENS
+
+_USER_ID = re.compile(r"^\(user_id: [^)]*\)\s*")
+# Every intent that matches counts: "remove the milk and add eggs" is both
+_INTENTS = (
+    # Not a bare "order": "I want to order 2 kg rice" is adding to the cart
+    ("checkout", re.compile(r"\b(check ?out|place (the |my |an )?order|confirm)\b")),
+    ("remove", re.compile(r"\b(remove|delete|drop|take out)\b")),
+    ("add", re.compile(r"\b(add|buy|get me|put)\b")),
+    ("view_cart", re.compile(r"\b(cart|basket)\b")),
+    ("browse", re.compile(r"\b(categor\w*|browse|more items|next page)\b")),
+    ("search", re.compile(r"\b(do you have|have you got|any|price|how much|find|search|looking for)\b")),
+)
+_FILLER = {"the", "a", "an", "of", "to", "for", "id", "ids"}
+
+
+def estimate_tokens(value) -> int:
+    if not value:
+        return 0
+    return len(json.dumps(value, default=str)) // CHARS_PER_TOKEN
+
+
+def intents(text: str) -> set:
+    """Intents of a message; empty when none is recognised."""
+    text = _USER_ID.sub("", text).lower()
+    return {name for name, pattern in _INTENTS if pattern.search(text)}
+
+
+def _restates(name: str, description: str) -> bool:
+    words = set(re.findall(r"[a-z]+", description.lower())) - _FILLER
+    return words <= set(name.lower().split("_")) | {"id"}
+
+
+def _minify_parameters(schema: dict) -> dict:
+    schema = dict(schema)
+    if "properties" in schema:
+        properties = {}
+        for name, prop in schema["properties"].items():
+            prop = _minify_parameters(prop)
+            if _restates(name, prop.get("description", "")):
+                prop.pop("description", None)
+            properties[name] = prop
+        schema["properties"] = properties
+    if "items" in schema:
+        schema["items"] = _minify_parameters(schema["items"])
+    if schema.get("required") == []:
+        del schema["required"]
+    if "description" in schema:
+        schema["description"] = " ".join(schema["description"].split())
+    return schema
+
+
+def minify_function(function: dict) -> dict:
+    function = dict(function)
+    if "description" in function:
+        function["description"] = " ".join(function["description"].split())
+    if "parameters" in function:
+        function["parameters"] = _minify_parameters(function["parameters"])
+    return function
+
+
+def _intent_tables() -> dict:
+    from agents import cart_agent, item_agent
+
+    return {"CartAgent": cart_agent.intent_functions, "ItemAgent": item_agent.intent_functions}
+
+
+def _text(message) -> str:
+    content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def turn_intents(messages) -> set:
+    """Intents of the user's latest message, widened by the agents' replies around it.
+
+    Empty when the user's message itself has none: a short answer to a
+    follow-up question can mean anything.
+    """
+    users = [i for i, m in enumerate(messages) if m.get("name") == "User" and _text(m)]
+    if not users:
+        return set()
+    found = intents(_text(messages[users[-1]]))
+    if not found:
+        return found
+    start = users[-2] + 1 if len(users) > 1 else 0
+    for message in messages[start:]:
+        if message.get("name") not in ("User", MEMORY_NAME) \
+                and message.get("role") not in ("system", "function", "tool"):
+            found |= intents(_text(message))
+    return found
+
+
+class PromptBudget:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._tables = {}
+        self._functions = {}   # agent name -> {function name: schema as sent}
+        self._clients = {}     # (agent name, function names) -> OpenAIWrapper
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def install(self, *agents):
+        """Account (and with ``enabled``, trim) these agents' prompts."""
+        self._tables = _intent_tables() if self.enabled else {}
+        for agent in agents:
+            if not agent.llm_config:
+                continue
+            functions = agent.llm_config.get("functions") or []
+            if self.enabled:
+                functions = [minify_function(f) for f in functions]
+            self._functions[agent.name] = {f["name"]: f for f in functions}
+            self._stats[agent.name] = {
+                "calls": 0, "system": 0, "history": 0, "functions": 0,
+                "functions_sent": 0, "functions_full": 0, "full_functions_tokens": 0,
+            }
+
+    def functions_for(self, agent_name: str, messages) -> list:
+        """The function schemas to send for ``messages``."""
+        functions = self._functions.get(agent_name, {})
+        table = self._tables.get(agent_name)
+        if not table or not functions:
+            return list(functions.values())
+        found = turn_intents(messages)
+        if not found:
+            return list(functions.values())
+        wanted = set()
+        for intent in found:
+            if intent not in table:
+                return list(functions.values())
+            wanted.update(table[intent])
+        return [f for name, f in functions.items() if name in wanted]
+
+    def _client(self, agent, functions):
+        from autogen import OpenAIWrapper
+
+        key = (agent.name, tuple(f["name"] for f in functions))
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    # Built lazily, from llm_config as it is by then (llm_cache drops cache_seed)
+                    llm_config = {k: v for k, v in agent.llm_config.items() if k != "functions"}
+                    if functions:
+                        llm_config["functions"] = functions
+                    client = self._clients[key] = OpenAIWrapper(**llm_config)
+        return client
+
+    def client_for(self, agent, messages):
+        """Account ``messages`` (system message included) and return the client
+        to send them with; None for the agent's own."""
+        functions = self.functions_for(agent.name, messages)
+        self._account(agent, messages, functions)
+        return self._client(agent, functions) if self.enabled else None
+
+    def _account(self, agent, messages, functions):
+        system = sum(estimate_tokens(m) for m in messages if m.get("role") == "system")
+        history = sum(estimate_tokens(m) for m in messages) - system
+        sent = estimate_tokens(functions)
+        PROMPT_TOKENS.labels(agent.name, "system").inc(system)
+        PROMPT_TOKENS.labels(agent.name, "history").inc(history)
+        PROMPT_TOKENS.labels(agent.name, "functions").inc(sent)
+        stats = self._stats[agent.name]
+        with self._lock:
+            stats["calls"] += 1
+            stats["system"] += system
+            stats["history"] += history
+            stats["functions"] += sent
+            stats["functions_sent"] += len(functions)
+            stats["functions_full"] += len(agent.llm_config.get("functions") or [])
+            stats["full_functions_tokens"] += estimate_tokens(agent.llm_config.get("functions"))
+
+    def stats(self) -> dict:
+        """Average estimated prompt tokens per call, per agent and part."""
+        report = {"enabled": self.enabled, "agents": {}}
+        for name, stats in self._stats.items():
+            calls = stats["calls"]
+            if not calls:
+                continue
+            report["agents"][name] = {
+                "calls": calls,
+                "system_tokens": round(stats["system"] / calls, 1),
+                "history_tokens": round(stats["history"] / calls, 1),
+                "function_tokens": round(stats["functions"] / calls, 1),
+                "function_tokens_saved": round((stats["full_functions_tokens"] - stats["functions"]) / calls, 1),
+                "functions_sent": round(stats["functions_sent"] / calls, 2),
+                "functions_defined": round(stats["functions_full"] / calls, 2),
+            }
+        return report
@@ -0,0 +1,67 @@
+"""The shared specialist agents, built once on first use.
+
+Importing AutoGen and building the agents takes seconds, so the apps don't
+do it at import time. ``AgentRegistry.get()`` builds them on the first call
+(once, even with several threads asking). The apps' lifespan starts that in
+the background (``AGENTS_PRELOAD``), so the server is up and queueing
+webhooks while the agents load; a message that arrives first just waits.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def create_specialists() -> list:
+    from agents.orchestrator import create_orchestrator_agent
+    from agents.item_agent import create_item_agent
+    from agents.cart_agent import create_cart_agent
+    from agents.order_agent import create_order_agent
+
+    return [create_orchestrator_agent(), create_item_agent(), create_cart_agent(), create_order_agent()]
+
+
+class AgentRegistry:
+    def __init__(self, *setup):
+        """Each ``setup(*agents)`` runs once on the new agents (caches, hooks)."""
+        self._setup = setup
+        self._agents = None
+        self._lock = threading.Lock()
+        self.build_seconds = None
+
+    @property
+    def ready(self) -> bool:
+        return self._agents is not None
+
+    def get(self) -> list:
+        """[Orchestrator, ItemAgent, CartAgent, OrderAgent]; blocks while they are built."""
+        if self._agents is None:
+            with self._lock:
+                if self._agents is None:
+                    start = time.perf_counter()
+                    agents = create_specialists()
+                    for setup in self._setup:
+                        setup(*agents)
+                    self.build_seconds = time.perf_counter() - start
+                    self._agents = agents
+                    logger.info("Agents ready in %.2fs", self.build_seconds)
+        return self._agents
+
+    async def aget(self) -> list:
+        if self._agents is not None:
+            return self._agents
+        return await asyncio.to_thread(self.get)
+
+    async def preload(self):
+        try:
+            await self.aget()
+        except Exception:
+            logger.exception("Could not build the agents; retrying on the first message")
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "build_s": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+        }
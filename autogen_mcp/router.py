@@ -0,0 +1,173 @@
+"""Deterministic pre-router for common WhatsApp commands.
+
+Simple, unambiguous messages ("show cart", "list categories", "checkout",
+"add 2 kg apple", "remove milk") are matched with keyword/regex rules,
+product names are resolved through the catalog search index, and the tool
+function is called directly. Anything else returns None and goes to the
+agents. Hit rate and estimated LLM time saved are tracked in ``stats()``.
+
+Routed turns are still part of the conversation: ``turn_messages`` gives
+the user's message and the reply (as said by the agent whose tool ran) for
+the apps to record, so the agents know about them on the next turn.
+"""
+import logging
+import re
+import time
+
+from agents import cart_agent, item_agent, order_agent
+from backend import get_backend
+
+logger = logging.getLogger(__name__)
+
+# A search hit is trusted only if it is strong and clearly ahead of the next one
+MIN_SCORE = 0.85
+MIN_MARGIN = 0.1
+
+UNITS = {
+    "kg": ("kg", 1), "kgs": ("kg", 1), "kilo": ("kg", 1), "kilos": ("kg", 1),
+    "g": ("kg", 0.001), "gm": ("kg", 0.001), "gms": ("kg", 0.001), "gram": ("kg", 0.001), "grams": ("kg", 0.001),
+    "l": ("liter", 1), "liter": ("liter", 1), "liters": ("liter", 1), "litre": ("liter", 1), "litres": ("liter", 1),
+    "ml": ("liter", 0.001),
+}
+
+_POLITE = re.compile(r"^(please|pls|hi|hey|hello)[,\s]+|[\s,]+(please|pls|thanks|thank you)$|[.!?]+$")
+_VIEW_CART = re.compile(r"^((show|view|see|check|display)( me)?( my| the)? cart|my cart|cart|what'?s in my cart)$")
+_CATEGORIES = re.compile(
+    r"^((list|show|view|see)( me)?( all)?( the)? categories|categories|what (categories|do you (have|sell)))$"
+)
+_CHECKOUT = re.compile(r"^(checkout|check out|place( my| the)? order|confirm( my| the)? order)$")
+COUNT_WORDS = ("x", "pc", "pcs", "piece", "pieces", "units", "unit")
+_ADD = re.compile(
+    r"^(add|buy|get me|i want|i need)\s+(?P<qty>\d+(\.\d+)?)\s*"
+    r"((?P<unit>" + "|".join(sorted([*UNITS, *COUNT_WORDS], key=len, reverse=True)) + r")\b)?\s*(of\s+)?"
+    r"(?P<name>[a-z][a-z ]*?)(\s+(to|in|into)( my| the)? cart)?$"
+)
+# The agent whose tool answers each intent
+INTENT_AGENTS = {
+    "view_cart": "CartAgent", "add_to_cart": "CartAgent", "remove_from_cart": "CartAgent",
+    "categories": "ItemAgent", "checkout": "OrderAgent",
+}
+
+_REMOVE = re.compile(r"^(remove|delete|drop)\s+(the\s+)?(?P<name>[a-z][a-z ]*?)(\s+from( my| the)? cart)?$")
+
+
+def normalize(text: str) -> str:
+    text = " ".join(text.lower().split())
+    # Until nothing is left to strip: "show my cart please." has two layers
+    stripped = None
+    while stripped != text:
+        stripped, text = text, _POLITE.sub("", text).strip()
+    return text
+
+
+def turn_messages(user_id: str, message: str, agent: str, reply: str) -> list:
+    """A routed turn as group chat messages, worded like the agents' own turns."""
+    return [
+        {"content": f"(user_id: {user_id}) {message}", "role": "user", "name": "User"},
+        {"content": reply, "role": "user", "name": agent},
+    ]
+
+
+def singular_forms(name: str) -> list:
+    """``name`` plus naive singulars of its last word ("tomatoes" -> "tomatoe", "tomato")."""
+    forms = [name]
+    for suffix in ("s", "es"):
+        if name.endswith(suffix) and len(name) > len(suffix) + 2:
+            forms.append(name[:-len(suffix)])
+    return forms
+
+
+class IntentRouter:
+    def __init__(self):
+        self.hits = {}
+        self.misses = 0
+        self.router_seconds = 0.0
+        self.agent_turns = 0
+        self.agent_seconds = 0.0
+
+    def resolve_item(self, name: str):
+        """Return the item dict for ``name`` if the catalog match is unambiguous."""
+        for candidate in singular_forms(name):
+            results = get_backend().search_items(candidate, 2)["items"]
+            if not results or results[0]["score"] < MIN_SCORE:
+                continue
+            if len(results) > 1 and results[0]["score"] - results[1]["score"] < MIN_MARGIN:
+                return None
+            return results[0]
+        return None
+
+    def _match(self, user_id: str, text: str):
+        if _VIEW_CART.match(text):
+            return "view_cart", lambda: cart_agent.view_cart(user_id)
+        if _CATEGORIES.match(text):
+            return "categories", item_agent.get_categories
+        if _CHECKOUT.match(text):
+            return "checkout", lambda: order_agent.confirm_order(user_id)
+
+        m = _ADD.match(text)
+        if m:
+            quantity = float(m.group("qty"))
+            name = m.group("name")
+            unit = m.group("unit")
+            item = self.resolve_item(name)
+            if item is None:
+                return None
+            if unit in UNITS:
+                base, factor = UNITS[unit]
+                if base != item["unit"]:
+                    return None  # e.g. litres of something sold per kg: let the agents ask
+                quantity *= factor
+            return "add_to_cart", lambda: cart_agent.add_to_cart(user_id, item["id"], quantity)
+
+        m = _REMOVE.match(text)
+        if m:
+            item = self.resolve_item(m.group("name"))
+            if item is None:
+                return None
+            return "remove_from_cart", lambda: cart_agent.remove_from_cart(user_id, item["id"])
+        return None
+
+    def route(self, user_id: str, message: str):
+        """Handle ``message`` directly and return ``(agent, reply)``, or None to fall back to the agents.
+
+        Blocking (tool calls go to the backend); call it from a worker thread.
+        """
+        start = time.perf_counter()
+        try:
+            match = self._match(user_id, normalize(message))
+            reply = None
+            if match is not None:
+                intent, call = match
+                reply = INTENT_AGENTS[intent], call()
+                self.hits[intent] = self.hits.get(intent, 0) + 1
+                logger.info("Routed %r as %s without the LLM", message, intent)
+            else:
+                self.misses += 1
+            return reply
+        except Exception:
+            logger.exception("Router failed on %r, falling back to agents", message)
+            self.misses += 1
+            return None
+        finally:
+            self.router_seconds += time.perf_counter() - start
+
+    def record_agent_turn(self, seconds: float):
+        self.agent_turns += 1
+        self.agent_seconds += seconds
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        avg_agent = self.agent_seconds / self.agent_turns if self.agent_turns else 0.0
+        avg_router = self.router_seconds / total if total else 0.0
+        return {
+            "messages": total,
+            "hits": hits,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "by_intent": dict(self.hits),
+            "avg_router_ms": round(avg_router * 1000, 3),
+            "avg_agent_turn_ms": round(avg_agent * 1000, 1),
+            # Every hit skips one agent turn
+            "saved_per_hit_ms": round((avg_agent - avg_router) * 1000, 1) if self.agent_turns else None,
+            "saved_total_s": round(hits * avg_agent - self.router_seconds, 2) if self.agent_turns else None,
+        }
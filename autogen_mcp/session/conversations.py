@@ -0,0 +1,227 @@
+"""Per-user conversation state for the WhatsApp services.
+
+Each user gets their own UserProxyAgent, GroupChat and GroupChatManager, so
+histories never mix. The LLM-backed specialist agents are expensive to build
+(each one creates an OpenAI client) and are shared: AutoGen keys an agent's
+history and reply counters by the sending manager, which is per user here.
+
+Messages for one user are serialized by a per-user lock; different users run
+concurrently. Idle conversations are evicted LRU-first and after a TTL.
+
+With a conversation store (see state.py) the process only caches
+conversations: each one is saved after every turn, and restored before the
+next one when another worker has run a turn for the user since.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Per-peer state AutoGen keeps on every agent, keyed by the other agent
+_PEER_STATE = ("_oai_messages", "_consecutive_auto_reply_counter",
+               "_max_consecutive_auto_reply_dict", "reply_at_receive")
+
+
+def release_peer(agent, peer):
+    """Drop everything ``agent`` remembers about ``peer`` (clear_history keeps the keys)."""
+    for attr in _PEER_STATE:
+        state = getattr(agent, attr, None)
+        if state is not None:
+            state.pop(peer, None)
+
+
+class Conversation:
+    __slots__ = ("user_id", "user_proxy", "manager", "lock", "created", "last_used", "turns",
+                 "turn_starts", "summary", "pinned", "history_tokens", "version")
+
+    def __init__(self, user_id: str, user_proxy, manager):
+        self.user_id = user_id
+        self.user_proxy = user_proxy
+        self.manager = manager
+        self.lock = asyncio.Lock()
+        self.created = self.last_used = time.monotonic()
+        self.turns = 0
+        # Where each kept turn starts in groupchat.messages, plus what was
+        # compacted away (see session/history.py)
+        self.turn_starts = []
+        self.summary = ""
+        self.pinned = ""
+        self.history_tokens = 0
+        # Version of the stored copy this one matches (None: never stored)
+        self.version = None
+
+    @property
+    def groupchat(self):
+        return self.manager.groupchat
+
+    def begin_turn(self) -> int:
+        """Mark the start of a turn; returns its index in groupchat.messages."""
+        start = len(self.groupchat.messages)
+        self.turn_starts.append(start)
+        return start
+
+    def append(self, message: dict):
+        """Add ``message`` to the transcript and every agent's history, as if said in the chat."""
+        manager = self.manager
+        for agent in self.groupchat.agents:
+            if agent.name == message.get("name"):
+                agent.send(message, manager, request_reply=False, silent=True)
+            else:
+                manager.send(message, agent, request_reply=False, silent=True)
+        self.groupchat.messages.append(message)
+
+    def record_turn(self, messages):
+        """Add a turn that was answered without the group chat (see router.py)."""
+        self.begin_turn()
+        for message in messages:
+            self.append(message)
+
+    def snapshot(self) -> dict:
+        return {
+            "messages": self.groupchat.messages,
+            "turn_starts": self.turn_starts,
+            "summary": self.summary,
+            "pinned": self.pinned,
+            "turns": self.turns,
+        }
+
+    def restore(self, snapshot: dict):
+        """Replace this conversation's state with ``snapshot``.
+
+        Like GroupChatManager.resume, but without clearing the shared agents'
+        histories with other users' managers.
+        """
+        self.close()
+        for message in snapshot["messages"]:
+            self.append(message)
+        self.turn_starts = list(snapshot["turn_starts"])
+        self.summary = snapshot["summary"]
+        self.pinned = snapshot["pinned"]
+        self.turns = snapshot["turns"]
+        self.version = snapshot["version"]
+
+    def close(self):
+        self.groupchat.reset()
+        for agent in self.groupchat.agents:
+            release_peer(agent, self.manager)
+        release_peer(self.user_proxy, self.manager)
+
+
+class ConversationManager:
+    def __init__(self, factory, max_sessions: int = 1000, ttl_seconds: float = 1800,
+                 store=None, on_restore=None):
+        """``factory(user_id)`` returns a new Conversation.
+
+        ``store`` (see state.py) keeps conversations outside the process;
+        ``on_restore(conversation)`` runs after one was loaded from it.
+        """
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self.on_restore = on_restore
+        self._sessions = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+        self.restored = 0
+        self.store_errors = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def get(self, user_id: str) -> Conversation:
+        conversation = self._sessions.get(user_id)
+        if conversation is None:
+            logger.info("Creating new session for user: %s", user_id)
+            conversation = self._sessions[user_id] = self.factory(user_id)
+            self.created += 1
+            self._evict_over_capacity(keep=user_id)
+        else:
+            self._sessions.move_to_end(user_id)
+        conversation.last_used = time.monotonic()
+        return conversation
+
+    async def run(self, user_id: str, turn):
+        """Run ``await turn(conversation)`` with the user's lock held."""
+        conversation = self.get(user_id)
+        async with conversation.lock:
+            if self.store is not None:
+                await self._load(conversation)
+            try:
+                return await turn(conversation)
+            finally:
+                conversation.turns += 1
+                conversation.last_used = time.monotonic()
+                if self.store is not None:
+                    await self._save(conversation)
+
+    async def _load(self, conversation: Conversation):
+        try:
+            snapshot = await self.store.load(conversation.user_id, conversation.version)
+        except Exception:
+            # Carry on with what this worker has rather than fail the message
+            self.store_errors += 1
+            logger.exception("Could not load the conversation of %s", conversation.user_id)
+            return
+        if snapshot is None:
+            return
+        conversation.restore(snapshot)
+        if self.on_restore:
+            self.on_restore(conversation)
+        self.restored += 1
+
+    async def _save(self, conversation: Conversation):
+        try:
+            conversation.version = await self.store.save(conversation.user_id, conversation.snapshot())
+        except Exception:
+            # The next worker to get this user starts from the previous turn
+            self.store_errors += 1
+            logger.exception("Could not save the conversation of %s", conversation.user_id)
+
+    def _evict(self, user_id: str):
+        conversation = self._sessions.pop(user_id)
+        conversation.close()
+        self.evicted += 1
+
+    def _evict_over_capacity(self, keep=None):
+        # Oldest first; a conversation that is mid-turn is never evicted
+        for user_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if user_id != keep and not self._sessions[user_id].lock.locked():
+                self._evict(user_id)
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.ttl_seconds
+        idle = [u for u, c in self._sessions.items() if c.last_used < cutoff and not c.lock.locked()]
+        for user_id in idle:
+            self._evict(user_id)
+        return len(idle)
+
+    async def sweep(self, interval: float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if evicted:
+                logger.info("Evicted %d idle conversations, %d active", evicted, len(self))
+
+    def stats(self) -> dict:
+        sessions = list(self._sessions.values())
+        tokens = [c.history_tokens for c in sessions]
+        return {
+            "active": len(sessions),
+            "busy": sum(1 for c in sessions if c.lock.locked()),
+            "created": self.created,
+            "evicted": self.evicted,
+            "restored": self.restored,
+            "store_errors": self.store_errors,
+            "history_messages": sum(len(c.groupchat.messages) for c in sessions),
+            "history_tokens": sum(tokens),
+            "max_history_tokens": max(tokens, default=0),
+            "summarized": sum(1 for c in sessions if c.summary),
+        }
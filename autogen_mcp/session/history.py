@@ -0,0 +1,130 @@
+"""Bounded conversation history.
+
+A conversation keeps its last ``max_turns`` turns verbatim. Older turns are
+folded into a rolling summary, and structured state (user id, cart) is
+pinned next to it. Both live in one system message at the front of every
+agent's history, so the prompt stays roughly the same size however long the
+user has been chatting.
+
+Turns are dropped whole, so a function call is never separated from its
+result. Token counts are estimates (about 4 characters per token).
+"""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+MEMORY_NAME = "ConversationMemory"
+CHARS_PER_TOKEN = 4
+# The id is pinned once in the memory message; no need to repeat it per line
+_USER_PREFIX = re.compile(r"^\(user_id: [^)]*\)\s*")
+
+
+def estimate_tokens(messages) -> int:
+    chars = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        call = message.get("function_call")
+        if call:
+            chars += len(call.get("name", "")) + len(call.get("arguments", ""))
+    return chars // CHARS_PER_TOKEN
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def extractive_summary(summary: str, turns: list, max_chars: int) -> str:
+    """Append one line per dropped turn (user message and final reply) to ``summary``.
+
+    The oldest lines go first when the summary outgrows ``max_chars``.
+    """
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        request = _USER_PREFIX.sub("", turn[0].get("content") or "")
+        replies = [m["content"] for m in turn[1:]
+                   if m.get("content") and m.get("name") != "User" and m.get("role") != "function"]
+        line = f"User: {_clip(request, 160)}"
+        if replies:
+            line += f" -> {_clip(replies[-1], 160)}"
+        lines.append(line)
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class HistoryPolicy:
+    def __init__(self, max_turns: int = 6, summary_chars: int = 1500,
+                 summarizer=extractive_summary, pin_state=None):
+        """``pin_state(user_id)`` returns text describing the user's current state (e.g. cart)."""
+        self.max_turns = max_turns
+        self.summary_chars = summary_chars
+        self.summarizer = summarizer
+        self.pin_state = pin_state
+
+    def memory_message(self, conversation) -> dict:
+        parts = [f"User id: {conversation.user_id}"]
+        if conversation.pinned:
+            parts.append(f"Current state:\n{conversation.pinned}")
+        if conversation.summary:
+            parts.append(f"Earlier in this conversation:\n{conversation.summary}")
+        return {"role": "system", "name": MEMORY_NAME, "content": "\n\n".join(parts)}
+
+    def compact(self, conversation) -> int:
+        """Trim ``conversation`` to its last turns and re-pin its memory; returns the
+        number of messages dropped.
+
+        Call it after every turn, with the conversation's lock held: the pinned
+        state is refreshed each time, so the next turn never sees a stale cart.
+        """
+        groupchat = conversation.groupchat
+        dropped = 0
+        if len(conversation.turn_starts) > self.max_turns:
+            cut = conversation.turn_starts[-self.max_turns]
+            bounds = conversation.turn_starts[:-self.max_turns] + [cut]
+            turns = [groupchat.messages[a:b] for a, b in zip(bounds, bounds[1:]) if b > a]
+            conversation.summary = self.summarizer(conversation.summary, turns, self.summary_chars)
+            del groupchat.messages[:cut]
+            conversation.turn_starts = [start - cut for start in conversation.turn_starts[-self.max_turns:]]
+            dropped = cut
+
+        if self.pin_state:
+            try:
+                conversation.pinned = self.pin_state(conversation.user_id)
+            except Exception:
+                logger.exception("Could not refresh pinned state for %s", conversation.user_id)
+
+        if conversation.summary or conversation.pinned:
+            self._pin_memory(conversation)
+        self._count_tokens(conversation)
+        return dropped
+
+    def restore(self, conversation):
+        """Put the memory message back in front of a conversation restored from a snapshot."""
+        if conversation.summary or conversation.pinned:
+            self._pin_memory(conversation)
+        self._count_tokens(conversation)
+
+    def _pin_memory(self, conversation):
+        # Every agent mirrors the group chat transcript for this manager
+        groupchat = conversation.groupchat
+        keep = len(groupchat.messages)
+        memory = self.memory_message(conversation)
+        manager = conversation.manager
+        for agent in groupchat.agents:
+            history = agent._oai_messages.get(manager)
+            if history is not None:
+                history[:] = [memory] + [m for m in history if m.get("name") != MEMORY_NAME][-keep:]
+        # The manager only reads the last message it got from each speaker
+        for history in manager._oai_messages.values():
+            if len(history) > keep:
+                del history[:-keep]
+
+    def _count_tokens(self, conversation):
+        conversation.history_tokens = estimate_tokens(conversation.groupchat.messages) + (
+            estimate_tokens([self.memory_message(conversation)])
+            if conversation.summary or conversation.pinned else 0
+        )
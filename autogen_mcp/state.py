@@ -0,0 +1,107 @@
+"""Where the WhatsApp apps keep their mutable state (``STATE_BACKEND``).
+
+"memory" (the default) keeps the inbound queue and the conversations in the
+process, which is all a single worker needs. "redis" moves both to Redis at
+``STATE_REDIS_URL``, so any number of workers or replicas can serve the same
+webhook with no sticky routing:
+
+- inbound messages go to per-user mailboxes (RedisMessageQueue in
+  message_queue.py); any worker accepts a webhook, and whichever worker is
+  free serves a user's mailbox, in order, one message at a time;
+- every conversation (transcript, summary, pinned state) is saved after
+  each turn (RedisConversationStore below) and restored by the next worker
+  that serves the user, unless it already holds the latest copy.
+
+What stays per worker is either read-only (the agents, built once per
+process) or a cache that is safe to miss (tool results, the LLM reply cache;
+use LLM_CACHE=redis to share that one).
+"""
+import json
+import uuid
+
+import config
+from message_queue import MessageQueue, RedisMessageQueue, SeenMessages
+
+_client = None
+
+
+def redis_client():
+    """The asyncio Redis client for STATE_REDIS_URL, created on first use."""
+    global _client
+    if _client is None:
+        import redis.asyncio as aioredis
+
+        _client = aioredis.Redis.from_url(config.STATE_REDIS_URL, decode_responses=True)
+    return _client
+
+
+class MemoryConversationStore:
+    """Conversations only live in the process; nothing to load or save."""
+
+    async def load(self, user_id: str, version):
+        return None
+
+    async def save(self, user_id: str, snapshot: dict):
+        return None
+
+
+class RedisConversationStore:
+    """One hash per user: ``version`` and the JSON ``state`` of the conversation."""
+
+    prefix = "conv:"
+
+    def __init__(self, client, ttl_seconds: float):
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds)
+
+    async def load(self, user_id: str, version):
+        """The stored snapshot, or None if ``version`` is already the latest (or nothing is stored)."""
+        key = self.prefix + user_id
+        stored = await self.client.hget(key, "version")
+        if stored is None or stored == version:
+            return None
+        stored, state = await self.client.hmget(key, "version", "state")
+        if state is None:
+            return None
+        snapshot = json.loads(state)
+        snapshot["version"] = stored
+        return snapshot
+
+    async def save(self, user_id: str, snapshot: dict) -> str:
+        """Store ``snapshot``; returns its version."""
+        version = uuid.uuid4().hex
+        key = self.prefix + user_id
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"version": version, "state": json.dumps(snapshot, default=str)})
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+        return version
+
+
+def create_conversation_store():
+    if config.STATE_BACKEND == "memory":
+        return MemoryConversationStore()
+    if config.STATE_BACKEND == "redis":
+        return RedisConversationStore(redis_client(), config.CONVERSATION_STATE_TTL_SECONDS)
+    raise ValueError(f"Unknown STATE_BACKEND: {config.STATE_BACKEND}")
+
+
+def create_inbound_queue(handler):
+    """The inbound queue for STATE_BACKEND, calling ``await handler(message)``."""
+    if config.STATE_BACKEND == "memory":
+        return MessageQueue(
+            handler,
+            workers=config.QUEUE_WORKERS,
+            max_pending=config.QUEUE_MAX_PENDING,
+            seen=SeenMessages(ttl_seconds=config.DEDUPE_TTL_SECONDS),
+        )
+    if config.STATE_BACKEND == "redis":
+        return RedisMessageQueue(
+            redis_client(),
+            handler,
+            workers=config.QUEUE_WORKERS,
+            max_pending=config.QUEUE_MAX_PENDING,
+            dedupe_ttl_seconds=config.DEDUPE_TTL_SECONDS,
+            claim_idle_seconds=config.QUEUE_CLAIM_IDLE_SECONDS,
+        )
+    raise ValueError(f"Unknown STATE_BACKEND: {config.STATE_BACKEND}")
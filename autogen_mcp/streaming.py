@@ -0,0 +1,133 @@
+"""Streaming partial replies: send the first useful message of a turn early.
+
+A ``process_message_before_send`` hook on the shared agents sees every step
+of a group chat as it happens (in the turn's worker thread). Steps addressed
+to a manager with an open ``TurnStream`` are fed to it. The stream sends the
+first useful step right away: a tool result such as the cart contents, or a
+specialist's text reply. Orchestrator routing chatter and function-call
+requests are not useful. Later steps are sent only if they add something the
+user hasn't seen.
+
+Time to first reply (from webhook receipt) is tracked for every turn,
+streamed or not, in ``ReplyMetrics``.
+"""
+import re
+import threading
+import time
+from collections import deque
+
+from outbound import join_parts
+
+# Speakers whose text is coordination, not an answer
+NOT_USEFUL = {"User", "Orchestrator", "chat_manager"}
+# A later reply mostly made of words already sent (e.g. the LLM restating a
+# tool result) is redundant
+REDUNDANT_OVERLAP = 0.7
+
+
+def _text(message) -> str:
+    if isinstance(message, str):
+        return message.strip()
+    return (message.get("content") or "").strip()
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class ReplyMetrics:
+    def __init__(self, keep: int = 1000):
+        self._samples = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.streamed = 0
+
+    def record(self, seconds: float, streamed: bool):
+        with self._lock:
+            self._samples.append(seconds)
+            self.turns += 1
+            self.streamed += streamed
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"turns": 0, "streamed": 0}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 1)
+
+        return {
+            "turns": self.turns,
+            "streamed": self.streamed,
+            "first_reply_p50_ms": pct(50),
+            "first_reply_p95_ms": pct(95),
+            "first_reply_max_ms": round(samples[-1] * 1000, 1),
+        }
+
+
+class TurnStream:
+    def __init__(self, emit, received_at: float, metrics: ReplyMetrics = None):
+        """``emit(text)`` delivers a reply; it is called from the turn's worker thread."""
+        self.emit = emit
+        self.received_at = received_at
+        self.metrics = metrics
+        self.sent = []
+        self.first_reply_at = None
+
+    def _is_new(self, text: str) -> bool:
+        text = _normalized(text)
+        if any(text in sent or sent in text for sent in map(_normalized, self.sent)):
+            return False
+        words = set(re.findall(r"\w+", text))
+        seen = set(re.findall(r"\w+", _normalized(" ".join(self.sent))))
+        return not words or len(words & seen) / len(words) < REDUNDANT_OVERLAP
+
+    def _send(self, text: str, streamed: bool):
+        if self.first_reply_at is None:
+            self.first_reply_at = time.monotonic()
+            if self.metrics:
+                self.metrics.record(self.first_reply_at - self.received_at, streamed)
+        self.sent.append(text)
+        self.emit(text)
+
+    def on_step(self, speaker: str, message):
+        if isinstance(message, dict) and (message.get("function_call") or message.get("tool_calls")):
+            return
+        text = _text(message)
+        if not text or (speaker in NOT_USEFUL and not (isinstance(message, dict)
+                                                        and message.get("role") in ("function", "tool"))):
+            return
+        if self.first_reply_at is None and self._is_new(text):
+            self._send(text, streamed=True)
+
+    def finish(self, replies):
+        """Send whatever in the turn's final ``replies`` hasn't been covered yet."""
+        rest = [text for text in (r.strip() for r in replies if r) if text and self._is_new(text)]
+        if self.sent:
+            rest = rest[-1:]  # one closing message at most once something went out
+        if rest:
+            self._send(join_parts(rest), streamed=False)
+
+
+class StreamRegistry:
+    """Maps a conversation's manager to the stream of its running turn."""
+
+    def __init__(self):
+        self._streams = {}
+
+    def install(self, *agents):
+        for agent in agents:
+            agent.register_hook("process_message_before_send", self._hook)
+
+    def _hook(self, sender, message, recipient, silent):
+        stream = self._streams.get(recipient)
+        if stream is not None:
+            stream.on_step(sender.name, message)
+        return message
+
+    def open(self, manager, stream: TurnStream):
+        self._streams[manager] = stream
+
+    def close(self, manager):
+        self._streams.pop(manager, None)
@@ -0,0 +1,265 @@
+"""Metrics, per-turn spans and sampled logging for the WhatsApp apps.
+
+Metrics are Prometheus histograms/counters, served by ``GET /metrics``
+(``instrument(app)``): request latency per route, backend tool calls
+(``@tool``), OpenAI calls per agent with token counts (``install_llm()``),
+Twilio sends (outbound.py) and whole turns. With several workers (serve.py
+sets ``PROMETHEUS_MULTIPROC_DIR``) every worker's metrics are aggregated.
+
+Each turn runs inside a ``span`` (OpenTelemetry-style: trace id, span id,
+parent, attributes). The current span is a context variable, so it follows
+the turn into ``asyncio.to_thread`` and the engine's worker threads; LLM and
+tool calls add their counts to it. Spans are logged as one JSON line when
+their trace is sampled (``TRACE_SAMPLE_RATE``), failed, or ran longer than
+``TRACE_SLOW_SECONDS``.
+
+Per-message logs go through ``sampled_logger`` (``LOG_SAMPLE_RATE``);
+warnings and errors are always kept.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from prometheus_client import Counter, Histogram
+
+import config
+from backend import load_service_module
+
+# The backend's metrics.py (loaded by file, like the in-process backend does)
+_metrics = load_service_module("metrics")
+
+HTTP_SECONDS = Histogram(
+    "whatsapp_http_request_seconds", "WhatsApp app request latency", ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+TOOL_SECONDS = Histogram(
+    "agent_tool_call_seconds", "Backend tool call latency", ["tool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+LLM_SECONDS = Histogram(
+    "llm_call_seconds", "OpenAI call latency per agent", ["agent", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_TOKENS = Counter("llm_tokens", "OpenAI tokens per agent", ["agent", "kind"])
+PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens_estimated", "Estimated prompt tokens per agent, by part (see prompt_budget.py)",
+    ["agent", "part"],
+)
+TWILIO_SECONDS = Histogram(
+    "twilio_send_seconds", "Twilio message send latency", ["outcome"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SPAN_SECONDS = Histogram(
+    "span_seconds", "Span duration (whole turns and their parts)", ["name", "outcome"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+
+span_log = logging.getLogger("telemetry.spans")
+# AutoGen's runtime logging timestamps (UTC)
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+# -------- HTTP --------
+
+def instrument(app):
+    """Time every request into ``whatsapp_http_request_seconds`` and serve ``GET /metrics``,
+    with the backend's middleware and (multi-worker aware) endpoint."""
+    _metrics.instrument(app, histogram=HTTP_SECONDS)
+
+
+# -------- Tools and LLM calls --------
+
+def tool(fn):
+    """Time a tool function (sync or async) and count it on the current span."""
+    histogram = TOOL_SECONDS.labels(fn.__name__.removeprefix("a_"))
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+                add("tool_calls")
+        return timed
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+            add("tool_calls")
+    return timed
+
+
+_llm_installed = False
+
+
+def install_llm():
+    """Time every OpenAI call AutoGen makes, per agent, and count its tokens.
+
+    Uses AutoGen's runtime logging, which reports each completion with the
+    agent that made it, so the group chat's speaker selection (a new agent
+    per selection) is covered too. LLM cache hits (llm_reply.py) never make
+    a call.
+    """
+    global _llm_installed
+    if _llm_installed:
+        return
+    from autogen import runtime_logging
+
+    runtime_logging.start(logger=_llm_logger())
+    _llm_installed = True
+
+
+def _llm_logger():
+    from autogen.logger.base_logger import BaseLogger
+
+    class LLMCallLogger(BaseLogger):
+        """Only completions are of interest; AutoGen's other events are dropped."""
+
+        def start(self):
+            return ""
+
+        def log_chat_completion(self, invocation_id, client_id, wrapper_id, source, request, response,
+                                is_cached, cost, start_time):
+            # Called in the thread (and context) that made the call, right after it
+            if is_cached:
+                return
+            agent = getattr(source, "name", source) or "unknown"
+            started = datetime.strptime(start_time, _TS_FORMAT).replace(tzinfo=timezone.utc)
+            usage = getattr(response, "usage", None)
+            LLM_SECONDS.labels(agent, "error" if isinstance(response, str) else "ok").observe(
+                (datetime.now(timezone.utc) - started).total_seconds()
+            )
+            add("llm_calls")
+            if usage is not None:
+                LLM_TOKENS.labels(agent, "prompt").inc(usage.prompt_tokens or 0)
+                LLM_TOKENS.labels(agent, "completion").inc(usage.completion_tokens or 0)
+                add("prompt_tokens", usage.prompt_tokens or 0)
+                add("completion_tokens", usage.completion_tokens or 0)
+
+        def log_new_agent(self, agent, init_args):
+            pass
+
+        def log_event(self, source, name, **kwargs):
+            pass
+
+        def log_new_wrapper(self, wrapper, init_args):
+            pass
+
+        def log_new_client(self, client, wrapper, init_args):
+            pass
+
+        def log_function_use(self, source, function, args, returns):
+            pass
+
+        def stop(self):
+            pass
+
+        def get_connection(self):
+            return None
+
+    return LLMCallLogger()
+
+
+# -------- Spans --------
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent", "sampled", "start", "attributes")
+
+    def __init__(self, name: str, parent: "Span" = None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.sampled = parent.sampled if parent else random.random() < config.TRACE_SAMPLE_RATE
+        self.start = time.perf_counter()
+        self.attributes = attributes
+
+    def add(self, key: str, value=1):
+        span = self
+        while span is not None:
+            span.attributes[key] = span.attributes.get(key, 0) + value
+            span = span.parent
+
+    def end(self, error: BaseException = None):
+        duration = time.perf_counter() - self.start
+        outcome = "error" if error else "ok"
+        SPAN_SECONDS.labels(self.name, outcome).observe(duration)
+        if (self.sampled or error or duration > config.TRACE_SLOW_SECONDS) and span_log.isEnabledFor(logging.INFO):
+            span_log.info(json.dumps({
+                "name": self.name,
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent.span_id if self.parent else None,
+                "duration_ms": round(duration * 1000, 2),
+                "outcome": outcome,
+                "error": repr(error) if error else None,
+                **self.attributes,
+            }, default=str))
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """A child of the current span (or a new trace), current while the block runs."""
+    current = Span(name, _current_span.get(), **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    else:
+        current.end()
+    finally:
+        _current_span.reset(token)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def add(key: str, value=1):
+    """Add to a counter attribute of the current span and its parents, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, value)
+
+
+# -------- Logging --------
+
+class SampleFilter(logging.Filter):
+    """Keeps warnings and errors, and ``rate`` of everything below."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def sampled_logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, SampleFilter) for f in logger.filters):
+        logger.addFilter(SampleFilter(config.LOG_SAMPLE_RATE))
+    return logger
+
+
+def configure_logging():
+    logging.basicConfig(
+        level=getattr(logging, config.LOG_LEVEL.upper(), logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+
+import fakeredis
+import pytest
+
+import config
+from backend import InProcessBackend, SERVICE_MODULES, _import_services
+
+
+@pytest.fixture(scope="module")
+def backend():
+    _import_services(config.BACKEND_PATH)
+    monkeypatch = pytest.MonkeyPatch()
+    # Its near cache watcher needs a Redis; no order log consumer writing to data/
+    monkeypatch.setattr(sys.modules["redis_connection"], "ar", fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(sys.modules["orders"], "ORDER_LOG_CONSUMER", False)
+    backend = InProcessBackend(timeout=0.2)
+    yield backend
+    backend.close()
+    monkeypatch.undo()
+
+
+def test_imports_the_service_layer_from_backend_path(backend):
+    for name in SERVICE_MODULES:
+        assert os.path.samefile(sys.modules[name].__file__, os.path.join(config.BACKEND_PATH, f"{name}.py"))
+    # This app's main.py is not shadowed
+    assert "main" not in sys.modules or os.path.dirname(sys.modules["main"].__file__) != config.BACKEND_PATH
+    assert backend.get_categories()["categories"]
+
+
+def test_a_stuck_call_times_out(backend, monkeypatch):
+    cancelled = []
+
+    async def stuck(user_id):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(user_id)
+            raise
+
+    monkeypatch.setattr(backend.services, "view_cart", stuck)
+    with pytest.raises(TimeoutError):
+        backend.view_cart("u1")
+    with pytest.raises(TimeoutError):
+        asyncio.run(backend.a_view_cart("u2"))
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), backend._loop).result(1)
+    assert sorted(cancelled) == ["u1", "u2"]
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from engine import ExecutionEngine, TurnTimeout
+
+
+def test_stuck_turn_is_bounded_and_blocks_the_next_turn():
+    engine = ExecutionEngine(max_workers=2, turn_timeout=0.05, stop_timeout=0.05)
+    manager = object()
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(TurnTimeout):
+            await asyncio.wait_for(engine.run(manager, release.wait), 1)
+        assert engine.stats()["stuck"] == 1
+        # The stuck turn still owns the conversation
+        with pytest.raises(TurnTimeout):
+            await engine.run(manager, lambda: "second")
+        release.set()
+        for _ in range(100):
+            if not engine.stats()["stuck"]:
+                break
+            await asyncio.sleep(0.01)
+        return await engine.run(manager, lambda: "third")
+
+    try:
+        assert asyncio.run(scenario()) == "third"
+        assert engine.stats()["timeouts"] == 2
+    finally:
+        release.set()
+        engine.shutdown()
+
+
+def test_timed_out_turn_that_stops_is_not_stuck():
+    engine = ExecutionEngine(max_workers=1, turn_timeout=0.05, stop_timeout=1)
+    manager = object()
+
+    async def scenario():
+        with pytest.raises(TurnTimeout):
+            await engine.run(manager, time.sleep, 0.1)
+        return await engine.run(manager, lambda: "next")
+
+    assert asyncio.run(scenario()) == "next"
+    assert engine.stats()["stuck"] == 0
+    engine.shutdown()
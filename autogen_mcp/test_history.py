@@ -0,0 +1,43 @@
+from router import turn_messages
+from session.history import MEMORY_NAME, HistoryPolicy
+
+
+def _conversation():
+    from autogen import ConversableAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+    from session.conversations import Conversation
+
+    user = UserProxyAgent("User", human_input_mode="NEVER", code_execution_config=False)
+    cart = ConversableAgent("CartAgent", llm_config=False)
+    manager = GroupChatManager(GroupChat(agents=[user, cart], messages=[]), llm_config=False)
+    return Conversation("u1", user, manager), cart
+
+
+def test_pinned_state_is_refreshed_every_turn():
+    carts = iter(["Your cart is empty", "2 x Apple"])
+    history = HistoryPolicy(max_turns=6, pin_state=lambda user_id: next(carts))
+    conversation, cart = _conversation()
+
+    for reply in ("Your cart is empty", "Added 2 Apple"):
+        conversation.record_turn(turn_messages("u1", "cart", "CartAgent", reply))
+        assert history.compact(conversation) == 0  # nothing to summarize yet
+
+    assert conversation.pinned == "2 x Apple"
+    memory = cart._oai_messages[conversation.manager][0]
+    assert memory["name"] == MEMORY_NAME
+    assert "2 x Apple" in memory["content"]
+    # Re-pinned in place, not stacked
+    assert [m["name"] for m in cart._oai_messages[conversation.manager]].count(MEMORY_NAME) == 1
+
+
+def test_old_turns_are_summarized():
+    history = HistoryPolicy(max_turns=1, pin_state=lambda user_id: "empty")
+    conversation, cart = _conversation()
+    conversation.record_turn(turn_messages("u1", "list categories", "ItemAgent", "Fruit, Dairy"))
+    history.compact(conversation)
+    conversation.record_turn(turn_messages("u1", "show my cart", "CartAgent", "Your cart is empty"))
+
+    assert history.compact(conversation) == 2
+    assert conversation.summary == "User: list categories -> Fruit, Dairy"
+    assert [m["content"] for m in conversation.groupchat.messages] == ["(user_id: u1) show my cart", "Your cart is empty"]
+    assert [m.get("name") for m in cart._oai_messages[conversation.manager]][0] == MEMORY_NAME
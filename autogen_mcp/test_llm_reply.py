@@ -0,0 +1,48 @@
+from llm_cache import LLMCache, MemoryStore
+from llm_reply import LLMReply
+from prompt_budget import PromptBudget
+
+USER = "+15550000001"
+FUNCTIONS = [{"name": name, "description": name, "parameters": {"type": "object", "properties": {}}}
+             for name in ("add_to_cart", "view_cart")]
+
+
+def _agents():
+    from autogen import ConversableAgent
+
+    cart = ConversableAgent("CartAgent", llm_config={
+        "config_list": [{"model": "gpt-4o-mini", "api_key": "sk-test"}], "functions": FUNCTIONS,
+    })
+    user = ConversableAgent("User", llm_config=False)
+    return cart, user
+
+
+def test_cache_then_budget_then_llm():
+    calls = []
+    cache = LLMCache(MemoryStore(100, 60))
+    budget = PromptBudget()
+    client_for, get, set_ = budget.client_for, cache.get, cache.set
+    budget.client_for = lambda *args: calls.append("budget") or client_for(*args)
+    cache.get = lambda *args: calls.append("cache.get") or get(*args)
+    cache.set = lambda *args: calls.append("cache.set") or set_(*args)
+
+    cart, user = _agents()
+    LLMReply(cache=cache, budget=budget).install(cart)
+
+    def llm(messages, sender, config=None):
+        calls.append("llm")
+        assert [f["name"] for f in config._config_list[0]["functions"]] == ["view_cart"]
+        return True, f"Your cart is empty, {USER}"
+    cart.generate_oai_reply = llm
+
+    message = {"role": "user", "name": "User", "content": f"(user_id: {USER}) show my cart"}
+    assert cart.generate_reply([message], user) == f"Your cart is empty, {USER}"
+    assert calls == ["cache.get", "budget", "llm", "cache.set"]
+
+    # A hit skips the budget and the call, and is personalised again
+    calls.clear()
+    other = {"role": "user", "name": "User", "content": "(user_id: +15550000002)  Show my cart"}
+    assert cart.generate_reply([other], user) == "Your cart is empty, +15550000002"
+    assert calls == ["cache.get"]
+    assert budget.stats()["agents"]["CartAgent"]["calls"] == 1
+
@@ -0,0 +1,82 @@
+from agents import cart_agent, item_agent
+from prompt_budget import PromptBudget, intents, minify_function
+
+CART = {"add_to_cart", "remove_from_cart", "update_cart_items", "view_cart"}
+ITEM = {"get_categories", "get_category_items", "get_item_info", "search_items"}
+
+
+class Agent:
+    def __init__(self, name, functions):
+        self.name = name
+        self.llm_config = {"config_list": [{"model": "fake"}], "functions": [
+            {"name": f, "description": f"Does {f}", "parameters": {"type": "object", "properties": {}}}
+            for f in sorted(functions)
+        ]}
+
+
+def budget():
+    budget = PromptBudget()
+    budget.install(Agent("CartAgent", CART), Agent("ItemAgent", ITEM))
+    return budget
+
+
+def user(text):
+    return {"role": "user", "name": "User", "content": f"(user_id: +15550000001) {text}"}
+
+
+def sent(budget, agent, messages):
+    return {f["name"] for f in budget.functions_for(agent, messages)}
+
+
+def test_no_intent_sends_all_functions():
+    b = budget()
+    for text in ("I'd like 2 kg of onions", "3 apples and 1 milk", "yes please", "make it 5 instead",
+                 "I want to order 2 kg rice"):
+        assert intents(text) == set(), text
+        assert sent(b, "CartAgent", [user(text)]) == CART, text
+        assert sent(b, "ItemAgent", [user(text)]) == ITEM, text
+
+
+def test_cart_keeps_all_functions_for_product_and_checkout_intents():
+    b = budget()
+    for text in ("do you have apples?", "what categories do you have?", "I want to checkout"):
+        assert sent(b, "CartAgent", [user(text)]) == CART, text
+
+
+def test_intent_scopes_functions():
+    b = budget()
+    assert sent(b, "CartAgent", [user("add 2 kg apples")]) == {"add_to_cart", "update_cart_items"}
+    assert sent(b, "CartAgent", [user("show my cart")]) == {"view_cart"}
+    assert sent(b, "ItemAgent", [user("show me the categories")]) == {"get_categories", "get_category_items"}
+    assert sent(b, "ItemAgent", [user("what categories do you have?")]) == ITEM
+
+
+def test_agent_follow_up_widens_the_turn():
+    b = budget()
+    messages = [
+        user("do you have green apples?"),
+        {"role": "user", "name": "CartAgent", "content": "Shall I put them in your cart?"},
+        user("yes, and show my cart"),
+    ]
+    assert sent(b, "CartAgent", messages) == {"add_to_cart", "update_cart_items", "view_cart"}
+    # Replies before the user's previous message don't count
+    assert sent(b, "CartAgent", messages[1:2] + [user("hi"), user("show my cart")]) == {"view_cart"}
+
+
+def test_tables_name_real_functions():
+    for module, names in ((cart_agent, CART), (item_agent, ITEM)):
+        for functions in module.intent_functions.values():
+            assert set(functions) <= names
+
+
+def test_minify_drops_descriptions_that_restate_the_name():
+    function = minify_function({"name": "view_cart", "description": "View  the\ncart", "parameters": {
+        "type": "object",
+        "properties": {"user_id": {"type": "string", "description": "The user ID"},
+                       "query": {"type": "string", "description": "Words to look for"}},
+        "required": [],
+    }})
+    assert "description" not in function["parameters"]["properties"]["user_id"]
+    assert function["parameters"]["properties"]["query"]["description"] == "Words to look for"
+    assert "required" not in function["parameters"]
+    assert function["description"] == "View the cart"
@@ -0,0 +1,95 @@
+import pytest
+
+import backend
+from router import IntentRouter, normalize, turn_messages
+
+ITEMS = [
+    {"id": 1, "name": "Apple", "unit": "kg"},
+    {"id": 2, "name": "Milk", "unit": "liter"},
+    {"id": 3, "name": "Green Tea", "unit": "kg"},
+    {"id": 4, "name": "Green Teas", "unit": "kg"},
+]
+
+
+class FakeBackend:
+    def __init__(self):
+        self.calls = []
+
+    def search_items(self, query, limit=10):
+        hits = []
+        for item in ITEMS:
+            name = item["name"].lower()
+            if query in name:
+                hits.append(dict(item, score=1.0 if name == query else 0.95 if name.startswith(query) else 0.5))
+        return {"items": sorted(hits, key=lambda i: -i["score"])[:limit]}
+
+    def add_to_cart(self, user_id, item_id, quantity):
+        self.calls.append(("add", user_id, item_id, quantity))
+
+    def remove_from_cart(self, user_id, item_id):
+        self.calls.append(("remove", user_id, item_id))
+
+    def view_cart(self, user_id):
+        self.calls.append(("view", user_id))
+        return {"cart": []}
+
+
+@pytest.fixture
+def fake_backend():
+    fake = FakeBackend()
+    backend.set_backend(fake)
+    yield fake
+    backend.set_backend(None)
+
+
+@pytest.mark.parametrize("message, call", [
+    ("add 2 kg apple", ("add", "u1", 1, 2.0)),
+    ("Please add 2 apples to my cart!", ("add", "u1", 1, 2.0)),
+    ("buy 500 g of apple", ("add", "u1", 1, 0.5)),
+    ("i need 1.5 l milk", ("add", "u1", 2, 1.5)),
+    ("add 3 pcs apple", ("add", "u1", 1, 3.0)),
+    ("remove milk", ("remove", "u1", 2)),
+    ("delete the apples from my cart", ("remove", "u1", 1)),
+])
+def test_cart_commands(fake_backend, message, call):
+    agent, _ = IntentRouter().route("u1", message)
+    assert agent == "CartAgent"
+    assert fake_backend.calls == [call]
+
+
+@pytest.mark.parametrize("message", [
+    "add 2 unicorns",          # not in the catalog
+    "add 2 green tea",         # "green tea" and "green teas" are too close to call
+    "add 2 l apple",           # apples are sold per kg
+    "add some apples",         # no quantity
+    "remove",
+    "do you have apples?",
+])
+def test_falls_back_to_the_agents(fake_backend, message):
+    router = IntentRouter()
+    assert router.route("u1", message) is None
+    assert fake_backend.calls == []
+    assert router.stats()["hits"] == 0
+
+
+def test_view_cart_and_normalize(fake_backend):
+    assert normalize("  Hi,  show   my cart please. ") == "show my cart"
+    assert IntentRouter().route("u1", "show my cart") == ("CartAgent", "Your cart is empty")
+
+
+def test_routed_turn_is_recorded_in_the_conversation():
+    from autogen import ConversableAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+    from session.conversations import Conversation
+
+    user = UserProxyAgent("User", human_input_mode="NEVER", code_execution_config=False)
+    cart = ConversableAgent("CartAgent", llm_config=False)
+    manager = GroupChatManager(GroupChat(agents=[user, cart], messages=[]), llm_config=False)
+    conversation = Conversation("u1", user, manager)
+
+    conversation.record_turn(turn_messages("u1", "show my cart", "CartAgent", "Your cart is empty"))
+    assert conversation.turn_starts == [0]
+    assert [m["name"] for m in conversation.groupchat.messages] == ["User", "CartAgent"]
+    seen = cart._oai_messages[manager]
+    assert [m["content"] for m in seen] == ["(user_id: u1) show my cart", "Your cart is empty"]
+    assert [m["role"] for m in seen] == ["user", "assistant"]
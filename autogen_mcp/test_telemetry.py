@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+import telemetry
+
+
+def test_llm_logger_counts_calls_on_the_span():
+    usage = SimpleNamespace(prompt_tokens=12, completion_tokens=3)
+    with telemetry.span("turn") as turn:
+        telemetry._llm_logger().log_chat_completion(
+            None, 1, 2, SimpleNamespace(name="CartAgent"), {}, SimpleNamespace(usage=usage),
+            0, 0.0, "2024-05-01 12:00:00.000000",
+        )
+    assert turn.attributes["llm_calls"] == 1
+    assert turn.attributes["prompt_tokens"] == 12
+    assert turn.attributes["completion_tokens"] == 3
+
+
+def test_instrument_times_routes_and_serves_metrics():
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    telemetry.instrument(app)
+
+    @app.get("/ping/{name}")
+    async def ping(name: str):
+        return {"pong": name}
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            await client.get("/ping/a")
+            return (await client.get("/metrics")).text
+
+    text = asyncio.run(scenario())
+    assert 'whatsapp_http_request_seconds_count{method="GET",route="/ping/{name}",status="200"} 1.0' in text
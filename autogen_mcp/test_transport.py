@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+import transport
+
+
+def test_async_client_per_event_loop():
+    async def clients():
+        first, second = transport.get_async_client(), transport.get_async_client()
+        await transport.aclose()
+        return first, second
+
+    a1, a2 = asyncio.run(clients())
+    b1, _ = asyncio.run(clients())
+    assert a1 is a2
+    assert a1 is not b1
+    assert a1.is_closed and b1.is_closed
+
+
+def test_loops_in_threads_get_their_own_client():
+    # As InProcessBackend does: a private loop in a thread next to the app's
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def client():
+        return transport.get_async_client()
+
+    async def main():
+        theirs = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client(), loop))
+        ours = transport.get_async_client()
+        await transport.aclose()
+        return ours, theirs
+
+    try:
+        ours, theirs = asyncio.run(main())
+        assert ours is not theirs
+        assert asyncio.run_coroutine_threadsafe(client(), loop).result(5) is theirs
+        asyncio.run_coroutine_threadsafe(transport.aclose(), loop).result(5)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
@@ -0,0 +1,89 @@
+"""Memoized results of the read-only catalog tools.
+
+Entries belong to one catalog version. The backend's current version is
+checked at most every ``CATALOG_VERSION_CHECK_SECONDS``; when it changes the
+whole memo is dropped, so a catalog edit shows up within that interval.
+Only successful backend results are stored, never fallback text.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from backend import get_backend
+
+
+class CatalogMemo:
+    def __init__(self, max_entries: int = 2048, check_seconds: float = 2):
+        self.max_entries = max_entries
+        self.check_seconds = check_seconds
+        self.version = None
+        self._checked_at = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _due(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.check_seconds
+
+    def _set_version(self, version: str):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def _store(self, key, version, value):
+        with self._lock:
+            if version != self.version:
+                return  # catalog changed while we were fetching
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key, fetch):
+        """Return the memoized ``fetch()`` result for ``key``."""
+        if self._due():
+            self._set_version(get_backend().catalog_version())
+        version = self.version
+        found, value = self._lookup(key)
+        if not found:
+            value = fetch()
+            self._store(key, version, value)
+        return value
+
+    async def aget(self, key, fetch):
+        """Async ``get``; ``fetch`` returns an awaitable."""
+        if self._due():
+            self._set_version(await get_backend().a_catalog_version())
+        version = self.version
+        found, value = self._lookup(key)
+        if not found:
+            value = await fetch()
+            self._store(key, version, value)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "version": self.version,
+        }
+
+
+catalog_memo = CatalogMemo(config.TOOL_CACHE_MAX_ENTRIES, config.CATALOG_VERSION_CHECK_SECONDS)
@@ -0,0 +1,133 @@
+"""Shared HTTP transport for the agent tool functions.
+
+One keep-alive connection pool per process for sync calls and one per event
+loop for async calls (an httpx.AsyncClient is bound to the loop that opened
+its connections; InProcessBackend and the app each run their own), a
+configurable base URL and timeouts, and retries with full jitter. Only idempotent requests
+are retried after the request may have reached the backend; anything else is
+retried only when the connection could not be established.
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+import httpx
+
+import config
+
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Errors raised before any bytes were sent: safe to retry for every method
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient
+_lock = threading.Lock()
+
+
+def _settings():
+    return dict(
+        base_url=config.BACKEND_URL,
+        timeout=httpx.Timeout(config.BACKEND_TIMEOUT, connect=config.BACKEND_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=config.BACKEND_MAX_CONNECTIONS,
+            max_keepalive_connections=config.BACKEND_MAX_KEEPALIVE,
+        ),
+    )
+
+
+def get_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(**_settings())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """The client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = httpx.AsyncClient(**_settings())
+    return client
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: spreads out retries from many concurrent tool calls
+    return random.uniform(0, config.BACKEND_RETRY_BACKOFF * (2 ** attempt))
+
+
+def _should_retry(method, attempt, error=None, response=None, idempotent=None) -> bool:
+    if attempt >= config.BACKEND_RETRIES:
+        return False
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    if error is not None:
+        return isinstance(error, CONNECT_ERRORS) or (idempotent and isinstance(error, httpx.TransportError))
+    return idempotent and response.status_code in RETRY_STATUSES
+
+
+def request(method: str, path: str, idempotent=None, **kwargs) -> httpx.Response:
+    attempt = 0
+    while True:
+        try:
+            response = get_client().request(method, path, **kwargs)
+        except httpx.TransportError as e:
+            if not _should_retry(method, attempt, error=e, idempotent=idempotent):
+                raise
+        else:
+            if not _should_retry(method, attempt, response=response, idempotent=idempotent):
+                return response
+        time.sleep(_backoff(attempt))
+        attempt += 1
+
+
+async def arequest(method: str, path: str, idempotent=None, **kwargs) -> httpx.Response:
+    attempt = 0
+    while True:
+        try:
+            response = await get_async_client().request(method, path, **kwargs)
+        except httpx.TransportError as e:
+            if not _should_retry(method, attempt, error=e, idempotent=idempotent):
+                raise
+        else:
+            if not _should_retry(method, attempt, response=response, idempotent=idempotent):
+                return response
+        await asyncio.sleep(_backoff(attempt))
+        attempt += 1
+
+
+def get(path: str, **kwargs) -> httpx.Response:
+    return request("GET", path, **kwargs)
+
+
+def post(path: str, **kwargs) -> httpx.Response:
+    return request("POST", path, **kwargs)
+
+
+async def aget(path: str, **kwargs) -> httpx.Response:
+    return await arequest("GET", path, **kwargs)
+
+
+async def apost(path: str, **kwargs) -> httpx.Response:
+    return await arequest("POST", path, **kwargs)
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def aclose():
+    """Close the running event loop's client."""
+    with _lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -1,162 +1,278 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
-from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client
-from autogen import UserProxyAgent, GroupChat, GroupChatManager
-import os
-from dotenv import load_dotenv
+import asyncio
 import logging
 import sys
+import time
 import traceback
+import config
+import telemetry
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (LOG_LEVEL). Per-message logs are sampled
+# (LOG_SAMPLE_RATE); warnings and errors are always kept
+telemetry.configure_logging()
 logger = logging.getLogger(__name__)
+request_log = telemetry.sampled_logger(__name__ + ".requests")
 
 try:
-    # Load environment variables
-    load_dotenv(override=True)
-    logger.info("Environment variables loaded")
-
-    # Initialize Twilio client
-    account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-    auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-    twilio_phone = os.getenv('TWILIO_PHONE_NUMBER')
-    twilio_client = Client(account_sid, auth_token)
-    logger.info("Twilio client initialized")
-
-    # Import agents
-    logger.info("Importing agents...")
-    from agents.orchestrator import create_orchestrator_agent
-    from agents.item_agent import create_item_agent
-    from agents.cart_agent import create_cart_agent
-    from agents.order_agent import create_order_agent
-    logger.info("Agents imported successfully")
-
-    # Initialize agents
-    logger.info("Initializing agents...")
+    # AutoGen and Twilio are imported on first use (see registry.py and
+    # outbound.twilio_client), so this import stays fast
+    from session.conversations import Conversation, ConversationManager
+    from session.history import HistoryPolicy
+    from agents.cart_agent import view_cart
+    from message_queue import InboundMessage
+    from state import create_conversation_store, create_inbound_queue
+    from router import IntentRouter, turn_messages
+    from llm_cache import create_llm_cache
+    from prompt_budget import PromptBudget
+    from llm_reply import LLMReply
+    from tool_cache import catalog_memo
+    from outbound import create_dispatcher, twilio_client
+    from streaming import ReplyMetrics, StreamRegistry, TurnStream
+    from engine import ExecutionEngine, TurnTimeout
+    from registry import AgentRegistry
+    import transport
+    logger.info("Modules imported successfully")
+
+except Exception as e:
+    logger.error("Error during initialization:")
+    logger.error(traceback.format_exc())
+    raise e
+
+llm_cache = create_llm_cache()
+# Per-agent prompt token accounting; trims the function schemas sent when PROMPT_BUDGET is on
+prompt_budget = PromptBudget(enabled=config.PROMPT_BUDGET)
+# Cache, then budget, then the LLM call (see llm_reply.py)
+llm_reply = LLMReply(cache=llm_cache, budget=prompt_budget)
+
+def create_conversation(phone_number: str) -> Conversation:
+    from autogen import UserProxyAgent, GroupChat, GroupChatManager
+
     user_proxy = UserProxyAgent(
         name="User",
         human_input_mode="NEVER",
         code_execution_config=False
     )
-
-    orchestrator = create_orchestrator_agent()
-    item_agent = create_item_agent()
-    cart_agent = create_cart_agent()
-    order_agent = create_order_agent()
-    logger.info("Agents initialized successfully")
-
-    # Create group chat with fixed speaker order
-    logger.info("Creating group chat...")
+    # Group chat with fixed speaker order
     group_chat = GroupChat(
-        agents=[user_proxy, orchestrator, item_agent, cart_agent, order_agent],
+        agents=[user_proxy, *agents.get()],
         messages=[],
         max_round=10,
         speaker_selection_method="round_robin"  # Use round-robin to avoid API calls
     )
-    logger.info("Group chat created successfully")
-
-    # Create chat manager with minimal configuration
-    manager = GroupChatManager(
-        groupchat=group_chat,
-        llm_config={
-            "config_list": [{
-                "model": "gpt-4-0613",
-                "api_key": os.getenv("OPENAI_API_KEY")
-            }]
-        }
-    )
+    # Round-robin never asks the manager's LLM, so it gets none
+    manager = GroupChatManager(groupchat=group_chat, llm_config=False)
+    return Conversation(phone_number, user_proxy, manager)
 
-except Exception as e:
-    logger.error("Error during initialization:")
-    logger.error(traceback.format_exc())
-    raise e
+# Last few turns verbatim, older ones summarized, cart pinned
+history = HistoryPolicy(
+    max_turns=config.HISTORY_MAX_TURNS,
+    summary_chars=config.HISTORY_SUMMARY_CHARS,
+    pin_state=view_cart,
+)
 
 # Store user sessions
-user_sessions = {}
-
-def get_user_session(phone_number: str):
-    if phone_number not in user_sessions:
-        logger.info(f"Creating new session for user: {phone_number}")
-        user_sessions[phone_number] = {
-            "messages": [],
-            "last_agent": None,
-            "manager": manager  # Use the same manager for all users
-        }
-    return user_sessions[phone_number]
-
-async def process_message(phone_number: str, message: str):
-    try:
-        logger.info(f"Processing message from {phone_number}: {message}")
+conversations = ConversationManager(
+    create_conversation,
+    max_sessions=config.MAX_CONVERSATIONS,
+    ttl_seconds=config.CONVERSATION_TTL_SECONDS,
+    store=create_conversation_store(),
+    on_restore=history.restore,
+)
+
+# Simple commands are answered without the LLM
+router = IntentRouter()
+
+# Agent steps are watched so the first useful one reaches the user early
+streams = StreamRegistry()
+reply_metrics = ReplyMetrics()
+
+# Bounded pool for the blocking AutoGen turns, with per-turn timeouts
+engine = ExecutionEngine(
+    max_workers=config.AGENT_WORKERS,
+    turn_timeout=config.TURN_TIMEOUT_SECONDS,
+    stop_timeout=config.TURN_STOP_TIMEOUT_SECONDS,
+)
+
+def setup_agents(*specialists):
+    telemetry.install_llm()
+    llm_reply.install(*specialists)
+    if config.STREAM_REPLIES:
+        streams.install(*specialists)
+    engine.install(*specialists)
+
+# Shared specialist agents, built in the background at startup (or on the
+# first message); per-user state lives in each user's own proxy, group chat
+# and manager
+agents = AgentRegistry(setup_agents)
 
-        # Get or create user session
-        session = get_user_session(phone_number)
 
-        # Start chat directly with orchestrator
-        logger.info("Starting chat with orchestrator...")
-        chat_response = await session["manager"].initiate_chat(
-            user_proxy,
+def run_turn(conversation: Conversation, message: str, stream: TurnStream = None):
+    # Blocking AutoGen round trip; called from a worker thread
+    start = conversation.begin_turn()
+    if stream:
+        streams.open(conversation.manager, stream)
+    try:
+        conversation.user_proxy.initiate_chat(
+            conversation.manager,
             message=message,
             clear_history=False
         )
+    finally:
+        streams.close(conversation.manager)
+    messages = conversation.groupchat.messages[start:]
+    history.compact(conversation)
+    return messages
 
-        # Get the messages from the group chat
-        messages = session["manager"].groupchat.messages
-        
-        # Log all messages for debugging
-        logger.info("--- Full Chat History ---")
+async def run_agents(phone_number: str, message: str, stream: TurnStream = None) -> str:
+    # The user's own conversation; their messages are handled one at a time,
+    # other users' messages run concurrently in worker threads
+    request_log.info("Starting chat with orchestrator for %s", phone_number)
+    start = time.perf_counter()
+    await agents.aget()
+    messages = await conversations.run(
+        phone_number,
+        lambda conversation: engine.run(
+            conversation.manager, run_turn, conversation, f"(user_id: {phone_number}) {message}", stream
+        )
+    )
+    router.record_agent_turn(time.perf_counter() - start)
+
+    # Log this turn's messages for debugging
+    if logger.isEnabledFor(logging.DEBUG):
         for m in messages:
-            logger.info(f"{m['name']}: {m['content']}")
-        
-        # Find the last message from any agent
-        agent_responses = [m for m in reversed(messages) 
-                         if m["name"] != "User" 
-                         and m["content"]]
-        
-        if not agent_responses:
-            logger.warning("No agent responses found in chat history")
-            last_response = "I couldn't process your request. Please try again."
-        else:
-            last_response = agent_responses[0]["content"]
-            logger.info(f"Using response from {agent_responses[0]['name']}: {last_response}")
-
-        # Send response via Twilio
-        twilio_client.messages.create(
-            from_=f"whatsapp:{twilio_phone}",
-            body=last_response,
-            to=f"whatsapp:{phone_number}"
+            logger.debug("%s: %s", m.get("name"), m.get("content"))
+
+    # Find the last message from any agent
+    agent_responses = [m for m in reversed(messages) 
+                     if m.get("name") != "User" 
+                     and m.get("content")
+                     and not m.get("function_call")]
+    
+    if not agent_responses:
+        logger.warning("No agent responses found in chat history")
+        return "I couldn't process your request. Please try again."
+    request_log.info("Using response from %s", agent_responses[0]["name"])
+    return agent_responses[0]["content"]
+
+def record_turn(conversation: Conversation, messages: list):
+    # Blocking (may refresh the pinned cart); called from a worker thread
+    conversation.record_turn(messages)
+    history.compact(conversation)
+
+async def record_routed_turn(phone_number: str, message: str, agent: str, reply: str):
+    # Into the user's transcript too, so the agents know about it next turn
+    messages = turn_messages(phone_number, message, agent, reply)
+    try:
+        await agents.aget()
+        await conversations.run(
+            phone_number, lambda conversation: asyncio.to_thread(record_turn, conversation, messages)
+        )
+    except Exception:
+        logger.exception("Could not record the routed turn of %s", phone_number)
+
+async def process_message(phone_number: str, message: str, received_at: float = None):
+    try:
+        request_log.info("Processing message from %s", phone_number)
+
+        # Replies go to Twilio through the dispatcher (rate limited, from its
+        # threads); the stream may already send one while the agents work
+        loop = asyncio.get_running_loop()
+        stream = TurnStream(
+            lambda text: loop.call_soon_threadsafe(outbound.submit, phone_number, text),
+            received_at or time.monotonic(),
+            reply_metrics,
         )
 
-        return Response(content="", media_type="text/xml")
+        # One span per turn; LLM and tool calls made for it are counted on it
+        with telemetry.span("turn", user=phone_number) as turn:
+            # The queue hands us one message per user at a time, so routing
+            # here keeps the user's messages in order
+            routed = await asyncio.to_thread(router.route, phone_number, message)
+            turn.attributes["path"] = "router" if routed is not None else "agents"
+            if routed is not None:
+                agent, last_response = routed
+                stream.finish([last_response])
+                await record_routed_turn(phone_number, message, agent, last_response)
+                return
+            try:
+                last_response = await run_agents(phone_number, message, stream)
+            except TurnTimeout:
+                turn.attributes["timeout"] = True
+                last_response = "Sorry, that is taking too long. Please try again."
+
+            stream.finish([last_response])
+
+    except Exception:
+        logger.exception("Error processing message")
+
+def send_whatsapp(phone_number: str, body: str):
+    twilio_client().messages.create(
+        from_=f"whatsapp:{config.TWILIO_PHONE_NUMBER}",
+        body=body,
+        to=f"whatsapp:{phone_number}"
+    )
+
+outbound = create_dispatcher(send_whatsapp)
+
+async def handle_inbound(message: InboundMessage):
+    await process_message(message.user_id, message.body, message.received_at)
 
-    except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
-        logger.error(traceback.format_exc())
-        return Response(content="", media_type="text/xml")
+# In-process, or per-user mailboxes in Redis shared by all workers (state.py)
+inbound_queue = create_inbound_queue(handle_inbound)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(conversations.sweep())
+    preload = asyncio.create_task(agents.preload()) if config.AGENTS_PRELOAD else None
+    outbound.start()
+    inbound_queue.start()
+    yield
+    await inbound_queue.stop()
+    engine.shutdown()
+    await outbound.stop()
+    await transport.aclose()
+    transport.close()
+    sweeper.cancel()
+    if preload:
+        preload.cancel()
+
+app = FastAPI(lifespan=lifespan)
+telemetry.instrument(app)
 
 @app.post("/whatsapp/webhook")
 async def whatsapp_webhook(request: Request):
     try:
-        logger.info("WhatsApp webhook triggered!")
         form_data = await request.form()
-        logger.info(f"Received form data: {form_data}")
-        
         incoming_msg = form_data.get('Body', '').strip()
         phone_number = form_data.get('From', '').replace('whatsapp:', '')
+        message_sid = form_data.get('MessageSid', '')
         
-        logger.info(f"Message from {phone_number}: {incoming_msg}")
+        request_log.info("Message %s from %s", message_sid, phone_number)
         
-        # Process the message
-        await process_message(phone_number, incoming_msg)
+        # Queue the message and acknowledge right away; workers reply via Twilio
+        status = await inbound_queue.asubmit(message_sid, phone_number, incoming_msg)
+        if status == "rejected":
+            logger.warning("Inbound queue full, asking Twilio to retry %s", message_sid)
+            return Response(status_code=503, headers={"Retry-After": "5"})
         
-        # Return empty 200 OK response
+        # Return empty 200 OK response (also for duplicates, so Twilio stops retrying)
         return Response(status_code=200)
-    except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}")
-        logger.error(traceback.format_exc())
-        return Response(status_code=500) 
\ No newline at end of file
+    except Exception:
+        logger.exception("Error processing webhook")
+        return Response(status_code=500)
+
+@app.get("/queue/stats")
+async def queue_stats():
+    return {
+        "queue": await inbound_queue.astats(),
+        "agents": agents.stats(),
+        "engine": engine.stats(),
+        "outbound": outbound.stats(),
+        "replies": reply_metrics.stats(),
+        "conversations": conversations.stats(),
+        "router": router.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "prompt_budget": prompt_budget.stats(),
+        "tool_cache": catalog_memo.stats(),
+    }
@@ -0,0 +1,133 @@
+"""Agent-turn throughput vs. concurrent users, with a mocked LLM.
+
+Builds the whatsapp_handler group chat (shared specialists, per-user
+conversations, round robin) with every LLM call replaced by a scripted reply
+after ``--llm-ms`` of blocking "network" time. ItemAgent makes a real
+search_items tool call through the in-process backend (fakeredis).
+
+Each simulated user sends ``--messages`` messages one after another; users
+run concurrently. ``inline`` runs turns on the event loop (the old path),
+``engine`` runs them through ExecutionEngine's bounded pool.
+
+    python benchmarks/bench_agents.py --users 1 5 10 25 50 --llm-ms 50 --inline
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+from common import AUTOGEN_DIR, ROOT, add_paths, percentile
+
+
+def scripted_llm(agent, llm_seconds):
+    """Replace ``agent``'s LLM call with a fixed script."""
+
+    def generate(llm_client, messages, cache):
+        time.sleep(llm_seconds)
+        last = messages[-1]
+        if agent.name == "ItemAgent":
+            if last.get("role") == "function":
+                return f"Found it: {last['content'][:80]}"
+            return {"role": "assistant", "content": None,
+                    "function_call": {"name": "search_items", "arguments": '{"query": "apple"}'}}
+        if agent.name == "Orchestrator":
+            return "Let me ask the ItemAgent."
+        return "Anything else I can help with?"
+
+    agent._generate_oai_reply_from_client = generate
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--messages", type=int, default=3)
+    parser.add_argument("--llm-ms", type=float, default=50)
+    parser.add_argument("--max-round", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--inline", action="store_true", help="also run turns on the event loop")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    os.environ["BACKEND_MODE"] = "inprocess"
+    os.environ["LLM_CACHE"] = "off"
+    add_paths(AUTOGEN_DIR)
+    add_paths(ROOT)
+    import fakeredis
+    import redis_connection
+
+    redis_connection.ar = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    from autogen import GroupChat, GroupChatManager, UserProxyAgent
+    from agents.cart_agent import create_cart_agent
+    from agents.item_agent import create_item_agent
+    from agents.order_agent import create_order_agent
+    from agents.orchestrator import create_orchestrator_agent
+    from engine import ExecutionEngine
+    from session.conversations import Conversation, ConversationManager
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        specialists = [create_orchestrator_agent(), create_item_agent(), create_cart_agent(), create_order_agent()]
+    for agent in specialists:
+        scripted_llm(agent, args.llm_ms / 1000)
+
+    def create_conversation(user_id):
+        user_proxy = UserProxyAgent(name="User", human_input_mode="NEVER", code_execution_config=False)
+        group_chat = GroupChat(agents=[user_proxy, *specialists], messages=[], max_round=args.max_round,
+                               speaker_selection_method="round_robin")
+        return Conversation(user_id, user_proxy, GroupChatManager(groupchat=group_chat, llm_config=False))
+
+    def run_turn(conversation, message):
+        conversation.user_proxy.initiate_chat(conversation.manager, message=message,
+                                              clear_history=False, silent=True)
+
+    engine = ExecutionEngine(max_workers=args.workers, turn_timeout=120)
+    engine.install(*specialists)
+
+    async def run_level(mode, users):
+        conversations = ConversationManager(create_conversation)
+        latencies = []
+
+        async def turn(conversation, message):
+            if mode == "inline":
+                run_turn(conversation, message)
+            else:
+                await engine.run(conversation.manager, run_turn, conversation, message)
+
+        async def user(u):
+            for m in range(args.messages):
+                start = time.perf_counter()
+                await conversations.run(f"+1555{u:07d}", lambda c: turn(c, f"(user_id: +1555{u:07d}) apples? {m}"))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(user(u) for u in range(users)))
+        elapsed = time.perf_counter() - start
+        for conversation in list(conversations._sessions.values()):
+            conversation.close()
+        return {
+            "mode": mode,
+            "users": users,
+            "turns": len(latencies),
+            "turns_per_s": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+
+    rows = []
+    for users in args.users:
+        for mode in (["inline"] if args.inline else []) + ["engine"]:
+            rows.append(asyncio.run(run_level(mode, users)))
+    engine.shutdown()
+
+    cols = ["mode", "users", "turns", "turns_per_s", "p50_ms", "p95_ms", "p99_ms"]
+    print("  ".join(f"{c:>12}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{row[c]:>12.2f}" if isinstance(row[c], float) else f"{row[c]!s:>12}" for c in cols))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,75 @@
+"""Catalog load time and lookup latency at growing catalog sizes.
+
+    python benchmarks/bench_catalog.py --sizes 10000 100000 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from common import add_paths
+
+WORDS = ["apple", "banana", "carrot", "potato", "milk", "curd", "bread", "rice", "onion",
+         "tomato", "cheese", "butter", "mango", "grape", "spinach", "lentil", "yogurt", "flour"]
+CATEGORIES = ["Fruits", "Vegetables", "Dairy", "Bakery", "Grains", "Snacks", "Beverages", "Frozen"]
+
+
+def write_catalog(path, size, seed=7):
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "price", "unit", "category"])
+        for i in range(1, size + 1):
+            name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}"
+            writer.writerow([i, name, rng.randint(5, 500), "kg", rng.choice(CATEGORIES)])
+
+
+def typo(rng, word):
+    i = rng.randrange(len(word))
+    return rng.choice([word[:i] + word[i + 1:], word[:i] + word[i] + word[i:], word + "s", word[:4]])
+
+
+def per_op_us(fn, args):
+    start = time.perf_counter()
+    for a in args:
+        fn(a)
+    return (time.perf_counter() - start) / len(args) * 1e6 if args else 0.0
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    add_paths()
+    from catalog import load_catalog
+
+    rng = random.Random(1)
+    print(f"{'items':>10}  {'load_s':>8}  {'by_id_us':>9}  {'category_us':>11}  {'prefix_us':>9}  {'search_us':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"catalog_{size}.csv")
+            write_catalog(path, size)
+
+            start = time.perf_counter()
+            snapshot = load_catalog(path)
+            load_s = time.perf_counter() - start
+
+            ids = [rng.randint(1, size) for _ in range(args.lookups)]
+            cats = [rng.choice(CATEGORIES).lower() for _ in range(args.lookups)]
+            prefixes = [rng.choice(WORDS)[:3] for _ in range(args.lookups // 10)]
+            # Misspelled / partial queries exercise the typo-tolerant path
+            queries = [typo(rng, rng.choice(WORDS)) for _ in range(args.lookups // 100)]
+
+            by_id = per_op_us(snapshot.get, ids)
+            by_cat = per_op_us(snapshot.in_category, cats)
+            by_prefix = per_op_us(lambda p: snapshot.by_prefix(p, 20), prefixes)
+            search = per_op_us(lambda q: snapshot.search_index.search(q, 10), queries)
+            print(f"{size:>10}  {load_s:>8.2f}  {by_id:>9.3f}  {by_cat:>11.3f}  {by_prefix:>9.3f}  {search:>9.1f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,129 @@
+"""Outbound WhatsApp sends against the local fake Twilio server.
+
+Each simulated turn produces ``--parts`` agent messages (Orchestrator,
+ItemAgent, ...). Compared:
+
+  per_step    blocking messages.create per part, on the event loop (the old path)
+  to_thread   one thread hop per part, no coalescing or rate limiting
+  dispatcher  OutboundDispatcher: one coalesced message per turn, token buckets, retries
+
+``max_lag_ms`` is the worst event-loop stall seen by a 10 ms ticker while sending.
+With ``--provider-rate`` the fake server answers 429 above that many messages/s.
+
+    python benchmarks/bench_outbound.py --turns 200 --users 50 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from common import AUTOGEN_DIR, add_paths, free_port, serve
+
+
+async def measure(name, run, fake, turns):
+    fake.messages.clear()
+    fake.counters.update(accepted=0, throttled=0)
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            t = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - t - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0)  # let the ticker start its first sleep
+    start = time.perf_counter()
+    failed = await run()
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return {
+        "name": name,
+        "turns": turns,
+        "messages": fake.counters["accepted"],
+        "throttled": fake.counters["throttled"],
+        "failed": failed,
+        "elapsed_s": elapsed,
+        "turns_per_s": turns / elapsed,
+        "max_lag_ms": lag * 1000,
+    }
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--parts", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--provider-rate", type=float, default=0)
+    parser.add_argument("--account-rate", type=float, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ["FAKE_TWILIO_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_TWILIO_RATE"] = str(args.provider_rate)
+    add_paths(AUTOGEN_DIR)
+    import fake_twilio
+    from outbound import OutboundDispatcher
+    from twilio.rest import Client
+
+    port = free_port()
+    server = serve(fake_twilio.app, port)
+    client = Client("ACbench", "token")
+    client.api.base_url = f"http://127.0.0.1:{port}"
+
+    def send(to, body):
+        client.messages.create(from_="whatsapp:+10000000000", to=f"whatsapp:{to}", body=body)
+
+    turns = [(f"+1555{i % args.users:07d}", [f"Agent {p} says something about turn {i}" for p in range(args.parts)])
+             for i in range(args.turns)]
+
+    async def per_step():
+        failed = 0
+        for to, parts in turns:
+            for part in parts:
+                try:
+                    send(to, part)
+                except Exception:
+                    failed += 1
+        return failed
+
+    async def to_thread():
+        results = await asyncio.gather(
+            *(asyncio.to_thread(send, to, part) for to, parts in turns for part in parts),
+            return_exceptions=True,
+        )
+        return sum(isinstance(r, Exception) for r in results)
+
+    async def dispatcher():
+        outbound = OutboundDispatcher(
+            send, workers=args.workers, max_pending=args.turns * 2,
+            account_rate=args.account_rate, account_burst=args.account_rate,
+            number_rate=1, number_burst=3, backoff=0.2,
+        )
+        outbound.start()
+        for to, parts in turns:
+            outbound.submit(to, *parts)
+        await outbound.stop(drain_timeout=600)
+        return outbound.failed
+
+    async def run_all():
+        rows = []
+        for name, run in (("per_step", per_step), ("to_thread", to_thread), ("dispatcher", dispatcher)):
+            rows.append(await measure(name, run, fake_twilio, args.turns))
+        return rows
+
+    rows = asyncio.run(run_all())
+    server.should_exit = True
+
+    cols = ["name", "turns", "messages", "throttled", "failed", "elapsed_s", "turns_per_s", "max_lag_ms"]
+    print("  ".join(f"{c:>12}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{row[c]:>12.2f}" if isinstance(row[c], float) else f"{row[c]!s:>12}" for c in cols))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,66 @@
+"""Prompt tokens and turn latency without and with the prompt budget.
+
+Runs loadgen's ``webhook`` load twice against the fake LLM:
+
+  before   PROMPT_BUDGET=false, every agent on LLM_MODEL (full function
+           schemas on every call, the Orchestrator and speaker selection
+           on the big model)
+  after    the defaults: minified, intent-scoped function schemas, and the
+           Orchestrator and speaker selection on LLM_ROUTING_MODEL
+
+and reports, per run, turn latency, LLM calls and prompt tokens per message,
+then prompt tokens per call for each agent. ``--small-model-latency-ms`` is
+the fake LLM's delay for LLM_ROUTING_MODEL (the big model keeps
+``--llm-latency-ms``). Tokens are the fake LLM's estimate, 4 characters a
+token, of what it was actually sent.
+
+    python benchmarks/bench_prompt_budget.py --users 10 --messages 8
+    python benchmarks/bench_prompt_budget.py --llm-latency-ms 800 --small-model-latency-ms 250
+"""
+import argparse
+import asyncio
+
+from common import print_table
+
+import loadgen
+
+BIG_MODEL = "gpt-4-0613"
+SMALL_MODEL = "gpt-4o-mini"
+RUNS = {
+    "before": ["PROMPT_BUDGET=false", f"LLM_MODEL={BIG_MODEL}", f"LLM_ROUTING_MODEL={BIG_MODEL}"],
+    "after": ["PROMPT_BUDGET=true", f"LLM_MODEL={BIG_MODEL}", f"LLM_ROUTING_MODEL={SMALL_MODEL}"],
+}
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--small-model-latency-ms", type=float, default=100)
+    args, passthrough = parser.parse_known_args()
+
+    rows, by_agent = [], {}
+    for name, env in RUNS.items():
+        load_args = loadgen.build_parser().parse_args([
+            "webhook", "--llm-model-latency", f"{SMALL_MODEL}={args.small_model_latency_ms}",
+            *passthrough, "--env", *env,
+        ])
+        results, llm = asyncio.run(loadgen.run(load_args))
+        row = results[0]
+        row["name"] = name
+        rows.append(row)
+        for agent, stats in llm["by_agent"].items():
+            by_agent.setdefault(agent, {})[name] = stats["prompt_tokens"] / stats["calls"] if stats["calls"] else 0.0
+
+    print_table(rows, extra=["llm_calls/msg", "prompt_tok/msg", "compl_tok/msg"])
+    before, after = rows
+    if before["prompt_tok/msg"]:
+        saved = 1 - after["prompt_tok/msg"] / before["prompt_tok/msg"]
+        print(f"\nprompt tokens per message: {saved:.0%} fewer; "
+              f"p50 turn {before['p50_ms']:.0f} -> {after['p50_ms']:.0f} ms, "
+              f"p95 {before['p95_ms']:.0f} -> {after['p95_ms']:.0f} ms")
+    print("\nPrompt tokens per call, by agent:")
+    for agent, runs in sorted(by_agent.items()):
+        print(f"  {agent:>18}  before={runs.get('before', 0):<8.0f} after={runs.get('after', 0):.0f}")
+
+
+if __name__ == "__main__":
+    main_()
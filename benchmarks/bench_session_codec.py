@@ -0,0 +1,126 @@
+"""Session storage: legacy JSON blobs (cart list with names inside the
+session) against version 1 sessions (session_codec) with the cart in its
+``cart:{user_id}`` hash.
+
+Reports encode/decode time per session and the bytes stored, scaled to 1M
+sessions. Against a real Redis (``--redis-url``) it also writes
+``--sessions`` sessions of each format and reports the server's memory
+growth (INFO used_memory) per 1M sessions; the keys are deleted afterwards.
+
+    python benchmarks/bench_session_codec.py --items 0 3 10
+    python benchmarks/bench_session_codec.py --redis-url redis://localhost:6379/15 --sessions 200000
+"""
+import argparse
+import json
+import random
+import time
+
+from common import add_paths
+
+NAMES = ["Banana", "Apple", "Carrot", "Potato", "Milk", "Curd", "Bread", "Basmati Rice", "Onion", "Tomato"]
+PER_MILLION = 1_000_000
+
+
+def legacy_session(rng, items):
+    cart = [{"item_id": rng.randint(1, 5000), "name": rng.choice(NAMES), "quantity": rng.choice([0.5, 1, 2, 3])}
+            for _ in range(items)]
+    return {"cart": cart, "last_seen": "2026-10-18"} if cart else {"last_seen": "2026-10-18"}
+
+
+def per_op_us(fn, args):
+    start = time.perf_counter()
+    for a in args:
+        fn(a)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def codec_row(session_codec, sessions, items):
+    def v1_encode(s):
+        return session_codec.encode({"last_seen": s["last_seen"]}), {
+            str(i["item_id"]): str(float(i["quantity"])) for i in s.get("cart", [])
+        }
+
+    def v1_decode(pair):
+        blob, cart = pair
+        return session_codec.decode(blob), {int(k): float(v) for k, v in cart.items()}
+
+    json_blobs = [json.dumps(s).encode() for s in sessions]
+    v1 = [v1_encode(s) for s in sessions]
+
+    # Bytes the values take (hash fields and values for the v1 cart)
+    json_bytes = sum(map(len, json_blobs)) / len(sessions)
+    v1_bytes = sum(len(b) + sum(len(k) + len(v) for k, v in c.items()) for b, c in v1) / len(sessions)
+    return {
+        "items": items,
+        "json_enc_us": per_op_us(lambda s: json.dumps(s).encode(), sessions),
+        "json_dec_us": per_op_us(json.loads, json_blobs),
+        "v1_enc_us": per_op_us(v1_encode, sessions),
+        "v1_dec_us": per_op_us(v1_decode, v1),
+        "json_MB_1M": json_bytes * PER_MILLION / 2 ** 20,
+        "v1_MB_1M": v1_bytes * PER_MILLION / 2 ** 20,
+    }, json_blobs, v1
+
+
+def used_memory(client):
+    return client.info("memory")["used_memory"]
+
+
+def redis_mb_per_million(client, write, count, batch=1000):
+    before = used_memory(client)
+    for start in range(0, count, batch):
+        pipe = client.pipeline(transaction=False)
+        for i in range(start, min(start + batch, count)):
+            write(pipe, i)
+        pipe.execute()
+    grown = used_memory(client) - before
+    for prefix in ("bench:session:*", "bench:cart:*"):
+        keys = list(client.scan_iter(match=prefix, count=batch))
+        for start in range(0, len(keys), batch):
+            client.delete(*keys[start:start + batch])
+    return grown / count * PER_MILLION / 2 ** 20
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[0, 3, 10], help="cart items per session")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--redis-url", help="also measure Redis memory on this server (keys are bench:*)")
+    parser.add_argument("--sessions", type=int, default=100_000, help="sessions written per format with --redis-url")
+    args = parser.parse_args()
+
+    add_paths()
+    import session_codec
+
+    client = None
+    if args.redis_url:
+        import redis
+
+        client = redis.Redis.from_url(args.redis_url)
+
+    rng = random.Random(3)
+    cols = ["items", "json_enc_us", "json_dec_us", "v1_enc_us", "v1_dec_us", "json_MB_1M", "v1_MB_1M"]
+    if client:
+        cols += ["json_redis_MB_1M", "v1_redis_MB_1M"]
+    print("  ".join(f"{c:>16}" for c in cols))
+    for items in args.items:
+        sessions = [legacy_session(rng, items) for _ in range(args.samples)]
+        row, json_blobs, v1 = codec_row(session_codec, sessions, items)
+        if client:
+            n = len(sessions)
+
+            def write_json(pipe, i):
+                pipe.set(f"bench:session:{i}", json_blobs[i % n])
+
+            def write_v1(pipe, i):
+                blob, cart = v1[i % n]
+                pipe.set(f"bench:session:{i}", blob)
+                if cart:
+                    pipe.hset(f"bench:cart:{i}", mapping=cart)
+
+            row["json_redis_MB_1M"] = redis_mb_per_million(client, write_json, args.sessions)
+            row["v1_redis_MB_1M"] = redis_mb_per_million(client, write_v1, args.sessions)
+        print("  ".join(f"{row[c]:>16.2f}" if isinstance(row[c], float) else f"{row[c]:>16}" for c in cols))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,118 @@
+"""Cart update load test: legacy sync endpoints (threadpool + blocking Redis
+client) against the async endpoints in main.py (pooled asyncio client), then
+``GET /cart`` reads with the near cache off and on.
+
+    python benchmarks/bench_sessions.py                      # fakeredis
+    python benchmarks/bench_sessions.py --redis-url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import os
+from datetime import date
+
+from common import add_paths, print_table, run_load
+
+
+def build_legacy_app(main, redis_connection):
+    from fastapi import FastAPI, HTTPException
+
+    app = FastAPI()
+
+    # Same shape as the original handler: blocking client on a threadpool worker
+    @app.post("/cart/add")
+    def add_to_cart(cart_item: main.CartItem):
+        session = redis_connection.get_session(cart_item.user_id)
+        cart = session.get("cart", [])
+        for item in cart:
+            if item["item_id"] == cart_item.item_id:
+                item["quantity"] += cart_item.quantity
+                break
+        else:
+            item = main.catalog.snapshot.get(cart_item.item_id)
+            if not item:
+                raise HTTPException(status_code=404, detail="Item not found")
+            cart.append({"item_id": item.id, "name": item.name, "quantity": cart_item.quantity})
+        session["cart"] = cart
+        session["last_seen"] = date.today().isoformat()
+        redis_connection.save_session(cart_item.user_id, session)
+        return {"cart": cart}
+
+    return app
+
+
+async def bench(app, name, args):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def call(i):
+            payload = {"user_id": f"u{i % args.users}", "item_id": 1 + i % 6, "quantity": 1}
+            resp = await client.post("/cart/add", json=payload)
+            resp.raise_for_status()
+
+        return await run_load(name, call, args.requests, args.concurrency)
+
+
+async def bench_reads(app, near_cache, name, args):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def call(i):
+            resp = await client.get("/cart", params={"user_id": f"u{i % args.users}"})
+            resp.raise_for_status()
+
+        before = near_cache.stats()
+        row = await run_load(name, call, args.requests, args.concurrency)
+        after = near_cache.stats()
+        hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+        row["hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+        return row
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url", help="benchmark against a real Redis instead of fakeredis")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    add_paths()
+    import redis_connection
+    import main
+
+    if not args.redis_url:
+        import fakeredis
+
+        server = fakeredis.FakeServer()
+        redis_connection.r = fakeredis.FakeRedis(server=server, decode_responses=True)
+        # One connection per in-flight request, plus the near cache's subscription
+        redis_connection.ar = fakeredis.FakeAsyncRedis(server=server, decode_responses=True,
+                                                       max_connections=args.concurrency + 1)
+        # A private server: fine to switch keyspace notifications on
+        redis_connection.near_cache.configure_server = True
+
+    async def run():
+        rows = [
+            await bench(build_legacy_app(main, redis_connection), "sync", args),
+            await bench(main.app, "async", args),
+            await bench_reads(main.app, redis_connection.near_cache, "get_cart", args),
+        ]
+        watcher = asyncio.create_task(redis_connection.watch_near_cache())
+        while not redis_connection.near_cache.live:
+            if watcher.done():
+                raise SystemExit("Near cache disabled: enable keyspace notifications (see README)")
+            await asyncio.sleep(0.01)
+        rows.append(await bench_reads(main.app, redis_connection.near_cache, "get_cart_near", args))
+        watcher.cancel()
+        await redis_connection.close()
+        return rows
+
+    print_table(asyncio.run(run()), extra=["hit_rate"])
+
+
+if __name__ == "__main__":
+    main_()
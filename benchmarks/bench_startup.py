@@ -0,0 +1,100 @@
+"""Cold start of the WhatsApp apps: import time, time until the server
+answers, and time until the first message that needs the agents is answered.
+
+Each run is a fresh process pointed at a local backend (fakeredis), fake_llm
+and fake_twilio, as in loadgen.py. Compared with the agents built in the
+background at startup (``AGENTS_PRELOAD=true``) and on the first message.
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import AUTOGEN_DIR, free_port
+from loadgen import Stack, spawn, wait_ready
+
+MESSAGE = "do you have apples?"  # not a router command, so the agents answer
+
+
+def import_seconds(app, env):
+    code = f"import time; t = time.perf_counter(); import {app}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=AUTOGEN_DIR, env={**os.environ, **env},
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+async def cold_start(client, stack, app, env, number):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = spawn(f"{app}:app", AUTOGEN_DIR, port, env, stack.workdir.name, stack.args.verbose)
+    try:
+        await wait_ready(client, f"{url}/queue/stats", process)
+        ready = time.perf_counter() - start
+        to = f"whatsapp:{number}"
+        before = (await client.get(f"{stack.twilio}/messages/wait", params={"to": to, "timeout": 0})).json()["count"]
+        await client.post(f"{url}/whatsapp/webhook", data={"From": to, "Body": MESSAGE, "MessageSid": f"SM{number}"})
+        await client.get(f"{stack.twilio}/messages/wait", params={"to": to, "after": before, "timeout": 120},
+                         timeout=125)
+        return ready, time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", nargs="+", default=["whatsapp_handler", "main"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stack_args = argparse.Namespace(
+        backend_url=None, llm_url=None, twilio_url=None, app_url=None, redis_url=None, app=None,
+        llm_latency_ms=args.llm_latency_ms, twilio_latency_ms=0, llm_cache="off", env=[], verbose=args.verbose,
+    )
+    import httpx
+
+    async def run_all():
+        stack = Stack(stack_args)
+        rows = []
+        async with httpx.AsyncClient(timeout=30) as client:
+            try:
+                await stack.start(client, webhook=True, with_app=False)
+                runs = 0
+                for app in args.apps:
+                    for preload in ("true", "false"):
+                        env = {**stack.app_env(), "AGENTS_PRELOAD": preload}
+                        imports, ready, first = [], [], []
+                        for _ in range(args.runs):
+                            runs += 1
+                            imports.append(import_seconds(app, env))
+                            r, f = await cold_start(client, stack, app, env, f"+1555{runs:07d}")
+                            ready.append(r)
+                            first.append(f)
+                        rows.append({
+                            "app": app,
+                            "preload": preload,
+                            "import_ms": statistics.median(imports) * 1000,
+                            "ready_ms": statistics.median(ready) * 1000,
+                            "first_reply_ms": statistics.median(first) * 1000,
+                        })
+            finally:
+                stack.stop()
+        return rows
+
+    rows = asyncio.run(run_all())
+    cols = ["app", "preload", "import_ms", "ready_ms", "first_reply_ms"]
+    print("  ".join(f"{c:>16}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{row[c]:>16.1f}" if isinstance(row[c], float) else f"{row[c]!s:>16}" for c in cols))
+
+
+if __name__ == "__main__":
+    main_()
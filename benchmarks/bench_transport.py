@@ -0,0 +1,91 @@
+"""Tool-call latency against a live backend: a fresh connection per call
+(the old ``requests.get`` tools) vs. the pooled keep-alive transport vs. the
+in-process backend adapter (no HTTP at all).
+
+Starts main.py under uvicorn on a local port (fakeredis unless --redis-url).
+
+    python benchmarks/bench_transport.py --calls 2000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+from common import AUTOGEN_DIR, add_paths, free_port, print_table, run_load, serve, summarize
+
+
+def start_backend(port, redis_url=None):
+    import redis_connection
+    import main
+
+    if not redis_url:
+        import fakeredis
+
+        server = fakeredis.FakeServer()
+        redis_connection.ar = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    return serve(main.app, port)
+
+
+def timed(name, fn, calls):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(calls):
+        t = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t)
+    return summarize(name, latencies, time.perf_counter() - start)
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    port = free_port()
+    os.environ["BACKEND_URL"] = f"http://127.0.0.1:{port}"
+    add_paths()
+    server = start_backend(port, args.redis_url)
+    add_paths(AUTOGEN_DIR)  # after importing the backend: both trees have a main.py
+
+    import requests
+    import backend
+    import transport
+    from agents import item_agent
+
+    url = f"http://127.0.0.1:{port}"
+    rows = []
+    with contextlib.redirect_stdout(io.StringIO()):  # tools print debug lines
+        rows.append(timed("requests", lambda i: requests.get(f"{url}/getItemInfo/{1 + i % 6}").json(), args.calls))
+        rows.append(timed("pooled", lambda i: transport.get(f"/getItemInfo/{1 + i % 6}").json(), args.calls))
+        rows.append(timed("tool_pooled", lambda i: item_agent.get_item_info(1 + i % 6), args.calls))
+
+        async def concurrent():
+            async def call(i):
+                (await transport.aget(f"/getItemInfo/{1 + i % 6}")).raise_for_status()
+            row = await run_load(f"async_x{args.concurrency}", call, args.calls, args.concurrency)
+            await transport.aclose()
+            return row
+
+        rows.append(asyncio.run(concurrent()))
+
+        backend.set_backend(backend.InProcessBackend())
+        rows.append(timed("tool_inprocess", lambda i: item_agent.get_item_info(1 + i % 6), args.calls))
+        if not args.redis_url:
+            # A real pool can't be shared between the server's loop and the adapter's
+            rows.append(timed("cart_inprocess", lambda i: backend.get_backend().view_cart(f"u{i % 50}"), args.calls))
+        backend.set_backend(backend.HttpBackend())
+        rows.append(timed("cart_pooled", lambda i: backend.get_backend().view_cart(f"u{i % 50}"), args.calls))
+    transport.close()
+    server.should_exit = True
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main_()
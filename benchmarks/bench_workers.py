@@ -0,0 +1,112 @@
+"""Throughput of the backend API and the webhook app with 1..N worker processes.
+
+For each worker count, starts the backend and the app through serve.py
+(loadgen.py ``--workers``) on one shared Redis, runs loadgen's ``rest`` and
+``webhook`` loads, and reports req/s and the speedup over the first count.
+Redis is flushed between runs.
+
+Without ``--redis-url`` the shared Redis is fakeredis's TCP server in its own
+process: it is single-threaded Python, far slower than Redis, and becomes the
+ceiling well before the workers do. Scaling is also bounded by the cores on
+the machine (printed first) and by the single-process fake LLM and Twilio.
+
+    python benchmarks/bench_workers.py --workers 1 2 4
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --redis-url redis://localhost:6379/15 --users 200
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from common import free_port, print_table
+
+import loadgen
+
+
+def serve_fake_redis(port: int):
+    from fakeredis import TcpFakeServer
+    from redis.exceptions import ResponseError
+
+    server = TcpFakeServer(("127.0.0.1", port))
+
+    class Handler(server.RequestHandlerClass):
+        # fakeredis drops the connection after any error reply (NOSCRIPT,
+        # BUSYGROUP, ...); a real server keeps it open, and redis-py expects that
+        def setup(self):
+            super().setup()
+            read = self.current_client.read_response
+
+            def read_response(*args, **kwargs):
+                try:
+                    return read(*args, **kwargs)
+                except ResponseError as e:
+                    return e
+
+            self.current_client.read_response = read_response
+
+    server.RequestHandlerClass = Handler
+    server.serve_forever()
+
+
+def start_fake_redis():
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--fake-redis-port", str(port)])
+    import redis
+
+    client = redis.Redis(port=port)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            client.ping()
+            break
+        except redis.ConnectionError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError("fakeredis server did not start")
+            time.sleep(0.1)
+    return process, f"redis://127.0.0.1:{port}/0"
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--mode", choices=["rest", "webhook", "all"], default="all")
+    parser.add_argument("--redis-url", help="shared Redis (flushed between runs); default: fakeredis over TCP")
+    parser.add_argument("--fake-redis-port", type=int, help=argparse.SUPPRESS)
+    args, passthrough = parser.parse_known_args()
+    if args.fake_redis_port:
+        serve_fake_redis(args.fake_redis_port)
+        return
+
+    import redis
+
+    print(f"CPUs: {os.cpu_count()}")
+    fake = None
+    redis_url = args.redis_url
+    if not redis_url:
+        fake, redis_url = start_fake_redis()
+    try:
+        rows, base = [], {}
+        for workers in args.workers:
+            redis.Redis.from_url(redis_url).flushdb()
+            load_args = loadgen.build_parser().parse_args(
+                [args.mode, "--workers", str(workers), "--redis-url", redis_url, *passthrough]
+            )
+            results, _ = asyncio.run(loadgen.run(load_args))
+            for row in results:
+                row["workers"] = workers
+                base.setdefault(row["name"], row["req_per_s"])
+                row["speedup"] = row["req_per_s"] / base[row["name"]] if base[row["name"]] else 0.0
+                row["name"] = f"{row['name']}x{workers}"
+                rows.append(row)
+        print_table(rows, extra=["workers", "speedup"])
+    finally:
+        if fake:
+            fake.terminate()
+            fake.wait()
+
+
+if __name__ == "__main__":
+    main_()
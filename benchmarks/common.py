@@ -0,0 +1,86 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOGEN_DIR = os.path.join(ROOT, "autogen_mcp")
+
+
+def add_paths(*paths):
+    for path in paths or (ROOT,):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(app, port):
+    """Run an ASGI app under uvicorn in a daemon thread; returns the server (set should_exit to stop)."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def summarize(name, latencies, elapsed, errors=0):
+    n = len(latencies)
+    return {
+        "name": name,
+        "requests": n,
+        "errors": errors,
+        "req_per_s": n / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def print_table(rows, extra=()):
+    cols = ["name", "requests", "errors", "req_per_s", "p50_ms", "p95_ms", "p99_ms", *extra]
+    print("  ".join(f"{c:>12}" for c in cols))
+    for row in rows:
+        cells = []
+        for c in cols:
+            v = row.get(c, "")
+            cells.append(f"{v:>12.2f}" if isinstance(v, float) else f"{v!s:>12}")
+        print("  ".join(cells))
+
+
+async def run_load(name, call, total, concurrency):
+    """Run ``call(i)`` ``total`` times with at most ``concurrency`` in flight."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, latencies, time.perf_counter() - start, errors)
@@ -0,0 +1,345 @@
+"""End-to-end load test of the WhatsApp webhook and the backend REST API,
+without OpenAI or Twilio.
+
+Unless URLs for them are given, starts each piece as its own process:
+
+  backend   main.py (fakeredis unless --redis-url)
+  llm       autogen_mcp/fake_llm.py, scripted OpenAI-compatible completions
+  twilio    autogen_mcp/fake_twilio.py
+  app       the webhook app, autogen_mcp/whatsapp_handler.py or --app main
+
+``webhook``: each of ``--users`` simulated users sends ``--messages`` messages
+from a fixed mix (router-friendly commands and free-form questions), waiting
+for the first WhatsApp reply before the next one. Latency is webhook POST to
+first reply at fake Twilio; throughput counts answered messages until the
+last reply went out. LLM calls and tokens per message come from fake_llm.
+
+``rest``: ``--requests`` calls to the backend API (categories, listings,
+search, item info, cart add/view) with ``--concurrency`` in flight.
+
+``--workers N`` starts the backend and the app through serve.py with N
+worker processes each; they share the Redis at ``--redis-url`` (the app
+with STATE_BACKEND=redis). See bench_workers.py for a 1..N comparison.
+
+    python benchmarks/loadgen.py webhook --users 20 --messages 5
+    python benchmarks/loadgen.py webhook --app main --llm-latency-ms 500
+    python benchmarks/loadgen.py rest --requests 5000 --concurrency 50
+    python benchmarks/loadgen.py all --workers 4 --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from common import AUTOGEN_DIR, ROOT, add_paths, free_port, percentile, print_table, run_load, summarize
+
+SERVE = os.path.join(ROOT, "serve.py")
+SERVE_APPS = {"whatsapp_handler": "whatsapp", "main": "whatsapp-main"}
+
+MESSAGES = [
+    "do you have apples?",
+    "add 2 kg apples",
+    "show my cart",
+    "what categories do you have?",
+    "how much is the milk?",
+    "I'd like to buy some bread",
+    "remove apples",
+    "I want to checkout",
+]
+
+
+def spawn(app, app_dir, port, env, cwd=None, verbose=False):
+    out = None if verbose else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", app_dir, "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env}, cwd=cwd, stdout=out, stderr=out,
+    )
+
+
+async def wait_ready(client, url, process=None, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode} (rerun with --verbose)")
+        try:
+            await client.get(url)
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start")
+
+
+class Stack:
+    """The services under test, started locally unless their URL was given."""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        # Fresh working directory, so AutoGen's on-disk LLM cache starts empty
+        self.workdir = tempfile.TemporaryDirectory()
+        self.backend = args.backend_url
+        self.llm = args.llm_url
+        self.twilio = args.twilio_url
+        self.app = args.app_url
+
+    def _start(self, app, app_dir, env):
+        port = free_port()
+        self.processes.append(spawn(app, app_dir, port, env, self.workdir.name, self.args.verbose))
+        return f"http://127.0.0.1:{port}"
+
+    async def start(self, client, webhook, with_app=True):
+        args = self.args
+        if not self.backend:
+            port = free_port()
+            if args.workers > 1:
+                command = [sys.executable, SERVE, "backend", "--workers", str(args.workers),
+                           "--port", str(port), "--log-level", "warning"]
+            else:
+                command = [sys.executable, os.path.abspath(__file__), "backend", "--port", str(port)]
+                if args.redis_url:
+                    command += ["--redis-url", args.redis_url]
+            out = None if args.verbose else subprocess.DEVNULL
+            # Orders go to a throwaway database, not the repo's data/orders.db
+            env = {"ORDER_DB_PATH": os.path.join(self.workdir.name, "orders.db"), **os.environ}
+            if args.redis_url:
+                env["REDIS_URL"] = args.redis_url
+            self.processes.append(subprocess.Popen(command, stdout=out, stderr=out, env=env))
+            self.backend = f"http://127.0.0.1:{port}"
+        await wait_ready(client, f"{self.backend}/catalog/version", self.processes[-1] if self.processes else None)
+        if not webhook:
+            return
+        if not self.llm:
+            self.llm = self._start("fake_llm:app", AUTOGEN_DIR, {
+                "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+                "FAKE_LLM_MODEL_LATENCY_MS": args.llm_model_latency,
+            })
+        if not self.twilio:
+            self.twilio = self._start("fake_twilio:app", AUTOGEN_DIR, {
+                "FAKE_TWILIO_LATENCY_MS": str(args.twilio_latency_ms),
+            })
+        await wait_ready(client, f"{self.llm}/stats")
+        await wait_ready(client, f"{self.twilio}/messages")
+        if not self.app and with_app and args.workers > 1:
+            port = free_port()
+            out = None if args.verbose else subprocess.DEVNULL
+            self.processes.append(subprocess.Popen(
+                [sys.executable, SERVE, SERVE_APPS[args.app], "--workers", str(args.workers),
+                 "--port", str(port), "--log-level", "warning"],
+                env={**os.environ, **self.app_env()}, cwd=self.workdir.name, stdout=out, stderr=out,
+            ))
+            self.app = f"http://127.0.0.1:{port}"
+            await wait_ready(client, f"{self.app}/queue/stats", self.processes[-1])
+        elif not self.app and with_app:
+            self.app = self._start(f"{args.app}:app", AUTOGEN_DIR, self.app_env())
+            await wait_ready(client, f"{self.app}/queue/stats", self.processes[-1])
+
+    def app_env(self) -> dict:
+        """Settings that point a webhook app at the fakes and the backend."""
+        return {
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_BASE_URL": f"{self.llm}/v1",
+            "TWILIO_ACCOUNT_SID": "ACfake",
+            "TWILIO_AUTH_TOKEN": "fake",
+            "TWILIO_PHONE_NUMBER": "+10000000000",
+            "TWILIO_API_URL": self.twilio,
+            "BACKEND_URL": self.backend,
+            "LLM_CACHE": self.args.llm_cache,
+            **({"STATE_BACKEND": "redis", "STATE_REDIS_URL": self.args.redis_url} if self.args.workers > 1 else {}),
+            **dict(pair.split("=", 1) for pair in self.args.env),
+        }
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.workdir.cleanup()
+
+
+async def drain(client, stack, timeout):
+    """Wait for the app to go idle; returns the wall time of the last reply sent."""
+    deadline = time.monotonic() + timeout
+    last_count = -1
+    while time.monotonic() < deadline:
+        stats = (await client.get(f"{stack.app}/queue/stats")).json()
+        sent = (await client.get(f"{stack.twilio}/messages", params={"limit": 1})).json()
+        idle = stats["queue"]["depth"] == 0 and stats["queue"]["in_flight"] == 0 and stats["outbound"]["depth"] == 0
+        if idle and sent["accepted"] == last_count:
+            return sent["messages"][-1]["ts"] if sent["messages"] else time.time()
+        last_count = sent["accepted"]
+        await asyncio.sleep(0.5)
+    return time.time()
+
+
+async def webhook_load(client, stack, args):
+    await client.delete(f"{stack.llm}/stats")
+    await client.delete(f"{stack.twilio}/messages")
+    latencies, acks = [], []
+    errors = 0
+    run = uuid.uuid4().hex[:6]
+
+    async def user(u):
+        nonlocal errors
+        number = f"+1555{u:07d}"
+        received = 0
+        for m in range(args.messages):
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{stack.app}/whatsapp/webhook", data={
+                    "From": f"whatsapp:{number}",
+                    "Body": MESSAGES[(u + m) % len(MESSAGES)],
+                    "MessageSid": f"SM{run}{u:05d}{m:05d}",
+                })
+                acks.append(time.perf_counter() - start)
+                response.raise_for_status()
+                count = (await client.get(f"{stack.twilio}/messages/wait", params={
+                    "to": f"whatsapp:{number}", "after": received, "timeout": args.reply_timeout,
+                }, timeout=args.reply_timeout + 5)).json()["count"]
+            except Exception:
+                errors += 1
+                continue
+            if count <= received:
+                errors += 1
+                continue
+            received = count
+            latencies.append(time.perf_counter() - start)
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000)
+
+    wall_start = time.time()
+    await asyncio.gather(*(user(u) for u in range(args.users)))
+    elapsed = await drain(client, stack, args.reply_timeout) - wall_start
+
+    llm = (await client.get(f"{stack.llm}/stats")).json()
+    sent = (await client.get(f"{stack.twilio}/messages", params={"limit": 0})).json()
+    sent_messages = args.users * args.messages
+    row = summarize("webhook", latencies, elapsed, errors)
+    row.update({
+        "ack_p95_ms": percentile(acks, 95) * 1000,
+        "replies/msg": sent["accepted"] / sent_messages,
+        "llm_calls/msg": llm["calls"] / sent_messages,
+        "prompt_tok/msg": llm["prompt_tokens"] / sent_messages,
+        "compl_tok/msg": llm["completion_tokens"] / sent_messages,
+    })
+    return row, llm
+
+
+async def rest_load(client, stack, args):
+    categories = (await client.get(f"{stack.backend}/getAllCategories")).json()["categories"]
+    queries = ["apple", "milk", "bread", "rice", "cheese", "banana"]
+
+    async def call(i):
+        kind = i % 6
+        if kind == 0:
+            response = await client.get(f"{stack.backend}/getAllCategories")
+        elif kind == 1:
+            response = await client.get(f"{stack.backend}/getAllItems/{categories[i % len(categories)]}",
+                                        params={"limit": 10})
+        elif kind == 2:
+            response = await client.get(f"{stack.backend}/search", params={"q": queries[i % len(queries)]})
+        elif kind == 3:
+            response = await client.get(f"{stack.backend}/getItemInfo/{1 + i % 6}")
+        elif kind == 4:
+            response = await client.post(f"{stack.backend}/cart/add", json={
+                "user_id": f"load{i % 500}", "item_id": 1 + i % 6, "quantity": 1,
+            })
+        else:
+            response = await client.get(f"{stack.backend}/cart", params={"user_id": f"load{i % 500}"})
+        response.raise_for_status()
+
+    return await run_load("rest", call, args.requests, args.concurrency)
+
+
+def serve_backend(args):
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    add_paths(ROOT)
+    import uvicorn
+    import redis_connection
+    import main
+
+    if not args.redis_url:
+        import fakeredis
+        import metrics
+
+        # Keep Redis round trips timed on /metrics
+        fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+        redis_connection.ar = metrics.InstrumentedRedis(connection_pool=fake.connection_pool)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["webhook", "rest", "all", "backend"], nargs="?", default="all")
+    parser.add_argument("--app", choices=["whatsapp_handler", "main"], default="whatsapp_handler")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--think-ms", type=float, default=0)
+    parser.add_argument("--reply-timeout", type=float, default=120)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-model-latency", default="", help="per-model LLM latency, e.g. gpt-4o-mini=100")
+    parser.add_argument("--twilio-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-cache", default="off", help="LLM_CACHE for the app")
+    parser.add_argument("--env", nargs="*", default=[], help="extra KEY=VALUE settings for the app")
+    parser.add_argument("--redis-url")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for backend and app (serve.py)")
+    parser.add_argument("--port", type=int, help="backend mode: port to serve on")
+    parser.add_argument("--backend-url")
+    parser.add_argument("--llm-url")
+    parser.add_argument("--twilio-url")
+    parser.add_argument("--app-url")
+    parser.add_argument("--verbose", action="store_true", help="show the services' output")
+    return parser
+
+
+async def run(args):
+    """Start the stack, run the selected loads and stop it; returns ``(rows, llm stats)``."""
+    import httpx
+
+    stack = Stack(args)
+    limits = httpx.Limits(max_connections=max(args.users, args.concurrency) * 2)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        try:
+            await stack.start(client, webhook=args.mode in ("webhook", "all"))
+            rows, llm = [], None
+            if args.mode in ("rest", "all"):
+                rows.append(await rest_load(client, stack, args))
+            if args.mode in ("webhook", "all"):
+                row, llm = await webhook_load(client, stack, args)
+                rows.append(row)
+            return rows, llm
+        finally:
+            stack.stop()
+
+
+def main_():
+    args = build_parser().parse_args()
+
+    if args.mode == "backend":
+        serve_backend(args)
+        return
+    if args.workers > 1 and not args.redis_url:
+        sys.exit("--workers > 1 needs a Redis the workers share (--redis-url)")
+
+    rows, llm = asyncio.run(run(args))
+    print_table(rows, extra=["ack_p95_ms", "replies/msg", "llm_calls/msg", "prompt_tok/msg", "compl_tok/msg"])
+    if llm:
+        print("\nLLM calls by agent:")
+        for agent, stats in sorted(llm["by_agent"].items()):
+            print(f"  {agent:>18}  calls={stats['calls']:<6} prompt_tokens={stats['prompt_tokens']:<8} "
+                  f"completion_tokens={stats['completion_tokens']}")
+        print("  by kind: " + ", ".join(f"{k}={v}" for k, v in sorted(llm["by_kind"].items())))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,218 @@
+"""Per-user cart stored as a Redis hash ``cart:{user_id}`` (item_id -> quantity).
+
+Every mutation is a single Lua script call, so it is atomic and costs one
+round trip regardless of how many other items are in the cart. Carts still
+living inside legacy ``session:{user_id}`` JSON blobs are moved into the hash
+the first time the script touches them; ``python cart_store.py migrate``
+does the same for every session up front.
+
+Cart reads go through the process's near cache (``redis_connection.near_cache``);
+every mutation drops the cached copy.
+"""
+import asyncio
+import sys
+
+import redis_connection
+import session_codec
+from redis_connection import session_key, SESSION_TTL_SECONDS
+
+
+def cart_key(user_id: str) -> str:
+    return f"cart:{user_id}"
+
+
+# KEYS[1] = cart hash, KEYS[2] = session blob. ARGV[1] = today (or ""),
+# ARGV[2] = ttl, ARGV[3] = today as a session_codec day number (or "" when
+# there is no today or it doesn't fit version 1); op-specific arguments
+# follow. touch_session() folds a legacy JSON cart into the hash and
+# refreshes last_seen, rewriting the session blob only when something
+# actually changed: version 1 sessions get their 2 day bytes replaced, plain
+# JSON sessions are converted to version 1. A today without a day number is
+# written as JSON, as session_codec.encode does.
+_PRELUDE = """
+local function day_bytes(day)
+  day = tonumber(day)
+  return string.char(math.floor(day / 256), day % 256)
+end
+local function touch_session()
+  local today, day = ARGV[1], ARGV[3]
+  local raw = redis.call('GET', KEYS[2])
+  if not raw then
+    if day ~= '' then
+      redis.call('SETEX', KEYS[2], ARGV[2], string.char(1) .. day_bytes(day))
+    elseif today ~= '' then
+      redis.call('SETEX', KEYS[2], ARGV[2], cjson.encode({last_seen = today}))
+    end
+    return
+  end
+  if string.byte(raw, 1) == 1 then
+    if day ~= '' then
+      if string.sub(raw, 2, 3) ~= day_bytes(day) then
+        redis.call('SETRANGE', KEYS[2], 1, day_bytes(day))
+      end
+    elseif today ~= '' then
+      redis.call('SET', KEYS[2], cjson.encode({last_seen = today}), 'KEEPTTL')
+    end
+    return
+  end
+  if string.sub(raw, 1, 1) ~= '{' then return end
+  local data = cjson.decode(raw)
+  if type(data['cart']) == 'table' then
+    for _, item in ipairs(data['cart']) do
+      redis.call('HINCRBYFLOAT', KEYS[1], tostring(item['item_id']), tostring(item['quantity']))
+    end
+  end
+  local plain = true
+  for key in pairs(data) do
+    if key ~= 'cart' and key ~= 'last_seen' then plain = false end
+  end
+  if plain and day ~= '' then
+    redis.call('SET', KEYS[2], string.char(1) .. day_bytes(day), 'KEEPTTL')
+    return
+  end
+  if data['cart'] == nil and (today == '' or data['last_seen'] == today) then return end
+  data['cart'] = nil
+  if today ~= '' then data['last_seen'] = today end
+  redis.call('SET', KEYS[2], cjson.encode(data), 'KEEPTTL')
+end
+touch_session()
+"""
+
+# ARGV[4] = item_id, ARGV[5] = quantity
+_ADD = _PRELUDE + """
+redis.call('HINCRBYFLOAT', KEYS[1], ARGV[4], ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# ARGV[4] = item_id. Returns false when the item was not in the cart.
+_REMOVE = _PRELUDE + """
+if redis.call('HDEL', KEYS[1], ARGV[4]) == 0 then return false end
+return redis.call('HGETALL', KEYS[1])
+"""
+
+_READ = _PRELUDE + """
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# ARGV[4..] = (op, item_id, quantity) triples, applied in order. "set" to 0
+# and "remove" of an item that is not in the cart just leave it out.
+_BULK = _PRELUDE + """
+for i = 4, #ARGV, 3 do
+  local op, item = ARGV[i], ARGV[i + 1]
+  if op == 'add' then
+    redis.call('HINCRBYFLOAT', KEYS[1], item, ARGV[i + 2])
+  elseif op == 'set' and tonumber(ARGV[i + 2]) > 0 then
+    redis.call('HSET', KEYS[1], item, ARGV[i + 2])
+  else
+    redis.call('HDEL', KEYS[1], item)
+  end
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# Turns the cart into an order in one step (see orders.py). KEYS[3] = order
+# stream, KEYS[4] = idempotency key (optional). ARGV[4] = order JSON, ARGV[5] =
+# idempotency ttl, ARGV[6..] = the cart the order was priced from (field,
+# value, ...). Returns {status, order JSON}: 'replay' (this key already
+# ordered), 'empty', 'changed' (cart differs from the priced one) or 'ok'.
+_CHECKOUT = _PRELUDE + """
+if KEYS[4] then
+  local done = redis.call('GET', KEYS[4])
+  if done then return {'replay', done} end
+end
+local cart = redis.call('HGETALL', KEYS[1])
+if #cart == 0 then return {'empty', ''} end
+if #cart ~= #ARGV - 5 then return {'changed', ''} end
+local priced = {}
+for i = 6, #ARGV, 2 do priced[ARGV[i]] = tonumber(ARGV[i + 1]) end
+for i = 1, #cart, 2 do
+  if priced[cart[i]] ~= tonumber(cart[i + 1]) then return {'changed', ''} end
+end
+redis.call('DEL', KEYS[1])
+redis.call('XADD', KEYS[3], '*', 'order', ARGV[4])
+if KEYS[4] then redis.call('SET', KEYS[4], ARGV[4], 'EX', ARGV[5]) end
+return {'ok', ARGV[4]}
+"""
+
+_scripts = {}
+
+
+async def _run(name: str, source: str, user_id: str, today: str, *args,
+               ttl_seconds=SESSION_TTL_SECONDS, extra_keys=()):
+    client = redis_connection.ar
+    script = _scripts.get(name)
+    if script is None:
+        script = _scripts[name] = client.register_script(source)
+    keys = [cart_key(user_id), session_key(user_id)]
+    try:
+        day = session_codec.v1_day(today) if today else None
+        day = "" if day is None else day
+        return await script(keys=keys + list(extra_keys), args=[today, ttl_seconds, day, *args], client=client)
+    finally:
+        if name != "read":
+            redis_connection.near_cache.invalidate(*keys)  # read-your-writes in this process
+
+
+def _parse(flat) -> dict:
+    # HGETALL from Lua comes back as a flat [field, value, ...] list
+    return {int(flat[i]): float(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+
+async def add_item(user_id: str, item_id: int, quantity: float, today: str) -> dict:
+    return _parse(await _run("add", _ADD, user_id, today, item_id, quantity))
+
+
+async def remove_item(user_id: str, item_id: int, today: str):
+    """Returns the remaining cart, or None if the item was not in it."""
+    flat = await _run("remove", _REMOVE, user_id, today, item_id)
+    return None if flat is None else _parse(flat)
+
+
+async def apply_operations(user_id: str, operations, today: str) -> dict:
+    """Apply ``(op, item_id, quantity)`` operations in one atomic script call."""
+    args = [arg for op, item_id, quantity in operations for arg in (op, item_id, quantity or 0)]
+    return _parse(await _run("bulk", _BULK, user_id, today, *args))
+
+
+async def _read_cart(user_id: str) -> dict:
+    return _parse(await _run("read", _READ, user_id, ""))
+
+
+async def get_cart(user_id: str, fresh: bool = False) -> dict:
+    """Served from the near cache when this worker has read the cart since it
+    last changed, unless ``fresh``."""
+    if fresh:
+        return await _read_cart(user_id)
+    cart = await redis_connection.near_cache.get(cart_key(user_id), lambda: _read_cart(user_id))
+    return dict(cart)
+
+
+async def checkout(user_id: str, priced: dict, order: str, today: str, stream: str,
+                   idempotency_key: str = None, idempotency_ttl: int = 0):
+    """Empty the cart into ``stream`` as ``order`` if it still equals ``priced``.
+
+    Returns ``(status, order)``; see _CHECKOUT.
+    """
+    args = [order, idempotency_ttl]
+    for item_id, quantity in priced.items():
+        args += [item_id, repr(float(quantity))]
+    extra_keys = [stream, idempotency_key] if idempotency_key else [stream]
+    status, stored = await _run("checkout", _CHECKOUT, user_id, today, *args, extra_keys=extra_keys)
+    return status, stored
+
+
+async def migrate_all(batch_size: int = 500) -> int:
+    """Move every legacy JSON cart into its hash. Safe to run while serving."""
+    migrated = 0
+    async for key in redis_connection.ar.scan_iter(match="session:*", count=batch_size):
+        await _read_cart(key.split(":", 1)[1])
+        migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["migrate"]:
+        sys.exit("usage: python cart_store.py migrate")
+    print(f"Checked {asyncio.run(migrate_all())} sessions")
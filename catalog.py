@@ -0,0 +1,195 @@
+"""In-process product catalog.
+
+A catalog file (JSON, CSV or SQLite) is loaded into an immutable
+``CatalogSnapshot`` with prebuilt indexes. ``Catalog`` holds the current
+snapshot and swaps in a new one when the file changes; readers grab
+``catalog.snapshot`` once per request and never see a half-built index.
+"""
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from bisect import bisect_left, bisect_right
+
+from search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Item:
+    __slots__ = ("id", "name", "price", "unit", "category")
+
+    def __init__(self, id: int, name: str, price: float, unit: str, category: str):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.unit = unit
+        self.category = category
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "price": self.price, "unit": self.unit}
+
+
+class CatalogSnapshot:
+    __slots__ = ("version", "by_id", "by_category", "categories",
+                 "search_index", "_category_lower", "_names", "_name_ids")
+
+    def __init__(self, items, version: str):
+        self.version = version
+        self.by_id = {}
+        by_category = {}
+        for item in items:
+            self.by_id[item.id] = item
+            by_category.setdefault(item.category, []).append(item)
+        # Category listings sorted by id so pages can resume from the last id
+        self.by_category = {c: tuple(sorted(v, key=lambda i: i.id)) for c, v in by_category.items()}
+        self.categories = list(self.by_category)
+        self._category_lower = {c.lower(): c for c in self.categories}
+        names = sorted((item.name.lower(), item.id) for item in self.by_id.values())
+        self._names = [n for n, _ in names]
+        self._name_ids = [i for _, i in names]
+        self.search_index = SearchIndex(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def get(self, item_id: int):
+        return self.by_id.get(item_id)
+
+    def resolve_category(self, category: str):
+        """Exact match first, then case-insensitive."""
+        if category in self.by_category:
+            return category
+        return self._category_lower.get(category.lower())
+
+    def in_category(self, category: str):
+        name = self.resolve_category(category)
+        return None if name is None else self.by_category[name]
+
+    def page(self, category: str, after_id=None, limit=None):
+        """Items of an (already resolved) category with id > after_id.
+
+        Returns ``(items, next_cursor)``; next_cursor is the last id on the
+        page when more items follow, else None.
+        """
+        listing = self.by_category[category]
+        start = 0 if after_id is None else bisect_right(listing, after_id, key=lambda i: i.id)
+        end = len(listing) if limit is None else min(len(listing), start + limit)
+        next_cursor = listing[end - 1].id if end < len(listing) and end > start else None
+        return listing[start:end], next_cursor
+
+    def by_prefix(self, prefix: str, limit: int = 20) -> list:
+        prefix = prefix.lower()
+        result = []
+        i = bisect_left(self._names, prefix)
+        while i < len(self._names) and len(result) < limit and self._names[i].startswith(prefix):
+            result.append(self.by_id[self._name_ids[i]])
+            i += 1
+        return result
+
+
+# -------- Loaders --------
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _load_json(path):
+    with open(path) as f:
+        data = json.load(f)
+    # Either {"Category": [items...]} or a flat list of items with "category"
+    if isinstance(data, dict):
+        data = [dict(row, category=cat) for cat, rows in data.items() for row in rows]
+    return [Item(int(r["id"]), r["name"], _number(r["price"]), r["unit"], r["category"]) for r in data]
+
+
+def _load_csv(path):
+    with open(path, newline="") as f:
+        return [Item(int(r["id"]), r["name"], _number(r["price"]), r["unit"], r["category"])
+                for r in csv.DictReader(f)]
+
+
+def _load_sqlite(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT id, name, price, unit, category FROM items")
+        return [Item(int(i), n, _number(p), u, c) for i, n, p, u, c in rows]
+    finally:
+        conn.close()
+
+
+LOADERS = {
+    ".json": _load_json,
+    ".csv": _load_csv,
+    ".db": _load_sqlite,
+    ".sqlite": _load_sqlite,
+    ".sqlite3": _load_sqlite,
+}
+
+
+def file_version(path: str) -> str:
+    # Content hash, so every worker loading the same file agrees on the version
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_catalog(path: str) -> CatalogSnapshot:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in LOADERS:
+        raise ValueError(f"Unsupported catalog format: {path}")
+    return CatalogSnapshot(LOADERS[ext](path), file_version(path))
+
+
+class Catalog:
+    def __init__(self, path: str):
+        self.path = path
+        self._stat = self._file_stat()
+        self.snapshot = load_catalog(path)
+
+    def _file_stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def changed(self) -> bool:
+        try:
+            return self._file_stat() != self._stat
+        except OSError:
+            return False
+
+    async def reload_if_changed(self) -> bool:
+        if not self.changed():
+            return False
+        try:
+            # Removed or replaced since changed(): the next check sees the new file
+            stat = self._file_stat()
+        except OSError:
+            return False
+        try:
+            # Parse and index off the event loop, then swap the reference
+            snapshot = await asyncio.to_thread(load_catalog, self.path)
+        except Exception:
+            logger.exception("Catalog reload failed, keeping version %s", self.snapshot.version)
+            self._stat = stat
+            return False
+        self._stat = stat
+        if snapshot.version == self.snapshot.version:
+            return False
+        self.snapshot = snapshot
+        logger.info("Catalog reloaded: %d items, version %s", len(snapshot), snapshot.version)
+        return True
+
+    async def watch(self, interval: float = 2.0):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload_if_changed()
+            except Exception:
+                # Keep watching; a dead watcher would silently stop hot reload
+                logger.exception("Catalog check failed")
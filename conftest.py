@@ -0,0 +1,20 @@
+import fakeredis
+import pytest
+
+import cart_store
+import redis_connection
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """redis_connection.ar backed by a fresh fakeredis server; returns the server."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_connection, "ar", fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(cart_store, "_scripts", {})
+    return server
+
+
+@pytest.fixture
+def raw_redis(fake_redis):
+    """A synchronous, undecoded client on the same fake server."""
+    return fakeredis.FakeRedis(server=fake_redis)
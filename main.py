@@ -1,35 +1,40 @@
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
-from datetime import date  
-from redis_connection import get_session
-from redis_connection import save_session
-
-app = FastAPI()
-
-# Dummy data
-categories = ["Fruits", "Vegetables", "Dairy"]
-
-items = {
-    "Fruits": [
-        {"id": 1, "name": "Banana", "price": 20, "unit": "kg"},
-        {"id": 2, "name": "Apple", "price": 30, "unit": "kg"},
-    ],
-    "Vegetables": [
-        {"id": 3, "name": "Carrot", "price": 15, "unit": "kg"},
-        {"id": 4, "name": "Potato", "price": 10, "unit": "kg"},
-    ],
-    "Dairy": [
-        {"id": 5, "name": "Milk", "price": 50, "unit": "liter"},
-        {"id": 6, "name": "Curd", "price": 40, "unit": "kg"},
-    ]
-}
-
-# Flattened item map for lookup
-item_map = {item["id"]: item for cat_items in items.values() for item in cat_items}
-
-# In-memory cart (for demo, keyed by "user")
-cart: Dict[str, List[Dict]] = {}
+from typing import List, Literal, Optional
+import asyncio
+import metrics
+import orders
+import redis_connection
+import services
+from services import catalog, ServiceError, CATALOG_POLL_SECONDS
+from response_cache import ResponseCache, dumps, json_response
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    watcher = asyncio.create_task(catalog.watch(CATALOG_POLL_SECONDS))
+    near_cache = asyncio.create_task(redis_connection.watch_near_cache())
+    order_log = asyncio.create_task(orders.consume()) if orders.ORDER_LOG_CONSUMER else None
+    yield
+    watcher.cancel()
+    near_cache.cancel()
+    if order_log:
+        order_log.cancel()
+    await redis_connection.close()
+
+
+app = FastAPI(lifespan=lifespan)
+metrics.instrument(app)
+
+response_cache = ResponseCache()
+MAX_PAGE_SIZE = 500
+
+
+@app.exception_handler(ServiceError)
+async def service_error_handler(request: Request, exc: ServiceError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 # -------- API Models --------
 class CartItem(BaseModel):
@@ -37,6 +42,15 @@ class CartItem(BaseModel):
     item_id: int
     quantity: float
 
+class CartOperation(BaseModel):
+    op: Literal["add", "remove", "set"]
+    item_id: int
+    quantity: Optional[float] = None
+
+class CartBulk(BaseModel):
+    user_id: str
+    operations: List[CartOperation]
+
 class OrderConfirm(BaseModel):
     user_id: str
 
@@ -47,90 +61,97 @@ class RemoveFromCart(BaseModel):
 # -------- API Endpoints --------
 
 @app.get("/getAllCategories")
-def get_all_categories():
-    return {"categories": categories}
+async def get_all_categories(request: Request):
+    snapshot = catalog.snapshot
+    body, etag = response_cache.get(
+        snapshot.version, "categories", lambda: services.list_categories(snapshot)
+    )
+    return json_response(request, body, etag)
+
+
+@app.get("/catalog/version")
+async def get_catalog_version():
+    return {"version": catalog.snapshot.version}
 
 
 @app.get("/getAllItems/{category}")
-def get_items_by_category(category: str):
-    if category not in items:
-        raise HTTPException(status_code=404, detail="Category not found")
-    return {"items": items[category]}
+async def get_items_by_category(
+    category: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    snapshot = catalog.snapshot
+    name = services.resolve_category(category, snapshot)
+    after_id = services.parse_cursor(cursor)
+
+    if format == "ndjson":
+        page, next_cursor = snapshot.page(name, after_id, limit)
+        # Every line is an item, so the cursor for the next page goes in a header
+        headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else None
+        return StreamingResponse(ndjson_lines(page), media_type="application/x-ndjson", headers=headers)
+
+    # Full listings and first pages are cached; deeper cursors are rare and unbounded
+    if after_id is None:
+        body, etag = response_cache.get(
+            snapshot.version, ("category", name, limit),
+            lambda: services.list_items(name, limit, snapshot=snapshot),
+        )
+        return json_response(request, body, etag)
+    return Response(content=dumps(services.list_items(name, limit, cursor, snapshot)),
+                    media_type="application/json")
+
+
+def ndjson_lines(page, chunk_size=256):
+    for start in range(0, len(page), chunk_size):
+        yield b"".join(dumps(item.to_dict()) + b"\n" for item in page[start:start + chunk_size])
 
 
 @app.get("/getItemInfo/{item_id}")
-def get_item_info(item_id: int):
-    item = item_map.get(item_id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    return {"item": item}
+async def get_item_info(item_id: int, request: Request):
+    snapshot = catalog.snapshot
+    body, etag = response_cache.get(
+        snapshot.version, ("item", item_id), lambda: services.item_info(item_id, snapshot)
+    )
+    return json_response(request, body, etag)
 
 
-@app.post("/cart/add")
-def add_to_cart(cart_item: CartItem):
-    session = get_session(cart_item.user_id)
-    cart = session.get("cart", [])
-
-    # Update or append item
-    for item in cart:
-        if item["item_id"] == cart_item.item_id:
-            item["quantity"] += cart_item.quantity
-            break
-    else:
-        item = item_map.get(cart_item.item_id)
-        if not item:
-            raise HTTPException(status_code=404, detail="Item not found")
-        cart.append({"item_id": item["id"], "name": item["name"], "quantity": cart_item.quantity})
+@app.get("/search")
+async def search_items(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50)):
+    return Response(content=dumps(services.search_items(q, limit)), media_type="application/json")
 
-    # Save updated session
-    session["cart"] = cart
-    session["last_seen"] = date.today().isoformat()
-    save_session(cart_item.user_id, session)
 
-    return {"cart": cart}
+@app.post("/cart/add")
+async def add_to_cart(cart_item: CartItem):
+    return await services.add_to_cart(cart_item.user_id, cart_item.item_id, cart_item.quantity)
 
 
 @app.post("/cart/remove")
-def remove_from_cart(remove_item: RemoveFromCart):
-    session = get_session(remove_item.user_id)
-    cart = session.get("cart", [])
-
-    # Find and remove the item
-    for i, item in enumerate(cart):
-        if item["item_id"] == remove_item.item_id:
-            del cart[i]
-            break
-    else:
-        raise HTTPException(status_code=404, detail="Item not found in cart")
+async def remove_from_cart(remove_item: RemoveFromCart):
+    return await services.remove_from_cart(remove_item.user_id, remove_item.item_id)
 
-    # Save updated session
-    session["cart"] = cart
-    session["last_seen"] = date.today().isoformat()
-    save_session(remove_item.user_id, session)
 
-    return {"cart": cart}
+@app.post("/cart/bulk")
+async def update_cart(bulk: CartBulk):
+    return await services.update_cart(bulk.user_id, [op.model_dump() for op in bulk.operations])
 
 
 @app.get("/cart")
-def get_cart(user_id: str):
-    return {"cart": cart.get(user_id, [])}
+async def get_cart(user_id: str):
+    return await services.view_cart(user_id)
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return redis_connection.near_cache.stats()
 
 
 @app.post("/order/confirm")
-def confirm_order(order: OrderConfirm):
-    session = get_session(order.user_id)
-    cart = session.get("cart", [])
-    if not cart:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-
-    total = sum(item_map[i["item_id"]]["price"] * i["quantity"] for i in cart)
-    session["cart"] = []
-    session["last_seen"] = date.today().isoformat()
-    save_session(order.user_id, session)
-
-    return {
-        "message": "Order confirmed!",
-        "total_amount": total,
-        "items": cart
-    }
+async def confirm_order(order: OrderConfirm, idempotency_key: Optional[str] = Header(None, max_length=128)):
+    return await services.confirm_order(order.user_id, idempotency_key)
+
 
+@app.get("/orders/stats")
+async def get_order_stats():
+    return await orders.stats()
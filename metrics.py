@@ -0,0 +1,98 @@
+"""Prometheus metrics for the backend API (``GET /metrics``).
+
+Request latency per route template (not per URL, so item ids don't explode
+the label set) and Redis round trips per command. Pipelines count as one
+round trip, labelled ``pipeline``. Near cache lookups are counted by result
+(hit, miss, bypass). Metrics live in prometheus_client's
+default registry, so in the WhatsApp apps' in-process backend mode they show
+up on the apps' ``/metrics`` too. Under serve.py with several workers,
+``/metrics`` aggregates every worker (``PROMETHEUS_MULTIPROC_DIR``).
+"""
+import os
+import time
+
+import redis.asyncio as aioredis
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+HTTP_SECONDS = Histogram(
+    "backend_http_request_seconds", "Backend API request latency", ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+REDIS_SECONDS = Histogram(
+    "redis_command_seconds", "Redis round trip latency", ["command"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+
+NEAR_CACHE_REQUESTS = Counter("near_cache_requests", "Near cache lookups (see near_cache.py)", ["result"])
+NEAR_CACHE_ENTRIES = Gauge("near_cache_entries", "Entries held in the near cache", multiprocess_mode="livesum")
+
+
+class InstrumentedPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_SECONDS.labels("pipeline").observe(time.perf_counter() - start)
+
+
+class InstrumentedRedis(aioredis.Redis):
+    """asyncio Redis client that times every round trip."""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_SECONDS.labels(str(args[0]).lower()).observe(time.perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class LatencyMiddleware:
+    """ASGI middleware timing each request into ``histogram`` (cheaper than BaseHTTPMiddleware)."""
+
+    def __init__(self, app, histogram=HTTP_SECONDS):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")  # set by FastAPI once the path matched
+            self.histogram.labels(scope["method"], route.path if route else "unmatched", str(status)).observe(
+                time.perf_counter() - start
+            )
+
+
+def latest() -> bytes:
+    """This process's metrics, or all workers' when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def instrument(app, histogram=HTTP_SECONDS):
+    """Time every request of ``app`` into ``histogram`` and serve ``GET /metrics``."""
+    app.add_middleware(LatencyMiddleware, histogram=histogram)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(content=latest(), media_type=CONTENT_TYPE_LATEST)
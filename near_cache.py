@@ -0,0 +1,204 @@
+"""Per-process cache of Redis values (carts, sessions), kept in step with Redis.
+
+Every worker holds its own bounded LRU of recently read keys. ``watch()``
+subscribes to Redis keyspace notifications for the cached prefixes, so a
+write from any worker (or a TTL expiry) drops the local copy; the next read
+goes back to Redis. Writers in this process also drop their key right away,
+so a worker always reads its own writes.
+
+Keyspace notifications are a server-wide setting, so the cache only checks
+that they are on; it changes them itself (CONFIG SET) only when created with
+``configure_server`` (``NEAR_CACHE_CONFIGURE_REDIS``). While the subscription
+is not up (starting, reconnecting, or notifications are off) the cache is
+bypassed and emptied: reads go to Redis and nothing stale can be served.
+
+Concurrent misses of a key share one load. A load that races with an
+invalidation of the same key is returned but not stored, so an old value
+never lands in the cache after a newer write; misses after the
+invalidation start a new load.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from redis.exceptions import ResponseError
+
+from metrics import NEAR_CACHE_REQUESTS, NEAR_CACHE_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# K = keyspace channel; g = DEL/EXPIRE..., h = hash, $ = string, x = expired, e = evicted
+_EVENTS = "Kgh$xe"
+_MISSING = object()
+
+
+def _missing_events(flags: str) -> str:
+    """The notify-keyspace-events flags the cache needs that ``flags`` lacks."""
+    if "A" in flags:  # every event class except key-miss and new-key
+        flags += "g$lshzxetd"
+    return "".join(f for f in _EVENTS if f not in flags)
+
+
+class NearCache:
+    def __init__(self, max_entries: int, prefixes=("cart:", "session:"), configure_server: bool = False):
+        self.max_entries = max_entries
+        self.prefixes = prefixes
+        self.configure_server = configure_server
+        self.live = False
+        self.hits = self.misses = self.bypassed = self.invalidations = self.evictions = 0
+        self._entries = OrderedDict()
+        self._loading = {}  # key -> task of the load in flight
+
+    # -------- Reads and writes --------
+
+    async def get(self, key: str, load):
+        """Cached value of ``key``, or ``await load()`` (stored if still current)."""
+        if not self.live:
+            self.bypassed += 1
+            NEAR_CACHE_REQUESTS.labels("bypass").inc()
+            return await load()
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            NEAR_CACHE_REQUESTS.labels("hit").inc()
+            return self._entries[key]
+        self.misses += 1
+        NEAR_CACHE_REQUESTS.labels("miss").inc()
+        # Concurrent misses of a key share one load
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.ensure_future(load())
+            task.add_done_callback(functools.partial(self._loaded, key))
+        return await asyncio.shield(task)
+
+    def _loaded(self, key: str, task):
+        # Stored only if no invalidation of ``key`` came in while it loaded
+        if self._loading.get(key) is not task:
+            return
+        del self._loading[key]
+        if self.live and not task.cancelled() and task.exception() is None:
+            self._put(key, task.result())
+
+    def _put(self, key: str, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        NEAR_CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            self._loading.pop(key, None)
+            if self._entries.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+        NEAR_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+        NEAR_CACHE_ENTRIES.set(0)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "live": self.live,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+    # -------- Invalidation --------
+
+    async def _check_notifications(self, client):
+        """Whether Redis publishes keyspace events for writes and expiries
+        (switched on first with ``configure_server``); None when CONFIG GET is
+        not allowed (managed Redis) and only a probe can tell."""
+        try:
+            current = await client.config_get("notify-keyspace-events")
+            flags = current.get("notify-keyspace-events", "")
+        except ResponseError:
+            flags = None
+        if flags is not None and not _missing_events(flags):
+            return True
+        if self.configure_server:
+            try:
+                # Unknown flags: ours only, so nobody else's are lost silently
+                await client.config_set("notify-keyspace-events", (flags or "") + _missing_events(flags or ""))
+                return True
+            except ResponseError:
+                pass
+        if flags is None:
+            return None
+        self._warn_disabled(flags)
+        return False
+
+    async def _probe(self, client, pubsub, channel_prefix: str, timeout: float = 1.0) -> bool:
+        """Write and delete a throwaway hash; True if both notifications arrive."""
+        key = f"{self.prefixes[0]}near-cache-probe:{os.urandom(8).hex()}"
+        await client.hset(key, "probe", 1)
+        await client.delete(key)
+        seen = set()
+        deadline = time.monotonic() + timeout
+        while seen != {"hset", "del"}:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            message = await pubsub.get_message(timeout=remaining)
+            if message is not None and message["type"] == "pmessage" and message["channel"] == channel_prefix + key:
+                seen.add(message["data"])
+        return True
+
+    def _warn_disabled(self, flags):
+        logger.warning("Keyspace notifications are not enabled (notify-keyspace-events: %r); near cache "
+                       "disabled. Include %s on the server, or set NEAR_CACHE_CONFIGURE_REDIS=true to let "
+                       "the backend set it.", flags, _EVENTS)
+
+    async def watch(self, client, retry_seconds: float = 1.0):
+        """Keep the cache live while subscribed to invalidations; run as a task."""
+        if self.max_entries <= 0:
+            return
+        db = client.connection_pool.connection_kwargs.get("db", 0)
+        channel_prefix = f"__keyspace@{db}__:"
+        while True:
+            pubsub = None
+            try:
+                enabled = await self._check_notifications(client)
+                if enabled is False:
+                    return
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(*(f"{channel_prefix}{prefix}*" for prefix in self.prefixes))
+                # Live only once Redis confirmed every pattern
+                confirmed = 0
+                while confirmed < len(self.prefixes):
+                    message = await pubsub.get_message(timeout=None)
+                    if message is not None and message["type"] == "psubscribe":
+                        confirmed += 1
+                if enabled is None and not await self._probe(client, pubsub, channel_prefix):
+                    self._warn_disabled("unknown, CONFIG GET refused")
+                    return
+                self.live = True
+                logger.info("Near cache live (%d entries max)", self.max_entries)
+                while True:
+                    message = await pubsub.get_message(timeout=None)
+                    if message is not None and message["type"] == "pmessage":
+                        self.invalidate(message["channel"][len(channel_prefix):])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Near cache lost its invalidation feed; bypassing until it is back", exc_info=True)
+            finally:
+                # Invalidations may have been missed while not subscribed
+                self.live = False
+                self.clear()
+                if pubsub is not None:
+                    await pubsub.aclose()
+            await asyncio.sleep(retry_seconds)
@@ -0,0 +1,219 @@
+"""Orders: idempotent checkout into a Redis Stream, persisted to SQLite in batches.
+
+``place_order`` prices the cart and hands it to ``cart_store.checkout``,
+which in one Lua script call empties the cart, appends the order to the
+``ORDER_STREAM`` stream and, with an idempotency key, remembers the order
+under that key for ``ORDER_IDEMPOTENCY_TTL_SECONDS``. A retried request with
+the same key gets the same order back instead of a second charge or "Cart
+is empty". Checkout therefore costs two Redis round trips and never waits
+on the order database.
+
+``consume`` moves orders from the stream into SQLite (``ORDER_DB_PATH``):
+it reads up to ``ORDER_LOG_BATCH`` entries per call through a consumer
+group, writes them in one transaction (``INSERT OR IGNORE`` on the order id,
+so redelivery is harmless), then acknowledges and deletes them from the
+stream. The backend runs it in its lifespan; several workers share the
+group, and entries left pending by a worker that died are claimed after
+``ORDER_LOG_CLAIM_IDLE_SECONDS``. It can also run on its own:
+
+    python orders.py consume
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import date, datetime, timezone
+
+from redis.exceptions import ResponseError
+
+import cart_store
+import redis_connection
+
+logger = logging.getLogger(__name__)
+
+ORDER_STREAM = os.getenv("ORDER_STREAM", "orders")
+ORDER_DB_PATH = os.getenv("ORDER_DB_PATH", os.path.join(os.path.dirname(__file__), "data", "orders.db"))
+ORDER_IDEMPOTENCY_TTL_SECONDS = int(os.getenv("ORDER_IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+ORDER_LOG_CONSUMER = os.getenv("ORDER_LOG_CONSUMER", "true").lower() == "true"
+ORDER_LOG_BATCH = int(os.getenv("ORDER_LOG_BATCH", "500"))
+ORDER_LOG_CLAIM_IDLE_SECONDS = float(os.getenv("ORDER_LOG_CLAIM_IDLE_SECONDS", "60"))
+ORDER_LOG_GROUP = "order-log"
+CHECKOUT_ATTEMPTS = 3
+
+
+class OrderError(Exception):
+    """``reason`` is "empty" or "changed" (the cart kept changing while pricing it)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class MissingItems(Exception):
+    def __init__(self, item_ids):
+        super().__init__(item_ids)
+        self.item_ids = item_ids
+
+
+def idempotency_key(user_id: str, key: str) -> str:
+    return f"order:idem:{user_id}:{key}"
+
+
+def price(user_id: str, cart: dict, snapshot) -> dict:
+    items, missing = [], []
+    for item_id, quantity in cart.items():
+        item = snapshot.get(item_id)
+        if item is None:
+            missing.append(item_id)
+            continue
+        items.append({"item_id": item_id, "name": item.name, "quantity": quantity, "price": item.price})
+    if missing:
+        raise MissingItems(missing)
+    return {
+        "order_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "total_amount": sum(i["price"] * i["quantity"] for i in items),
+        "items": items,
+    }
+
+
+async def place_order(user_id: str, snapshot, key: str = None) -> dict:
+    """The new order, or the one already placed with ``key``."""
+    redis_key = idempotency_key(user_id, key) if key else None
+    for _ in range(CHECKOUT_ATTEMPTS):
+        cart = await cart_store.get_cart(user_id, fresh=True)
+        order = price(user_id, cart, snapshot) if cart else {}
+        status, stored = await cart_store.checkout(
+            user_id, cart, json.dumps(order), date.today().isoformat(), ORDER_STREAM,
+            redis_key, ORDER_IDEMPOTENCY_TTL_SECONDS,
+        )
+        if status in ("ok", "replay"):
+            return json.loads(stored)
+        if status == "empty":
+            raise OrderError("empty")
+    raise OrderError("changed")
+
+
+# -------- Order log --------
+
+class OrderLog:
+    """Append-only SQLite table of orders, keyed by order id."""
+
+    def __init__(self, path: str = ORDER_DB_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            "order_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, created_at TEXT NOT NULL, "
+            "total_amount REAL NOT NULL, items TEXT NOT NULL)"
+        )
+        self.db.commit()
+
+    def write(self, orders) -> int:
+        with self.db:
+            cursor = self.db.executemany(
+                "INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?, ?)",
+                [(o["order_id"], o["user_id"], o["created_at"], o["total_amount"], json.dumps(o["items"]))
+                 for o in orders],
+            )
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+consumer_stats = {"batches": 0, "orders": 0, "written": 0, "lag_ms": None}
+
+
+async def _ensure_group(client, stream: str):
+    try:
+        await client.xgroup_create(stream, ORDER_LOG_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _persist(client, log: OrderLog, stream: str, entries):
+    if not entries:
+        return
+    ids = [entry_id for entry_id, _ in entries]
+    # Claimed entries deleted meanwhile come back without fields
+    orders = [json.loads(fields["order"]) for _, fields in entries if fields]
+    written = await asyncio.to_thread(log.write, orders)
+    await client.xack(stream, ORDER_LOG_GROUP, *ids)
+    await client.xdel(stream, *ids)
+    consumer_stats["batches"] += 1
+    consumer_stats["orders"] += len(orders)
+    consumer_stats["written"] += written
+    # Stream ids start with the append time in ms
+    consumer_stats["lag_ms"] = time.time() * 1000 - int(ids[-1].split("-")[0])
+
+
+async def consume(log: OrderLog = None, stream: str = ORDER_STREAM, consumer: str = None,
+                  batch: int = ORDER_LOG_BATCH, block_ms: int = 1000):
+    """Move orders from ``stream`` into ``log`` until cancelled."""
+    client = redis_connection.ar
+    log = log or OrderLog()
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    grouped = False
+    last_claim = 0.0
+    cursor = "0"  # first our own pending entries (after a restart), then new ones
+    try:
+        while True:
+            try:
+                if not grouped:
+                    await _ensure_group(client, stream)
+                    grouped = True
+                if time.monotonic() - last_claim > ORDER_LOG_CLAIM_IDLE_SECONDS:
+                    last_claim = time.monotonic()
+                    _, claimed, *_ = await client.xautoclaim(
+                        stream, ORDER_LOG_GROUP, consumer, int(ORDER_LOG_CLAIM_IDLE_SECONDS * 1000), count=batch
+                    )
+                    await _persist(client, log, stream, claimed)
+                started = time.monotonic()
+                response = await client.xreadgroup(
+                    ORDER_LOG_GROUP, consumer, {stream: cursor}, count=batch, block=None if cursor == "0" else block_ms
+                )
+                entries = response[0][1] if response else []
+                if cursor == "0" and not entries:
+                    cursor = ">"
+                elif not entries:
+                    # Not every server honours BLOCK (fakeredis returns at once); don't spin
+                    await asyncio.sleep(max(0.0, block_ms / 1000 - (time.monotonic() - started)))
+                await _persist(client, log, stream, entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Order log consumer failed; retrying", exc_info=True)
+                await asyncio.sleep(1)
+    finally:
+        log.close()
+
+
+async def stats(stream: str = ORDER_STREAM) -> dict:
+    client = redis_connection.ar
+    pending = 0
+    try:
+        groups = await client.xinfo_groups(stream)
+        pending = sum(g["pending"] for g in groups if g["name"] == ORDER_LOG_GROUP)
+    except ResponseError:
+        pass  # no stream yet
+    return {"stream_length": await client.xlen(stream), "pending": pending, "consumer": consumer_stats}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["consume"]:
+        sys.exit("usage: python orders.py consume")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(consume())
@@ -1,13 +1,80 @@
+import os
 import redis
-import json
+import redis.asyncio as aioredis
+from redis.client import NEVER_DECODE
 
-r = redis.Redis(host='localhost', port=6379, decode_responses=True)
+import session_codec
+from metrics import InstrumentedRedis
+from near_cache import NearCache
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+SESSION_TTL_SECONDS = 7*24*3600
+NEAR_CACHE_SIZE = int(os.getenv("NEAR_CACHE_SIZE", "10000"))  # 0 disables it
+# Let the near cache turn on keyspace notifications (a server-wide CONFIG SET)
+NEAR_CACHE_CONFIGURE_REDIS = os.getenv("NEAR_CACHE_CONFIGURE_REDIS", "false").lower() in ("1", "true", "yes")
+
+# Legacy synchronous client, kept for scripts and the benchmark baseline
+r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+# Shared asyncio client. BlockingConnectionPool caps the number of sockets
+# and makes callers wait for a free connection instead of opening new ones.
+pool = aioredis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    decode_responses=True,
+)
+ar = InstrumentedRedis(connection_pool=pool)  # times each round trip (see metrics.py)
+
+# Recently read carts and sessions, invalidated by keyspace notifications.
+# Live once watch_near_cache() runs; until then reads go straight to Redis.
+near_cache = NearCache(NEAR_CACHE_SIZE, configure_server=NEAR_CACHE_CONFIGURE_REDIS)
+
+
+def session_key(user_id: str) -> str:
+    return f"session:{user_id}"
+
+# Session blobs are binary (see session_codec.py), so they are read undecoded
+_RAW = {NEVER_DECODE: True}
 
 def get_session(user_id: str):
-    key = f"session:{user_id}"
-    session = r.get(key)
-    return json.loads(session) if session else {}
+    return session_codec.decode(r.execute_command("GET", session_key(user_id), **_RAW))
+
+def save_session(user_id: str, data: dict, ttl_seconds=SESSION_TTL_SECONDS):
+    r.setex(session_key(user_id), ttl_seconds, session_codec.encode(data))
+
+
+# -------- Async API --------
+
+async def watch_near_cache():
+    await near_cache.watch(ar)
+
+async def aget_session(user_id: str) -> dict:
+    # The encoded blob is cached, so every caller gets its own dict
+    key = session_key(user_id)
+    return session_codec.decode(await near_cache.get(key, lambda: ar.execute_command("GET", key, **_RAW)))
+
+async def asave_session(user_id: str, data: dict, ttl_seconds=SESSION_TTL_SECONDS):
+    await ar.setex(session_key(user_id), ttl_seconds, session_codec.encode(data))
+    near_cache.invalidate(session_key(user_id))
+
+async def aget_sessions(user_ids: list) -> dict:
+    # One MGET round trip for any number of sessions
+    if not user_ids:
+        return {}
+    values = await ar.execute_command("MGET", *(session_key(u) for u in user_ids), **_RAW)
+    return {u: session_codec.decode(v) for u, v in zip(user_ids, values)}
+
+async def asave_sessions(sessions: dict, ttl_seconds=SESSION_TTL_SECONDS):
+    # Pipelined SETEX; transaction=False since the writes are independent
+    async with ar.pipeline(transaction=False) as pipe:
+        for user_id, data in sessions.items():
+            pipe.setex(session_key(user_id), ttl_seconds, session_codec.encode(data))
+        await pipe.execute()
+    near_cache.invalidate(*(session_key(u) for u in sessions))
 
-def save_session(user_id: str, data: dict, ttl_seconds=7*24*3600):
-    key = f"session:{user_id}"
-    r.setex(key, ttl_seconds, json.dumps(data))
+async def close():
+    await ar.aclose()
+    await pool.disconnect()
@@ -0,0 +1,71 @@
+"""Pre-serialized JSON bodies for the catalog endpoints.
+
+Bodies are encoded once per catalog version and served as raw bytes with a
+content-hash ETag, so a repeat read skips dict building, jsonable_encoder and
+JSON encoding, and a client holding the ETag gets an empty 304. At most
+``RESPONSE_CACHE_MAX_ENTRIES`` bodies are kept (least recently used go
+first), since item, category and cursor keys grow with the requests seen.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.version = None
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, version: str, key, build):
+        """Return ``(body, etag)`` for ``key``, or None when ``build()`` is None."""
+        if version != self.version:
+            # New catalog: drop everything encoded from the old one
+            self._entries = OrderedDict()
+            self.version = version
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        payload = build()
+        if payload is None:
+            return None
+        body = dumps(payload)
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+        entry = self._entries[key] = (body, etag)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def json_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
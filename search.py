@@ -0,0 +1,115 @@
+"""Typo-tolerant product name search.
+
+Names are split into words. Each distinct word is indexed by its trigrams,
+so a query word is first resolved against the (small) vocabulary - exactly,
+as a prefix, or by trigram similarity for typos and plurals - and only then
+mapped to items through per-word posting sets. Items are numbered in rank
+order (shorter names first), so the best hits of a posting set are simply
+its smallest numbers and can be taken with a C-level heap selection.
+"""
+import heapq
+import re
+from bisect import bisect_left
+
+_WORD = re.compile(r"[a-z0-9]+")
+MIN_SIMILARITY = 0.35
+MAX_WORD_MATCHES = 4
+
+
+def words(text: str) -> list:
+    return _WORD.findall(text.lower())
+
+
+def trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, items):
+        # Rank order: shortest names first, ties by name then id
+        self.items = sorted(items, key=lambda i: (len(i.name), i.name.lower(), i.id))
+        postings = {}
+        for rank, item in enumerate(self.items):
+            for word in set(words(item.name)):
+                postings.setdefault(word, []).append(rank)
+        # Rank-ordered tuples for single-word lookups, sets for intersections
+        self.ranked = {w: tuple(p) for w, p in postings.items()}
+        self.postings = {w: frozenset(p) for w, p in postings.items()}
+        self.vocab = sorted(postings)
+        self.vocab_trigrams = {}
+        self._word_trigrams = {}
+        for word in self.vocab:
+            if word.isdigit():
+                continue  # numbers (sizes, pack counts) only match exactly
+            grams = trigrams(word)
+            self._word_trigrams[word] = len(grams)
+            for gram in grams:
+                self.vocab_trigrams.setdefault(gram, []).append(word)
+
+    def match_word(self, word: str, is_last: bool) -> list:
+        """Vocabulary words similar to ``word`` as ``[(similarity, word)]``, best first."""
+        matches = {}
+        if word in self.postings:
+            matches[word] = 1.0
+        if is_last:
+            # The word being typed: accept completions
+            i = bisect_left(self.vocab, word)
+            while i < len(self.vocab) and self.vocab[i].startswith(word) and len(matches) < MAX_WORD_MATCHES:
+                matches.setdefault(self.vocab[i], 0.9)
+                i += 1
+        if not word.isdigit() and (not matches or max(matches.values()) < 1.0):
+            grams = trigrams(word)
+            counts = {}
+            for gram in grams:
+                for candidate in self.vocab_trigrams.get(gram, ()):
+                    counts[candidate] = counts.get(candidate, 0) + 1
+            for candidate, shared in counts.items():
+                sim = shared / (len(grams) + self._word_trigrams[candidate] - shared)
+                if sim >= MIN_SIMILARITY and sim > matches.get(candidate, 0):
+                    matches[candidate] = sim
+        ranked = sorted(((s, w) for w, s in matches.items()), reverse=True)
+        return ranked[:MAX_WORD_MATCHES]
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Return up to ``limit`` ``(item, score)`` pairs, best first."""
+        query_words = words(query)
+        if not query_words or limit <= 0:
+            return []
+        per_word = [self.match_word(w, i == len(query_words) - 1) for i, w in enumerate(query_words)]
+        per_word = [m for m in per_word if m]
+        if not per_word:
+            return []
+
+        results = []
+        seen = set()
+
+        def take(candidates, score):
+            if isinstance(candidates, tuple):
+                # Already in rank order: stop as soon as the page is full
+                ordered = (r for r in candidates if r not in seen)
+            else:
+                ordered = heapq.nsmallest(limit - len(results), candidates - seen if seen else candidates)
+            for rank in ordered:
+                if len(results) >= limit:
+                    break
+                seen.add(rank)
+                results.append((self.items[rank], round(score, 3)))
+
+        n = len(query_words)
+        # Tier 1: every query word at its best match
+        if len(per_word) == 1:
+            take(self.ranked[per_word[0][0][1]], per_word[0][0][0] / n)
+        else:
+            best = [self.postings[m[0][1]] for m in per_word]
+            take(frozenset.intersection(*best), sum(m[0][0] for m in per_word) / n)
+        # Tier 2: every query word, any of its close matches
+        if len(results) < limit:
+            loose = [frozenset().union(*(self.postings[w] for _, w in m)) for m in per_word]
+            take(frozenset.intersection(*loose), sum(m[-1][0] for m in per_word) / n)
+            # Tier 3: items matching at least one query word
+            for m, posting in sorted(zip(per_word, loose), key=lambda p: -p[0][0][0]):
+                if len(results) >= limit:
+                    break
+                take(posting, m[0][0] / n)
+        return results
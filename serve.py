@@ -0,0 +1,69 @@
+"""Run the backend or a WhatsApp app with several uvicorn worker processes.
+
+    python serve.py backend --workers 4 --port 8000
+    python serve.py whatsapp --workers 4 --port 8001        # autogen_mcp/whatsapp_handler.py
+    python serve.py whatsapp-main --workers 4 --port 8002   # autogen_mcp/main.py
+
+Every worker is a separate process listening on the same port; the kernel
+spreads connections between them, and any worker can take any request:
+
+- backend: carts, sessions and orders already live in Redis (REDIS_URL),
+  each worker loads its own read-only copy of the catalog, and near caches
+  are kept in step through keyspace notifications.
+- WhatsApp apps: more than one worker needs STATE_BACKEND=redis (the
+  default here when --workers > 1), which keeps the inbound queue and the
+  conversations in Redis (see autogen_mcp/state.py).
+
+WORKERS is set for the workers, so limits meant for the whole deployment
+(OUTBOUND_ACCOUNT_RATE) are split between them. Per-process pools such as
+REDIS_MAX_CONNECTIONS, QUEUE_WORKERS and AGENT_WORKERS are per worker.
+``/metrics`` aggregates all workers through a PROMETHEUS_MULTIPROC_DIR
+(a fresh temporary directory unless one is set).
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APPS = {
+    "backend": ("main:app", ROOT),
+    "whatsapp": ("whatsapp_handler:app", os.path.join(ROOT, "autogen_mcp")),
+    "whatsapp-main": ("main:app", os.path.join(ROOT, "autogen_mcp")),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    app, app_dir = APPS[args.app]
+    os.environ["WORKERS"] = str(args.workers)
+    if args.app != "backend" and args.workers > 1:
+        backend = os.environ.setdefault("STATE_BACKEND", "redis")
+        if backend != "redis":
+            sys.exit(f"STATE_BACKEND={backend} keeps conversations in one process; use redis with --workers > 1")
+
+    metrics_dir = None
+    if args.workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    import uvicorn
+
+    try:
+        uvicorn.run(app, app_dir=app_dir, host=args.host, port=args.port,
+                    workers=args.workers, log_level=args.log_level)
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Business logic behind the REST API, usable without HTTP.
+
+Route handlers in main.py and the in-process agent backend both call these
+functions. Results are the same JSON-ready dicts the API returns; failures
+raise ServiceError subclasses carrying the HTTP status they map to.
+"""
+import math
+import os
+from datetime import date
+from typing import Dict, List
+
+import cart_store
+import orders
+from catalog import Catalog
+
+# Product catalog, loaded from a file and reloaded when it changes
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(os.path.dirname(__file__), "data", "catalog.json"))
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "2"))
+catalog = Catalog(CATALOG_PATH)
+
+
+class ServiceError(Exception):
+    status_code = 400
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class NotFound(ServiceError):
+    status_code = 404
+
+
+class BadRequest(ServiceError):
+    status_code = 400
+
+
+class Conflict(ServiceError):
+    status_code = 409
+
+
+# -------- Catalog --------
+
+def catalog_version() -> str:
+    return catalog.snapshot.version
+
+
+def list_categories(snapshot=None) -> dict:
+    snapshot = snapshot or catalog.snapshot
+    return {"categories": snapshot.categories}
+
+
+def resolve_category(category: str, snapshot=None) -> str:
+    name = (snapshot or catalog.snapshot).resolve_category(category)
+    if name is None:
+        raise NotFound("Category not found")
+    return name
+
+
+def parse_cursor(cursor):
+    try:
+        return int(cursor) if cursor else None
+    except ValueError:
+        raise BadRequest("Invalid cursor")
+
+
+def list_items(category: str, limit=None, cursor=None, snapshot=None) -> dict:
+    """Items of a category; paged (with ``next_cursor``) when limit or cursor is given."""
+    snapshot = snapshot or catalog.snapshot
+    name = resolve_category(category, snapshot)
+    after_id = parse_cursor(cursor)
+    if limit is None and after_id is None:
+        return {"items": [item.to_dict() for item in snapshot.by_category[name]]}
+    page, next_cursor = snapshot.page(name, after_id, limit)
+    return {
+        "items": [item.to_dict() for item in page],
+        "next_cursor": None if next_cursor is None else str(next_cursor),
+    }
+
+
+def item_info(item_id: int, snapshot=None) -> dict:
+    item = (snapshot or catalog.snapshot).get(item_id)
+    if not item:
+        raise NotFound("Item not found")
+    return {"item": item.to_dict()}
+
+
+def search_items(query: str, limit: int = 10, snapshot=None) -> dict:
+    results = (snapshot or catalog.snapshot).search_index.search(query, limit)
+    return {"items": [dict(item.to_dict(), category=item.category, score=score)
+                      for item, score in results]}
+
+
+# -------- Cart & orders --------
+
+CART_OPERATIONS = ("add", "remove", "set")
+MAX_CART_OPERATIONS = 100
+
+def cart_items(cart: dict) -> List[Dict]:
+    snapshot = catalog.snapshot
+    return [
+        {"item_id": item_id, "name": item.name if (item := snapshot.get(item_id)) else None, "quantity": quantity}
+        for item_id, quantity in cart.items()
+    ]
+
+
+def _is_quantity(quantity, allow_zero: bool = False) -> bool:
+    # Fractions are fine (kg, liters); bools, NaN and infinity are not
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or not math.isfinite(quantity):
+        return False
+    return quantity >= 0 if allow_zero else quantity > 0
+
+
+def _is_item_id(item_id) -> bool:
+    return isinstance(item_id, int) and not isinstance(item_id, bool)
+
+
+async def add_to_cart(user_id: str, item_id: int, quantity: float) -> dict:
+    if not _is_quantity(quantity):
+        raise BadRequest("Quantity must be a positive number")
+    if catalog.snapshot.get(item_id) is None:
+        raise NotFound("Item not found")
+    cart = await cart_store.add_item(user_id, item_id, quantity, date.today().isoformat())
+    return {"cart": cart_items(cart)}
+
+
+async def remove_from_cart(user_id: str, item_id: int) -> dict:
+    cart = await cart_store.remove_item(user_id, item_id, date.today().isoformat())
+    if cart is None:
+        raise NotFound("Item not found in cart")
+    return {"cart": cart_items(cart)}
+
+
+async def update_cart(user_id: str, operations: List[Dict]) -> dict:
+    """Apply a list of ``{"op", "item_id", "quantity"}`` cart operations, all or none.
+
+    ``op`` is add (quantity > 0), remove, or set (quantity >= 0; 0 removes).
+    Quantities may be fractional (kg, liters). Everything is validated before
+    the cart is touched; agents call this without the API's request models.
+    """
+    if not operations:
+        raise BadRequest("No cart operations given")
+    if len(operations) > MAX_CART_OPERATIONS:
+        raise BadRequest(f"At most {MAX_CART_OPERATIONS} cart operations per request")
+    snapshot = catalog.snapshot
+    missing = set()
+    for operation in operations:
+        if not isinstance(operation, dict) or not _is_item_id(operation.get("item_id")):
+            raise BadRequest("Each cart operation needs an op and an integer item_id")
+        op, quantity = operation.get("op"), operation.get("quantity")
+        if op not in CART_OPERATIONS:
+            raise BadRequest(f"Unknown cart operation: {op}")
+        if op == "add" and not _is_quantity(quantity):
+            raise BadRequest("add needs a positive quantity")
+        if op == "set" and not _is_quantity(quantity, allow_zero=True):
+            raise BadRequest("set needs a quantity of 0 or more")
+        if op != "remove" and snapshot.get(operation["item_id"]) is None:
+            missing.add(operation["item_id"])
+    if missing:
+        raise NotFound(f"Items not found: {', '.join(map(str, sorted(missing)))}")
+
+    cart = await cart_store.apply_operations(
+        user_id, [(o["op"], o["item_id"], o.get("quantity")) for o in operations], date.today().isoformat()
+    )
+    return {"cart": cart_items(cart)}
+
+
+async def view_cart(user_id: str) -> dict:
+    return {"cart": cart_items(await cart_store.get_cart(user_id))}
+
+
+async def confirm_order(user_id: str, idempotency_key: str = None) -> dict:
+    """Place the order; a retry with the same ``idempotency_key`` returns the same order."""
+    try:
+        order = await orders.place_order(user_id, catalog.snapshot, idempotency_key)
+    except orders.MissingItems as e:
+        raise BadRequest(f"Items no longer available: {', '.join(map(str, e.item_ids))}")
+    except orders.OrderError as e:
+        if e.reason == "empty":
+            raise BadRequest("Cart is empty")
+        raise Conflict("Cart changed during checkout, please retry")
+
+    return {
+        "message": "Order confirmed!",
+        "order_id": order["order_id"],
+        "total_amount": order["total_amount"],
+        "items": order["items"]
+    }
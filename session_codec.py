@@ -0,0 +1,57 @@
+"""Encoding of ``session:{user_id}`` blobs.
+
+Version 1 is binary: a version byte (1) and ``last_seen`` as a big-endian
+uint16 day count since 1970-01-01, 3 bytes in all, against ~26 for the JSON
+``{"last_seen": "2024-05-01"}``. The cart is not part of the session any
+more (see cart_store.py), so that is all a session normally holds. Sessions
+with other fields are still written as JSON, and JSON blobs (first byte
+``{``) are always readable; cart_store's Lua scripts rewrite plain JSON
+sessions as version 1 on their next write.
+
+The first byte tells the formats apart, so a new layout only needs a new
+version number.
+"""
+import json
+import struct
+from datetime import date
+
+VERSION = 1
+_EPOCH = date(1970, 1, 1).toordinal()
+_V1 = struct.Struct(">BH")
+
+
+def day_number(iso_date: str) -> int:
+    return date.fromisoformat(iso_date).toordinal() - _EPOCH
+
+
+def v1_day(iso_date: str):
+    """``iso_date`` as a version 1 day number, or None if it doesn't fit (day 0
+    means "no date"; 65536 days is 2149-06-06)."""
+    try:
+        day = day_number(iso_date)
+    except (TypeError, ValueError):
+        return None
+    return day if 0 < day <= 0xFFFF else None
+
+
+def encode(data: dict) -> bytes:
+    if set(data) <= {"last_seen"}:
+        last_seen = data.get("last_seen")
+        day = v1_day(last_seen) if last_seen else 0
+        if day is not None:
+            return _V1.pack(VERSION, day)
+        # Not an ISO date, or out of range: kept verbatim as JSON
+    return json.dumps(data).encode()
+
+
+def decode(raw) -> dict:
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if raw[:1] == b"{":
+        return json.loads(raw)
+    if raw[0] == 1 and len(raw) == _V1.size:
+        _, day = _V1.unpack(raw)
+        return {"last_seen": date.fromordinal(_EPOCH + day).isoformat()} if day else {}
+    raise ValueError(f"Unknown session format (first byte {raw[0]})")
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import cart_store
+import session_codec
+
+TODAY = "2024-05-01"
+
+
+def test_add_remove_and_read(fake_redis):
+    async def main():
+        assert await cart_store.add_item("u1", 3, 2, TODAY) == {3: 2.0}
+        assert await cart_store.add_item("u1", 3, 0.5, TODAY) == {3: 2.5}
+        assert await cart_store.add_item("u1", 7, 1, TODAY) == {3: 2.5, 7: 1.0}
+        assert await cart_store.remove_item("u1", 3, TODAY) == {7: 1.0}
+        assert await cart_store.get_cart("u1") == {7: 1.0}
+        assert await cart_store.get_cart("u2") == {}
+
+    asyncio.run(main())
+
+
+def test_add_writes_a_v1_session(fake_redis, raw_redis):
+    asyncio.run(cart_store.add_item("u1", 3, 1, TODAY))
+    assert raw_redis.get("session:u1") == session_codec.encode({"last_seen": TODAY})
+    assert raw_redis.ttl("cart:u1") > 0
+
+
+def test_removing_the_last_item_empties_the_cart(fake_redis, raw_redis):
+    async def main():
+        await cart_store.add_item("u1", 3, 2, TODAY)
+        assert await cart_store.remove_item("u1", 3, TODAY) == {}
+        assert await cart_store.remove_item("u1", 3, TODAY) is None
+        # Setting a quantity to zero drops the item too
+        await cart_store.add_item("u1", 4, 1, TODAY)
+        assert await cart_store.apply_operations("u1", [("set", 4, 0)], TODAY) == {}
+        assert await cart_store.get_cart("u1", fresh=True) == {}
+
+    asyncio.run(main())
+    assert not raw_redis.exists("cart:u1")
+
+
+def test_legacy_json_cart_is_migrated(fake_redis, raw_redis):
+    raw_redis.set("session:u1", ex=3600, value=json.dumps({
+        "cart": [{"item_id": 3, "quantity": 2}, {"item_id": 5, "quantity": 1.5}],
+        "last_seen": "2024-04-01",
+    }))
+    assert asyncio.run(cart_store.add_item("u1", 3, 1, TODAY)) == {3: 3.0, 5: 1.5}
+    # A plain session becomes version 1, keeping its TTL
+    assert raw_redis.get("session:u1") == session_codec.encode({"last_seen": TODAY})
+    assert 0 < raw_redis.ttl("session:u1") <= 3600
+
+
+def test_legacy_session_with_other_fields_stays_json(fake_redis, raw_redis):
+    raw_redis.set("session:u1", json.dumps({"cart": [{"item_id": 3, "quantity": 2}], "name": "Ann"}))
+    assert asyncio.run(cart_store.get_cart("u1")) == {3: 2.0}
+    assert json.loads(raw_redis.get("session:u1")) == {"name": "Ann"}
+
+
+def test_migrate_all_is_idempotent(fake_redis, raw_redis):
+    for user, item in (("u1", 3), ("u2", 4)):
+        raw_redis.set(f"session:{user}", json.dumps({"cart": [{"item_id": item, "quantity": 2}],
+                                                     "last_seen": "2024-04-01"}))
+
+    async def main():
+        assert await cart_store.migrate_all() == 2
+        assert await cart_store.migrate_all() == 2
+        return await cart_store.get_cart("u1"), await cart_store.get_cart("u2")
+
+    assert asyncio.run(main()) == ({3: 2.0}, {4: 2.0})
+    assert json.loads(raw_redis.get("session:u1")) == {"last_seen": "2024-04-01"}
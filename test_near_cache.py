@@ -0,0 +1,121 @@
+import asyncio
+import logging
+
+import fakeredis
+
+from near_cache import NearCache
+
+
+async def _live(cache, client):
+    watcher = asyncio.create_task(cache.watch(client, retry_seconds=0.01))
+    for _ in range(200):
+        if cache.live or watcher.done():
+            break
+        await asyncio.sleep(0.005)
+    return watcher
+
+
+async def _settle():
+    await asyncio.sleep(0.05)
+
+
+def test_writes_from_another_client_invalidate():
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    other = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    cache = NearCache(10)
+
+    async def main():
+        # No CONFIG GET in fakeredis: the cache goes live on its probe
+        watcher = await _live(cache, client)
+        assert cache.live
+        await other.hset("cart:u1", "3", "1")
+        await _settle()
+        assert await cache.get("cart:u1", lambda: client.hgetall("cart:u1")) == {"3": "1"}
+        assert await cache.get("cart:u1", lambda: client.hgetall("cart:u1")) == {"3": "1"}
+        assert cache.hits == 1
+
+        await other.hset("cart:u1", "3", "2")
+        await _settle()
+        assert cache.invalidations == 1  # the cached copy was dropped
+        assert await cache.get("cart:u1", lambda: client.hgetall("cart:u1")) == {"3": "2"}
+
+        await other.delete("cart:u1")
+        await _settle()
+        assert await cache.get("cart:u1", lambda: client.hgetall("cart:u1")) == {}
+        watcher.cancel()
+
+    asyncio.run(main())
+
+
+class NotificationsOff(fakeredis.FakeAsyncRedis):
+    """fakeredis always publishes keyspace events and has no CONFIG GET."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config_sets = []
+
+    async def config_get(self, pattern="*", *args, **kwargs):
+        return {"notify-keyspace-events": ""}
+
+    async def config_set(self, name, value, *args, **kwargs):
+        self.config_sets.append(value)
+        return True
+
+
+def test_stays_off_without_notifications(caplog):
+    client = NotificationsOff(server=fakeredis.FakeServer(), decode_responses=True)
+    cache = NearCache(10)
+
+    async def main():
+        watcher = await _live(cache, client)
+        assert watcher.done() and not cache.live
+        assert client.config_sets == []  # the server setting is left alone
+        assert await cache.get("cart:u1", lambda: client.hgetall("cart:u1")) == {}
+        assert cache.bypassed == 1
+
+    with caplog.at_level(logging.WARNING, logger="near_cache"):
+        asyncio.run(main())
+    assert "NEAR_CACHE_CONFIGURE_REDIS" in caplog.text
+
+
+def test_configure_server_enables_notifications():
+    client = NotificationsOff(server=fakeredis.FakeServer(), decode_responses=True)
+    cache = NearCache(10, configure_server=True)
+
+    async def main():
+        watcher = await _live(cache, client)
+        assert cache.live
+        assert client.config_sets == ["Kgh$xe"]
+        watcher.cancel()
+
+    asyncio.run(main())
+
+
+def test_concurrent_misses_share_one_load_and_racing_writes_win():
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    cache = NearCache(10)
+    loads = []
+
+    async def main():
+        watcher = await _live(cache, client)
+        release = asyncio.Event()
+
+        async def slow_load():
+            loads.append(1)
+            value = await client.hgetall("cart:u1")
+            await release.wait()
+            return value
+
+        readers = [asyncio.create_task(cache.get("cart:u1", slow_load)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        assert len(loads) == 1
+        await client.hset("cart:u1", "3", "1")  # lands while the load is in flight
+        await _settle()
+        release.set()
+        assert [await r for r in readers] == [{}] * 5
+        assert "cart:u1" not in cache._entries  # the stale result was not stored
+        assert await cache.get("cart:u1", lambda: client.hgetall("cart:u1")) == {"3": "1"}
+        watcher.cancel()
+
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import cart_store
+import orders
+from orders import ORDER_LOG_GROUP, OrderError, OrderLog
+
+TODAY = "2024-05-01"
+STREAM = "orders-test"
+CATALOG = {3: SimpleNamespace(name="Apple", price=2.0), 7: SimpleNamespace(name="Milk", price=1.5)}
+
+
+@pytest.fixture(autouse=True)
+def test_stream(monkeypatch):
+    monkeypatch.setattr(orders, "ORDER_STREAM", STREAM)
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = OrderLog(str(tmp_path / "orders.db"))
+    yield log
+    log.close()
+
+
+def _order(order_id="o1"):
+    return {"order_id": order_id, "user_id": "u1", "created_at": "2024-05-01T12:00:00+00:00",
+            "total_amount": 4.0, "items": [{"item_id": 3, "name": "Apple", "quantity": 2, "price": 2.0}]}
+
+
+# -------- Checkout --------
+
+def test_retry_with_the_same_idempotency_key_replays_the_order(fake_redis, raw_redis):
+    async def main():
+        await cart_store.add_item("u1", 3, 2, TODAY)
+        first = await orders.place_order("u1", CATALOG, "key-1")
+        assert first["total_amount"] == 4.0
+        assert await cart_store.get_cart("u1", fresh=True) == {}
+        assert await orders.place_order("u1", CATALOG, "key-1") == first
+        with pytest.raises(OrderError) as error:
+            await orders.place_order("u1", CATALOG, "key-2")
+        assert error.value.reason == "empty"
+        return first
+
+    first = asyncio.run(main())
+    entries = raw_redis.xrange(STREAM)
+    assert len(entries) == 1
+    assert json.loads(entries[0][1][b"order"]) == first
+    assert 0 < raw_redis.ttl(orders.idempotency_key("u1", "key-1")) <= orders.ORDER_IDEMPOTENCY_TTL_SECONDS
+
+
+def test_checkout_retries_while_the_cart_changes(fake_redis, monkeypatch):
+    get_cart = cart_store.get_cart
+    changes = iter([1, 1])
+
+    async def changing_cart(user_id, fresh=False):
+        # Another request adds milk right after each read, until changes run out
+        cart = await get_cart(user_id, fresh=fresh)
+        if next(changes, None):
+            await cart_store.add_item(user_id, 7, 1, TODAY)
+        return cart
+
+    monkeypatch.setattr(cart_store, "get_cart", changing_cart)
+
+    async def main():
+        await cart_store.add_item("u1", 3, 2, TODAY)
+        return await orders.place_order("u1", CATALOG)
+
+    order = asyncio.run(main())  # third attempt prices what it checks out
+    assert {i["item_id"]: i["quantity"] for i in order["items"]} == {3: 2.0, 7: 2.0}
+
+
+def test_checkout_gives_up_after_the_last_attempt(fake_redis, monkeypatch):
+    get_cart = cart_store.get_cart
+
+    async def changing_cart(user_id, fresh=False):
+        cart = await get_cart(user_id, fresh=fresh)
+        await cart_store.add_item(user_id, 7, 1, TODAY)
+        return cart
+
+    monkeypatch.setattr(cart_store, "get_cart", changing_cart)
+
+    async def main():
+        await cart_store.add_item("u1", 3, 2, TODAY)
+        with pytest.raises(OrderError) as error:
+            await orders.place_order("u1", CATALOG, "key-1")
+        assert error.value.reason == "changed"
+        # Nothing was ordered, so the key is free for the retry
+        assert await get_cart("u1", fresh=True) == {3: 2.0, 7: float(orders.CHECKOUT_ATTEMPTS)}
+
+    asyncio.run(main())
+
+
+# -------- Order log --------
+
+def test_redelivered_entries_are_written_once(fake_redis, log):
+    client = orders.redis_connection.ar
+
+    async def main():
+        await orders._ensure_group(client, STREAM)
+        entry_id = await client.xadd(STREAM, {"order": json.dumps(_order())})
+        entries = [(entry_id, {"order": json.dumps(_order())})]
+        await orders._persist(client, log, STREAM, entries)
+        written = orders.consumer_stats["written"]
+        await orders._persist(client, log, STREAM, entries)  # e.g. acked after a crash
+        return orders.consumer_stats["written"] - written
+
+    assert asyncio.run(main()) == 0
+    assert log.count() == 1
+
+
+def test_claimed_entries_without_fields_are_acked(fake_redis, log):
+    client = orders.redis_connection.ar
+
+    async def main():
+        await orders._ensure_group(client, STREAM)
+        gone = await client.xadd(STREAM, {"order": json.dumps(_order("o1"))})
+        kept = await client.xadd(STREAM, {"order": json.dumps(_order("o2"))})
+        await client.xreadgroup(ORDER_LOG_GROUP, "dead", {STREAM: ">"})
+        # Redis 6.2's XAUTOCLAIM returns deleted entries as (id, None)
+        await orders._persist(client, log, STREAM, [(gone, None), (kept, {"order": json.dumps(_order("o2"))})])
+        return await client.xpending(STREAM, ORDER_LOG_GROUP)
+
+    assert asyncio.run(main())["pending"] == 0
+    assert log.count() == 1
+
+
+def test_consume_claims_a_dead_consumer_then_reads_new_orders(fake_redis, log, monkeypatch):
+    monkeypatch.setattr(orders, "ORDER_LOG_CLAIM_IDLE_SECONDS", 0)
+    client = orders.redis_connection.ar
+
+    async def wait_for(count):
+        for _ in range(200):
+            if log.count() >= count:
+                return
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await orders._ensure_group(client, STREAM)
+        deleted = await client.xadd(STREAM, {"order": json.dumps(_order("o1"))})
+        await client.xadd(STREAM, {"order": json.dumps(_order("o2"))})
+        await client.xreadgroup(ORDER_LOG_GROUP, "dead", {STREAM: ">"})
+        await client.xdel(STREAM, deleted)  # claimed back without its fields
+
+        consumer = asyncio.create_task(orders.consume(log, STREAM, "live", block_ms=10))
+        await wait_for(1)
+        await client.xadd(STREAM, {"order": json.dumps(_order("o3"))})
+        await wait_for(2)
+        consumer.cancel()
+        return await client.xpending(STREAM, ORDER_LOG_GROUP), await client.xlen(STREAM)
+
+    (pending, length) = asyncio.run(main())
+    assert pending["pending"] == 0 and length == 0
+    assert [row[0] for row in sqlite_rows(log)] == ["o2", "o3"]
+
+
+def test_consume_first_finishes_its_own_pending_entries(fake_redis, log):
+    client = orders.redis_connection.ar
+    reads = []
+
+    async def main():
+        await orders._ensure_group(client, STREAM)
+        await client.xadd(STREAM, {"order": json.dumps(_order("o1"))})
+        # Read but not acknowledged before this consumer restarted
+        await client.xreadgroup(ORDER_LOG_GROUP, "c1", {STREAM: ">"})
+        await client.xadd(STREAM, {"order": json.dumps(_order("o2"))})
+
+        xreadgroup = client.xreadgroup
+
+        async def recording(group, consumer, streams, **kwargs):
+            reads.append(streams[STREAM])
+            return await xreadgroup(group, consumer, streams, **kwargs)
+
+        client.xreadgroup = recording
+        consumer = asyncio.create_task(orders.consume(log, STREAM, "c1", block_ms=10))
+        for _ in range(200):
+            if log.count() == 2:
+                break
+            await asyncio.sleep(0.01)
+        consumer.cancel()
+
+    asyncio.run(main())
+    assert [row[0] for row in sqlite_rows(log)] == ["o1", "o2"]
+    # Pending entries ("0") until none are left, then new ones (">")
+    assert reads[:3] == ["0", "0", ">"]
+
+
+def sqlite_rows(log):
+    # consume() closes its log when cancelled
+    db = sqlite3.connect(log.path)
+    try:
+        return db.execute("SELECT order_id FROM orders ORDER BY order_id").fetchall()
+    finally:
+        db.close()
@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+
+from response_cache import ResponseCache, json_response
+
+
+def test_builds_once_per_version():
+    cache, builds = ResponseCache(), []
+
+    def build():
+        builds.append(1)
+        return {"items": [1, 2]}
+
+    body, etag = cache.get("v1", "k", build)
+    assert cache.get("v1", "k", build) == (body, etag)
+    assert len(builds) == 1
+    assert body == b'{"items":[1,2]}'
+    cache.get("v2", "k", build)
+    assert len(builds) == 2
+    assert cache.get("v2", "missing", lambda: None) is None
+
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.get("v1", "a", lambda: 1)
+    cache.get("v1", "b", lambda: 2)
+    cache.get("v1", "a", lambda: 1)  # a is now the most recent
+    cache.get("v1", "c", lambda: 3)
+    assert len(cache) == 2
+    rebuilt = []
+    cache.get("v1", "a", lambda: rebuilt.append("a") or 1)
+    cache.get("v1", "b", lambda: rebuilt.append("b") or 2)
+    assert rebuilt == ["b"]
+
+
+def test_etag_and_not_modified():
+    cache = ResponseCache()
+    app = FastAPI()
+
+    @app.get("/thing")
+    async def thing(request: Request):
+        return json_response(request, *cache.get("v1", "thing", lambda: {"a": 1}))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            first = await http.get("/thing")
+            etag = first.headers["etag"]
+            assert first.status_code == 200 and first.json() == {"a": 1}
+            assert first.headers["cache-control"] == "no-cache"
+            for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+                response = await http.get("/thing", headers={"If-None-Match": header})
+                assert response.status_code == 304, header
+                assert response.content == b""
+                assert response.headers["etag"] == etag
+            assert (await http.get("/thing", headers={"If-None-Match": '"other"'})).status_code == 200
+
+    asyncio.run(main())
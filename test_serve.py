@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+import uvicorn
+
+import serve
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """serve.main() with uvicorn.run recorded instead of started."""
+    calls = []
+
+    def fake_run(app, **kwargs):
+        calls.append(dict(kwargs, app=app, env={k: os.environ.get(k) for k in (
+            "WORKERS", "STATE_BACKEND", "PROMETHEUS_MULTIPROC_DIR")}))
+        assert os.path.isdir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+    monkeypatch.setattr(uvicorn, "run", fake_run)
+    for name in ("WORKERS", "STATE_BACKEND", "PROMETHEUS_MULTIPROC_DIR"):
+        monkeypatch.delenv(name, raising=False)
+
+    def main(*argv):
+        monkeypatch.setattr(sys, "argv", ["serve.py", *argv])
+        serve.main()
+        return calls[-1]
+
+    return main
+
+
+def test_whatsapp_workers_share_state_in_redis(run):
+    call = run("whatsapp", "--workers", "3")
+    assert call["app"] == "whatsapp_handler:app" and call["workers"] == 3
+    assert call["env"]["WORKERS"] == "3"
+    assert call["env"]["STATE_BACKEND"] == "redis"
+    # The per-run metrics directory is removed once uvicorn returns
+    assert not os.path.exists(call["env"]["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def test_memory_state_is_refused_with_several_workers(run, monkeypatch):
+    monkeypatch.setenv("STATE_BACKEND", "memory")
+    with pytest.raises(SystemExit):
+        run("whatsapp-main", "--workers", "2")
+
+
+def test_backend_keeps_its_settings(run, monkeypatch, tmp_path):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    call = run("backend", "--workers", "2")
+    assert call["env"]["STATE_BACKEND"] is None
+    assert tmp_path.exists()  # a directory the caller set up is kept
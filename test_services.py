@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import services
+from services import MAX_CART_OPERATIONS, BadRequest
+
+BANANA, APPLE = 1, 2
+
+
+def test_update_cart_applies_up_to_the_operation_limit(fake_redis):
+    operations = [{"op": "add", "item_id": BANANA, "quantity": 1}] * MAX_CART_OPERATIONS
+    cart = asyncio.run(services.update_cart("u1", operations))["cart"]
+    assert cart == [{"item_id": BANANA, "name": "Banana", "quantity": float(MAX_CART_OPERATIONS)}]
+
+    with pytest.raises(BadRequest):
+        asyncio.run(services.update_cart("u1", operations + operations[:1]))
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "add", "item_id": APPLE, "quantity": 0},
+    {"op": "add", "item_id": APPLE, "quantity": -1},
+    {"op": "add", "item_id": APPLE},
+    {"op": "add", "item_id": APPLE, "quantity": "2"},
+    {"op": "add", "item_id": APPLE, "quantity": True},
+    {"op": "add", "item_id": APPLE, "quantity": float("nan")},
+    {"op": "add", "item_id": APPLE, "quantity": float("inf")},
+    {"op": "set", "item_id": APPLE, "quantity": -0.5},
+    {"op": "set", "item_id": APPLE},
+    {"op": "add", "item_id": "2", "quantity": 1},
+    {"op": "add", "quantity": 1},
+    {"op": "double", "item_id": APPLE, "quantity": 1},
+])
+def test_update_cart_rejects_invalid_operations_without_touching_the_cart(fake_redis, operation):
+    valid = {"op": "add", "item_id": BANANA, "quantity": 1}
+    with pytest.raises(BadRequest):
+        asyncio.run(services.update_cart("u1", [valid, operation]))
+    assert asyncio.run(services.view_cart("u1")) == {"cart": []}
+
+
+def test_update_cart_accepts_fractions_and_set_to_zero(fake_redis):
+    operations = [
+        {"op": "add", "item_id": APPLE, "quantity": 1.5},
+        {"op": "add", "item_id": BANANA, "quantity": 2},
+        {"op": "set", "item_id": BANANA, "quantity": 0},
+    ]
+    assert asyncio.run(services.update_cart("u1", operations))["cart"] == [
+        {"item_id": APPLE, "name": "Apple", "quantity": 1.5},
+    ]
+
+
+@pytest.mark.parametrize("quantity", [0, -2, float("nan"), "1"])
+def test_add_to_cart_rejects_invalid_quantities(fake_redis, quantity):
+    with pytest.raises(BadRequest):
+        asyncio.run(services.add_to_cart("u1", APPLE, quantity))
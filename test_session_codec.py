@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+import cart_store
+import session_codec
+
+
+@pytest.mark.parametrize("data", [
+    {"last_seen": "2024-05-01"},
+    {"last_seen": "1970-01-02"},
+    {"last_seen": "2149-06-06"},  # day 65535, the last one that fits
+    {},
+])
+def test_v1_round_trip(data):
+    raw = session_codec.encode(data)
+    assert len(raw) == 3
+    assert raw[0] == session_codec.VERSION
+    assert session_codec.decode(raw) == data
+
+
+def test_v1_layout():
+    assert session_codec.encode({"last_seen": "2024-05-01"}) == b"\x01" + (19844).to_bytes(2, "big")
+
+
+@pytest.mark.parametrize("data", [
+    {"last_seen": "2149-06-07"},  # day 65536
+    {"last_seen": "1970-01-01"},  # day 0 means "no date"
+    {"last_seen": "1969-12-31"},
+    {"last_seen": "yesterday"},
+    {"last_seen": "2024-05-01", "name": "Ann"},
+])
+def test_json_when_v1_does_not_fit(data):
+    raw = session_codec.encode(data)
+    assert raw[:1] == b"{"
+    assert session_codec.decode(raw) == data
+
+
+def test_legacy_json_and_empty_decode():
+    legacy = json.dumps({"last_seen": "2024-05-01", "cart": []})
+    assert session_codec.decode(legacy) == {"last_seen": "2024-05-01", "cart": []}
+    assert session_codec.decode(legacy.encode()) == {"last_seen": "2024-05-01", "cart": []}
+    assert session_codec.decode(None) == {}
+    assert session_codec.decode(b"") == {}
+
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(ValueError):
+        session_codec.decode(b"\x02\x00\x01")
+    with pytest.raises(ValueError):
+        session_codec.decode(b"\x01\x00")
+
+
+# -------- cart_store's Lua prelude writes the same formats --------
+
+def test_prelude_converts_a_plain_session_and_updates_v1_in_place(fake_redis, raw_redis):
+    raw_redis.set("session:u1", json.dumps({"last_seen": "2024-04-01"}), ex=3600)
+    asyncio.run(cart_store.add_item("u1", 3, 1, "2024-05-01"))
+    assert raw_redis.get("session:u1") == session_codec.encode({"last_seen": "2024-05-01"})
+
+    asyncio.run(cart_store.add_item("u1", 3, 1, "2024-05-02"))
+    assert session_codec.decode(raw_redis.get("session:u1")) == {"last_seen": "2024-05-02"}
+    assert 0 < raw_redis.ttl("session:u1") <= 3600
+
+
+def test_prelude_reads_leave_the_session_alone(fake_redis, raw_redis):
+    raw_redis.set("session:u1", json.dumps({"last_seen": "2024-04-01"}))
+    asyncio.run(cart_store.get_cart("u1"))
+    assert raw_redis.get("session:u1") == json.dumps({"last_seen": "2024-04-01"}).encode()
+
+
+def test_prelude_writes_json_for_a_day_outside_v1(fake_redis, raw_redis):
+    late = "2150-01-01"
+    asyncio.run(cart_store.add_item("u1", 3, 1, late))
+    assert json.loads(raw_redis.get("session:u1")) == {"last_seen": late}
+
+    raw_redis.set("session:u2", session_codec.encode({"last_seen": "2024-05-01"}), ex=3600)
+    asyncio.run(cart_store.add_item("u2", 3, 1, late))
+    assert json.loads(raw_redis.get("session:u2")) == {"last_seen": late}
+    assert 0 < raw_redis.ttl("session:u2") <= 3600